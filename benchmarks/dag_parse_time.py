@@ -0,0 +1,113 @@
+"""
+DAG parse time, the way the scheduler pays it: every DAG file is imported
+in a fresh interpreter, several times, and the median import time over an
+`import airflow.decorators` baseline is compared with a budget. The run also
+fails if a DAG import pulls in any of the heavy modules tasks are supposed to
+import lazily (pandas, pyarrow, minio, psycopg2, ...).
+
+Without Airflow installed only the DAG files' non-Airflow top-level imports
+are timed ("imports" mode), which is still what this repo controls.
+
+Exits 1 when a DAG is over budget or imports a heavy module, so it can gate CI:
+
+    python -m benchmarks.dag_parse_time [--budget-ms 150] [--runs 5]
+
+tests/test_dag_parse_time.py runs the same check with `make test`.
+"""
+import argparse
+import ast
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+DAGS_DIR = ROOT / "dags"
+HEAVY_MODULES = ["pandas", "numpy", "pyarrow", "minio", "psycopg2", "requests", "pyspark", "sklearn"]
+
+# Runs in the child interpreter: time one import and list the heavy modules it loaded
+PROBE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+before = set(sys.modules)
+started = time.perf_counter()
+{body}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "modules": sorted(set(sys.modules) - before)}}))
+"""
+
+
+def probe(body: str) -> dict:
+    code = PROBE.format(root=str(ROOT), body=body)
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(f"Import failed:\n{out.stderr.strip()}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def has_airflow() -> bool:
+    return subprocess.run([sys.executable, "-c", "import airflow"], capture_output=True).returncode == 0
+
+
+def top_level_imports(path: Path) -> str:
+    """The file's module-level import statements, minus Airflow's."""
+    tree = ast.parse(path.read_text(encoding="utf-8"))
+    lines = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = [a for a in node.names if a.name.split(".")[0] != "airflow"]
+            lines += [f"import {a.name}" for a in names]
+        elif isinstance(node, ast.ImportFrom) and (node.module or "").split(".")[0] != "airflow":
+            lines.append(ast.unparse(node))
+    return "\n".join(lines) or "pass"
+
+
+def measure(path: Path, mode: str, runs: int) -> dict:
+    if mode == "full":
+        body = f"import runpy\nrunpy.run_path({str(path)!r})"
+    else:
+        body = top_level_imports(path)
+    samples = [probe(body) for _ in range(runs)]
+    modules = set().union(*(s["modules"] for s in samples))
+    return {
+        "median_ms": statistics.median(s["seconds"] for s in samples) * 1000,
+        "heavy": sorted(m for m in HEAVY_MODULES if m in modules),
+    }
+
+
+def airflow_baseline_ms(runs: int) -> float:
+    """Median cost of `import airflow.decorators`, which every DAG pays anyway."""
+    return statistics.median(probe("import airflow.decorators")["seconds"] for _ in range(runs)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=150, help="per DAG, over the Airflow baseline")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    mode = "full" if has_airflow() else "imports"
+    baseline_ms = 0.0
+    if mode == "full":
+        baseline_ms = airflow_baseline_ms(args.runs)
+
+    report, failed = {}, False
+    for path in sorted(DAGS_DIR.glob("*.py")):
+        result = measure(path, mode, args.runs)
+        result["over_baseline_ms"] = max(result["median_ms"] - baseline_ms, 0.0)
+        result["ok"] = result["over_baseline_ms"] <= args.budget_ms and not result["heavy"]
+        failed |= not result["ok"]
+        report[path.name] = {k: round(v, 1) if isinstance(v, float) else v for k, v in result.items()}
+
+    print(json.dumps({
+        "mode": mode,
+        "budget_ms": args.budget_ms,
+        "airflow_baseline_ms": round(baseline_ms, 1),
+        "dags": report,
+    }, indent=2))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Per-batch Postgres write latency: the old per-row INSERT ... RETURNING with
+a fresh connection per call, against pooled connections with
+execute_values and COPY. Writes go to a temp table shaped like
+recommendation_list, so nothing persists. Needs the configured Postgres.
+
+    python -m benchmarks.db_batch_writes --batch-sizes 15 100 1000 --repeat 20
+"""
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime
+import pandas as pd
+from etl.utils.db import get_connection, connection, insert_values, copy_frame, close_pool
+
+CREATE = """
+    CREATE TEMP TABLE IF NOT EXISTS bench_recommendation (
+        rec_id SERIAL PRIMARY KEY,
+        track_name TEXT NOT NULL,
+        artist_name TEXT NOT NULL,
+        recommended_at TIMESTAMP NOT NULL,
+        week_of_year INT NOT NULL,
+        year INT NOT NULL,
+        rank INT NOT NULL,
+        UNIQUE (track_name, artist_name, week_of_year, year)
+    );
+"""
+COLUMNS = ["track_name", "artist_name", "recommended_at", "week_of_year", "year", "rank"]
+
+
+def make_rows(n: int, offset: int):
+    now = datetime.utcnow()
+    return [(f"track {offset + i}", f"artist {(offset + i) % 97}", now, 1, 2000, i + 1) for i in range(n)]
+
+
+def per_row(rows):
+    # Old path: new connection, one INSERT ... RETURNING round trip per row
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(CREATE)
+            for row in rows:
+                cur.execute("""
+                    INSERT INTO bench_recommendation (track_name, artist_name, recommended_at, week_of_year, year, rank)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (track_name, artist_name, week_of_year, year) DO NOTHING
+                    RETURNING rec_id;
+                """, row)
+                cur.fetchone()
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def pooled_values(rows):
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(CREATE)
+            insert_values(cur, """
+                INSERT INTO bench_recommendation (track_name, artist_name, recommended_at, week_of_year, year, rank)
+                VALUES %s
+                ON CONFLICT (track_name, artist_name, week_of_year, year) DO NOTHING
+                RETURNING rec_id;
+            """, rows, fetch=True)
+        conn.commit()
+
+
+def pooled_copy(rows):
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(CREATE)
+            copy_frame(cur, "bench_recommendation", pd.DataFrame(rows, columns=COLUMNS), COLUMNS)
+        conn.commit()
+
+
+def measure(fn, batch_size: int, repeat: int, key_base: int) -> dict:
+    timings = []
+    for i in range(repeat):
+        # Fresh keys every batch so COPY never hits the unique constraint
+        rows = make_rows(batch_size, offset=key_base + (i + 1) * 100_000)
+        started = time.perf_counter()
+        fn(rows)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "p50_ms": statistics.median(timings),
+        "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "rows_per_sec": batch_size / (statistics.median(timings) / 1000),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[15, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    strategies = {"per_row_fresh_conn": per_row, "pooled_execute_values": pooled_values, "pooled_copy": pooled_copy}
+    results = []
+    try:
+        for b, batch_size in enumerate(args.batch_sizes):
+            for s, (name, fn) in enumerate(strategies.items()):
+                key_base = (b * len(strategies) + s) * 1_000_000_000
+                fn(make_rows(1, offset=key_base))  # warm-up (and first pool connect)
+                results.append({"strategy": name, "batch_size": batch_size,
+                                **measure(fn, batch_size, args.repeat, key_base)})
+    finally:
+        close_pool()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Multi-account extraction against a local stub of the Spotify API.
+
+Every account gets its own Zipf-skewed play history behind its own refresh
+token. The stub enforces an app-wide request rate and answers 429 with
+Retry-After above it, and also throttles a random fraction of requests, so
+the run exercises the shared token bucket and the retry path. Raw objects go
+to the in-memory object store; nothing touches MinIO or Postgres.
+
+    python -m benchmarks.multi_account_extract --accounts 200 --plays 500 --workers 16
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from bisect import bisect_right
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+from benchmarks.pipeline_benchmark import PAGE_SIZE, make_catalog, make_plays, iso_ms
+
+
+class MultiAccountStub:
+    """Token and recently-played endpoints for many accounts, with simulated throttling."""
+
+    def __init__(self, catalog, histories: dict, server_rate: float, throttle_p: float, retry_after_s: float,
+                 seed: int = 0):
+        self.catalog = catalog.to_dict("records")
+        self.histories = histories  # refresh token -> (song indices, played_at ms)
+        self.server_rate = server_rate
+        self.throttle_p = throttle_p
+        self.retry_after_s = retry_after_s
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window = []  # timestamps of requests served in the last second
+        self.served = 0
+        self.throttled = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: dict, headers: dict | None = None):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                form = parse_qs(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8"))
+                # The access token is the refresh token, so GETs know their account
+                token = form.get("refresh_token", [""])[0]
+                self._send(200, {"access_token": token, "token_type": "Bearer", "expires_in": 3600})
+
+            def do_GET(self):
+                if not stub.admit():
+                    self._send(429, {"error": "rate limited"}, {"Retry-After": str(stub.retry_after_s)})
+                    return
+                token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+                if token not in stub.histories:
+                    self._send(401, {"error": "invalid token"})
+                    return
+                query = parse_qs(urlparse(self.path).query)
+                self._send(200, stub.page(token, int(query.get("after", ["0"])[0])))
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def admit(self) -> bool:
+        now = time.monotonic()
+        with self.lock:
+            self.window = [t for t in self.window if now - t < 1.0]
+            if len(self.window) >= self.server_rate or self.random.random() < self.throttle_p:
+                self.throttled += 1
+                return False
+            self.window.append(now)
+            self.served += 1
+            return True
+
+    def page(self, token: str, after_ms: int) -> dict:
+        songs, played_ms = self.histories[token]
+        start = bisect_right(played_ms, after_ms)
+        stop = min(start + PAGE_SIZE, len(played_ms))
+        items = []
+        for i in range(start, stop):
+            song = self.catalog[songs[i]]
+            items.append({
+                "played_at": iso_ms(int(played_ms[i])),
+                "track": {
+                    "id": song["song_id"],
+                    "name": song["song_title"],
+                    "duration_ms": int(song["duration_ms"]),
+                    "artists": [{"id": song["artist_id"], "name": song["artist_name"]}],
+                },
+            })
+        cursors = {"after": str(int(played_ms[stop - 1]))} if items else None
+        return {"items": items, "cursors": cursors, "next": None}
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, default=50)
+    parser.add_argument("--plays", type=int, default=200, help="plays per account")
+    parser.add_argument("--songs", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--client-rate", type=float, default=40, help="shared token bucket, requests/sec")
+    parser.add_argument("--client-burst", type=float, default=10)
+    parser.add_argument("--server-rate", type=float, default=50, help="stub's app-wide limit before 429s")
+    parser.add_argument("--throttle-p", type=float, default=0.02, help="fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from etl.recently_played.extract_accounts import extract_accounts
+    from etl.utils.object_store import MemoryObjectStore, set_object_store
+    from etl.utils.rate_limiter import TokenBucket
+
+    rng = np.random.default_rng(args.seed)
+    catalog = make_catalog(rng, args.songs, max(args.songs // 8, 10), 1.1)
+    start_ms = int(time.time() * 1000) - args.plays * 240_000
+    histories = {f"bench-token-{i}": make_plays(rng, catalog, args.plays, 1.1, start_ms) for i in range(args.accounts)}
+    accounts = [(f"bench{i:05d}", f"bench-token-{i}") for i in range(args.accounts)]
+
+    store = MemoryObjectStore()
+    set_object_store(store)
+    limiter = TokenBucket(args.client_rate, args.client_burst)
+    with MultiAccountStub(catalog, histories, args.server_rate, args.throttle_p, args.retry_after, args.seed) as stub:
+        started = time.perf_counter()
+        results, failures = extract_accounts(
+            accounts, "2025-01-01-00", start_ms - 1, max_workers=args.workers, rate_limiter=limiter,
+            api_base=stub.base, token_url=f"{stub.base}/api/token", max_backoff_s=args.retry_after * 4,
+        )
+        elapsed = time.perf_counter() - started
+
+    records = sum(r["records"] for r in results)
+    print(json.dumps({
+        "accounts": args.accounts,
+        "succeeded": len(results),
+        "failed": failures,
+        "records": records,
+        "complete": records == args.accounts * args.plays,
+        "wall_s": round(elapsed, 3),
+        "records_per_sec": round(records / elapsed, 1) if elapsed > 0 else None,
+        "requests_served": stub.served,
+        "requests_throttled": stub.throttled,
+        "limiter_wait_thread_s": round(limiter.waited_s, 3),
+        "raw_prefixes": sum(1 for k in store.objects if k.startswith("raw/") and k.endswith("/_SUCCESS")),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
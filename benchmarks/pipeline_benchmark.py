@@ -0,0 +1,336 @@
+"""
+End-to-end pipeline benchmark on synthetic Spotify payloads.
+
+Plays are drawn with Zipf-skewed artist and song popularity and served by a
+local stub of the Spotify API (token endpoint + recently-played paging). The
+run goes extract -> upload_raw -> transform -> upload_transformed ->
+load_to_postgres -> recommend, against the object store and Postgres from
+config.py. Point the object store (OBJECT_STORE_BACKEND=local works) and
+POSTGRES_DB at scratch instances: the run writes under its own prefix but
+does load facts.
+
+Prints one JSON document with per-stage wall time, rows/sec and peak RSS.
+Save it and pass it back with --compare on a later commit:
+
+    python -m benchmarks.pipeline_benchmark --plays 100000 --out baseline.json
+    python -m benchmarks.pipeline_benchmark --plays 100000 --compare baseline.json
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import tempfile
+import threading
+import time
+from bisect import bisect_right
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+import pandas as pd
+
+PAGE_SIZE = 50
+GENRES = ["Pop", "Rock", "Hip-Hop", "Dance", "Indie", "Jazz"]
+KEYS = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+
+
+# ---------- Synthetic data ----------
+def zipf_choice(rng, n: int, size: int, s: float) -> np.ndarray:
+    """Indices in [0, n) drawn with probability proportional to 1 / rank**s."""
+    weights = 1.0 / np.arange(1, n + 1) ** s
+    return rng.choice(n, size=size, p=weights / weights.sum())
+
+
+def make_catalog(rng, songs: int, artists: int, s: float) -> pd.DataFrame:
+    # Popular artists also own more songs
+    artist_of_song = zipf_choice(rng, artists, songs, s)
+    return pd.DataFrame({
+        "song_id": [f"bench{i:022d}" for i in range(songs)],
+        "song_title": [f"Song {i}" for i in range(songs)],
+        "artist_id": [f"benchartist{a:011d}" for a in artist_of_song],
+        "artist_name": [f"Artist {a}" for a in artist_of_song],
+        "duration_ms": rng.integers(90_000, 360_000, songs),
+    })
+
+
+def make_plays(rng, catalog: pd.DataFrame, plays: int, s: float, start_ms: int) -> tuple[np.ndarray, np.ndarray]:
+    """(song index, played_at ms) per play, ordered by time with distinct timestamps."""
+    songs = zipf_choice(rng, len(catalog), plays, s)
+    gaps = rng.integers(1_000, 240_000, plays)
+    return songs, start_ms + np.cumsum(gaps)
+
+
+def iso_ms(ms: int) -> str:
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def write_features_csv(rng, catalog: pd.DataFrame, extra: int, path: str):
+    """A SpotifyFeatures-shaped CSV covering the catalog plus unplayed tracks to recommend."""
+    n = len(catalog) + extra
+    names = list(catalog["song_title"]) + [f"Unplayed {i}" for i in range(extra)]
+    artists = list(catalog["artist_name"]) + [f"Artist {i % 997}" for i in range(extra)]
+    ids = list(catalog["song_id"]) + [f"benchx{i:021d}" for i in range(extra)]
+    pd.DataFrame({
+        "genre": rng.choice(GENRES, n),
+        "artist_name": artists,
+        "track_name": names,
+        "track_id": ids,
+        "popularity": rng.integers(0, 100, n),
+        "acousticness": rng.random(n),
+        "danceability": rng.random(n),
+        "duration_ms": rng.integers(90_000, 360_000, n),
+        "energy": rng.random(n),
+        "instrumentalness": rng.random(n),
+        "key": rng.choice(KEYS, n),
+        "liveness": rng.random(n),
+        "loudness": rng.uniform(-30, 0, n),
+        "mode": rng.choice(["Major", "Minor"], n),
+        "speechiness": rng.random(n),
+        "tempo": rng.uniform(60, 200, n),
+        "time_signature": "4/4",
+        "valence": rng.random(n),
+    }).to_csv(path, index=False)
+
+
+# ---------- Stub Spotify API ----------
+class StubSpotify:
+    """Serves the generated plays with the same paging contract as the real API."""
+
+    def __init__(self, catalog: pd.DataFrame, songs: np.ndarray, played_ms: np.ndarray, page_size: int = PAGE_SIZE):
+        self.catalog = catalog.to_dict("records")
+        self.songs = songs
+        self.played_ms = played_ms
+        self.page_size = page_size
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, body: dict):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                self._send({"access_token": "bench", "token_type": "Bearer", "expires_in": 3600})
+
+            def do_GET(self):
+                stub.requests += 1
+                query = parse_qs(urlparse(self.path).query)
+                self._send(stub.page(int(query.get("after", ["0"])[0])))
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def page(self, after_ms: int) -> dict:
+        start = bisect_right(self.played_ms, after_ms)
+        stop = min(start + self.page_size, len(self.played_ms))
+        items = []
+        for i in range(start, stop):
+            song = self.catalog[self.songs[i]]
+            items.append({
+                "played_at": iso_ms(int(self.played_ms[i])),
+                "track": {
+                    "id": song["song_id"],
+                    "name": song["song_title"],
+                    "duration_ms": int(song["duration_ms"]),
+                    "artists": [{"id": song["artist_id"], "name": song["artist_name"]}],
+                },
+            })
+        cursors = {"after": str(int(self.played_ms[stop - 1]))} if items else None
+        return {"items": items, "cursors": cursors, "next": None}
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# ---------- Measurement ----------
+def current_rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class PeakRSS:
+    """Samples RSS on a background thread and keeps the peak seen while active."""
+
+    def __init__(self, interval_s: float = 0.02):
+        self.interval_s = interval_s
+        self.peak = 0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss_bytes())
+            self._stop.wait(self.interval_s)
+
+    def __enter__(self):
+        self.peak = current_rss_bytes()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_bytes())
+
+
+def run_stage(results: list, name: str, fn, rows_of=len):
+    with PeakRSS() as rss:
+        started = time.perf_counter()
+        out = fn()
+        elapsed = time.perf_counter() - started
+    rows = rows_of(out) if rows_of else None
+    results.append({
+        "stage": name,
+        "wall_s": round(elapsed, 4),
+        "rows": rows,
+        "rows_per_sec": round(rows / elapsed, 1) if rows and elapsed > 0 else None,
+        "peak_rss_mb": round(rss.peak / 2**20, 1),
+    })
+    print(f"{name}: {elapsed:.2f}s", flush=True)
+    return out
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, baseline: dict) -> list[dict]:
+    before = {s["stage"]: s for s in baseline["stages"]}
+    rows = []
+    for stage in current["stages"]:
+        old = before.get(stage["stage"])
+        if old is None:
+            continue
+        rows.append({
+            "stage": stage["stage"],
+            "wall_s_ratio": round(stage["wall_s"] / old["wall_s"], 3) if old["wall_s"] else None,
+            "peak_rss_mb_delta": round(stage["peak_rss_mb"] - old["peak_rss_mb"], 1),
+        })
+    return rows
+
+
+# ---------- Driver ----------
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--plays", type=int, default=10_000, help="10^3 .. 10^7")
+    parser.add_argument("--songs", type=int, default=None, help="catalog size (default plays / 10, min 100)")
+    parser.add_argument("--artists", type=int, default=None, help="default songs / 8, min 10")
+    parser.add_argument("--zipf", type=float, default=1.1, help="popularity skew exponent")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE, help="items per stub page (the real API caps at 50)")
+    parser.add_argument("--load-mode", choices=["row", "bulk"], default="bulk")
+    parser.add_argument("--raw-format", default=None, help="override RAW_FORMAT")
+    parser.add_argument("--feature-extra", type=int, default=20_000, help="unplayed tracks in the features CSV")
+    parser.add_argument("--skip-recommend", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="also write the JSON result here")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    args = parser.parse_args()
+
+    from config import RAW_FORMAT
+    from etl.utils.spotify_client import SpotifyClient
+    from etl.recently_played.extract import fetch_recently_played, upload_raw, write_success_marker
+    from etl.recently_played.transform import download_raw, transform, upload_transformed
+    from etl.recently_played.load import download_processed, load_to_postgres
+
+    rng = np.random.default_rng(args.seed)
+    songs_n = args.songs or max(100, args.plays // 10)
+    artists_n = args.artists or max(10, songs_n // 8)
+    start_ms = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+    prefix = f"bench-{datetime.now(timezone.utc).strftime('%Y-%m-%d-%H%M%S')}"
+    stages = []
+
+    def generate():
+        catalog = make_catalog(rng, songs_n, artists_n, args.zipf)
+        return catalog, *make_plays(rng, catalog, args.plays, args.zipf, start_ms)
+
+    catalog, songs, played_ms = run_stage(stages, "generate", generate, rows_of=lambda out: len(out[1]))
+
+    with StubSpotify(catalog, songs, played_ms, args.page_size) as stub:
+        client = SpotifyClient(refresh_token="bench", api_base=f"{stub.base}/v1", token_url=f"{stub.base}/api/token")
+        max_pages = args.plays // args.page_size + 2
+        records = run_stage(stages, "extract", lambda: fetch_recently_played(start_ms, client=client, max_pages=max_pages))
+        http_requests = stub.requests
+
+    raw_format = args.raw_format or RAW_FORMAT
+
+    def land_raw():
+        upload_raw(records, prefix, raw_format=raw_format)
+        write_success_marker(prefix)
+        return records
+
+    run_stage(stages, "upload_raw", land_raw)
+    del records
+
+    df_raw = run_stage(stages, "download_raw", lambda: download_raw(prefix))
+    df_clean = run_stage(stages, "transform", lambda: transform(df_raw))
+    del df_raw
+
+    def publish():
+        upload_transformed(df_clean, prefix)
+        return df_clean
+
+    run_stage(stages, "upload_transformed", publish)
+    del df_clean
+
+    df = run_stage(stages, "download_processed", lambda: download_processed(prefix))
+    run_stage(stages, "load", lambda: load_to_postgres(df, mode=args.load_mode, prefix=prefix), rows_of=int)
+    del df
+
+    if not args.skip_recommend:
+        from recommendations.feature_store import build_feature_store
+        from recommendations.engine import Recommender
+
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_path = os.path.join(tmp, "features.csv")
+            write_features_csv(rng, catalog, args.feature_extra, csv_path)
+            store_path = run_stage(stages, "feature_store_build",
+                                   lambda: build_feature_store(csv_path, os.path.join(tmp, "cache")), rows_of=None)
+            recommender = run_stage(stages, "recommender_load", lambda: Recommender.load(store_path), rows_of=None)
+            run_stage(stages, "recommend", lambda: recommender.recommend(15))
+
+    result = {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "params": {**vars(args), "songs": songs_n, "artists": artists_n, "raw_format": raw_format, "prefix": prefix},
+        "stub_http_requests": http_requests,
+        "total_wall_s": round(sum(s["wall_s"] for s in stages), 4),
+        "stages": stages,
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            result["compare"] = compare(result, json.load(f))
+
+    output = json.dumps(result, indent=2, default=str)
+    print(output)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Compare the recommender's similarity search strategies on one catalog:
+cdist + full argsort (old path), the exact chunked SimilarityEngine and the
+approximate IVFIndex. Reports latency per query and IVF recall@k vs exact.
+
+    python -m benchmarks.similarity_recall --rows 1000000 --queries 32
+    python -m benchmarks.similarity_recall --use-store   # real SpotifyFeatures matrix
+"""
+import argparse
+import json
+import time
+import numpy as np
+from scipy.spatial.distance import cdist
+from recommendations.similarity import SimilarityEngine, IVFIndex
+
+
+def synthetic_catalog(rows: int, dims: int, clusters: int, seed: int) -> np.ndarray:
+    """Clustered non-negative vectors, closer to audio features than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.random((clusters, dims))
+    labels = rng.integers(0, clusters, rows)
+    return np.clip(centers[labels] + rng.normal(0, 0.08, (rows, dims)), 0, 1).astype(np.float32)
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=230000)
+    parser.add_argument("--dims", type=int, default=48)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=16)
+    parser.add_argument("--k", type=int, default=15)
+    parser.add_argument("--n-lists", type=int, default=1024)
+    parser.add_argument("--n-probe", type=int, default=16)
+    parser.add_argument("--use-store", action="store_true", help="benchmark on the cached SpotifyFeatures matrix")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.use_store:
+        from recommendations.feature_store import load_feature_store
+        catalog = np.asarray(load_feature_store().matrix)
+    else:
+        catalog = synthetic_catalog(args.rows, args.dims, args.clusters, args.seed)
+
+    rng = np.random.default_rng(args.seed + 1)
+    queries = catalog[rng.integers(0, len(catalog), args.queries)] + rng.normal(0, 0.02, (args.queries, catalog.shape[1]))
+
+    def baseline():
+        return np.stack([cdist(catalog, q[None, :], metric="cosine").ravel().argsort()[:args.k] for q in queries])
+
+    baseline_idx, baseline_s = timed(baseline)
+    engine, engine_build_s = timed(lambda: SimilarityEngine(catalog))
+    (exact_idx, _), exact_s = timed(lambda: engine.top_k(queries, args.k))
+    ivf, ivf_build_s = timed(lambda: IVFIndex(engine, n_lists=args.n_lists, n_probe=args.n_probe, seed=args.seed))
+    (approx_idx, _), approx_s = timed(lambda: ivf.top_k(queries, args.k))
+
+    recall = np.mean([len(set(a) & set(e)) / args.k for a, e in zip(approx_idx, exact_idx)])
+    agreement = np.mean([len(set(b) & set(e)) / args.k for b, e in zip(baseline_idx, exact_idx)])
+
+    print(json.dumps({
+        "rows": int(catalog.shape[0]),
+        "dims": int(catalog.shape[1]),
+        "queries": args.queries,
+        "k": args.k,
+        "cdist_argsort_ms_per_query": baseline_s / args.queries * 1000,
+        "exact_build_s": engine_build_s,
+        "exact_ms_per_query": exact_s / args.queries * 1000,
+        "exact_vs_cdist_agreement": agreement,
+        "ivf_build_s": ivf_build_s,
+        "ivf_ms_per_query": approx_s / args.queries * 1000,
+        "ivf_recall_at_k": recall,
+        "n_lists": args.n_lists,
+        "n_probe": args.n_probe,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
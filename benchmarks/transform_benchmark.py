@@ -0,0 +1,135 @@
+"""
+pandas vs Arrow transform engines on synthetic raw payloads.
+
+Zipf-skewed plays (with a fraction of repeated song_id/played_at pairs and
+rows missing their duration) are landed in the in-memory object store in each
+raw format, then both engines run download -> transform -> processed parquet
+on the same prefix. Reports the best wall time of --repeat runs, the output
+parquet size, and whether both outputs hold the same rows. Also checks the
+engines agree on benchmarks/fixtures/recently_played.json. Exits 1 on a
+mismatch.
+
+    python -m benchmarks.transform_benchmark --plays 200000 --formats json,ndjson.gz
+"""
+import argparse
+import json
+import time
+import numpy as np
+import pandas as pd
+from benchmarks.pipeline_benchmark import make_catalog, make_plays, iso_ms
+
+FIXTURE = "benchmarks/fixtures/recently_played.json"
+INT_COLUMNS = ["song_duration_ms", "year", "month", "day", "hour_of_day", "date_key"]
+
+
+def make_records(rng, plays: int, songs: int, dup_rate: float, null_rate: float) -> list[dict]:
+    catalog = make_catalog(rng, songs, max(songs // 8, 10), 1.1)
+    song_idx, played_ms = make_plays(rng, catalog, plays, 1.1, 1_735_660_800_000)
+    rows = catalog.to_dict("records")
+    records = [
+        {
+            "song_id": rows[s]["song_id"],
+            "song_title": rows[s]["song_title"],
+            "artist_name": rows[s]["artist_name"],
+            "artist_id": rows[s]["artist_id"],
+            "played_at": iso_ms(int(ms)),
+            "song_duration_ms": int(rows[s]["duration_ms"]),
+        }
+        for s, ms in zip(song_idx, played_ms)
+    ]
+    for i in rng.choice(plays, int(plays * null_rate), replace=False):
+        records[i]["song_duration_ms"] = None
+    # Re-delivered plays: identical song_id/played_at later in the payload
+    dups = [dict(records[i]) for i in rng.choice(plays, int(plays * dup_rate), replace=False)]
+    return records + dups
+
+
+def normalized(df: pd.DataFrame) -> pd.DataFrame:
+    """Engine-independent form: UTC instants, nullable int64 counters, stable order."""
+    df = df.copy()
+    for col in ["played_at", "played_at_local"]:
+        df[col] = pd.to_datetime(df[col], utc=True).astype("datetime64[us, UTC]")
+    for col in INT_COLUMNS:
+        df[col] = df[col].astype("Int64")
+    for col in ["song_id", "song_title", "artist_name", "artist_id", "day_of_week"]:
+        df[col] = df[col].astype(object)
+    return df.sort_values(["song_id", "played_at"]).reset_index(drop=True)
+
+
+def same_rows(a: pd.DataFrame, b: pd.DataFrame) -> bool:
+    try:
+        pd.testing.assert_frame_equal(normalized(a), normalized(b[a.columns]))
+        return True
+    except AssertionError as e:
+        print(e)
+        return False
+
+
+def run_engine(engine: str, prefix: str, repeat: int) -> tuple[float, str]:
+    from etl.recently_played.transform import transform_and_upload
+
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        key, _ = transform_and_upload(prefix, engine)
+        best = min(best, time.perf_counter() - started)
+    return best, key
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--plays", type=int, default=200_000)
+    parser.add_argument("--songs", type=int, default=20_000)
+    parser.add_argument("--dup-rate", type=float, default=0.02)
+    parser.add_argument("--null-rate", type=float, default=0.001)
+    parser.add_argument("--formats", default="json,ndjson.gz", help="comma-separated raw formats")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.INFO)
+    from etl.recently_played.extract import upload_raw
+    from etl.utils.object_store import MemoryObjectStore, set_object_store
+
+    store = MemoryObjectStore()
+    set_object_store(store)
+    records = make_records(np.random.default_rng(args.seed), args.plays, args.songs, args.dup_rate, args.null_rate)
+
+    results, ok = {}, True
+    for fmt in args.formats.split(","):
+        prefix = f"bench-{fmt.replace('.', '-')}/2025-01-01-00"
+        upload_raw(records, prefix, raw_format=fmt)
+        outputs, result = {}, {}
+        for engine in ("pandas", "arrow"):
+            seconds, key = run_engine(engine, prefix, args.repeat)
+            outputs[engine] = store.read_parquet(key)
+            result[engine] = {
+                "seconds": round(seconds, 3),
+                "rows_per_sec": round(len(records) / seconds),
+                "parquet_bytes": store.size(key),
+            }
+        result["speedup"] = round(result["pandas"]["seconds"] / result["arrow"]["seconds"], 2)
+        result["same_rows"] = same_rows(outputs["pandas"], outputs["arrow"])
+        ok &= result["same_rows"]
+        results[fmt] = result
+
+    with open(FIXTURE, encoding="utf-8") as f:
+        fixture = json.load(f)
+    upload_raw(fixture, "bench-fixture/2025-01-01-00", raw_format="json")
+    fixture_outputs = {
+        engine: store.read_parquet(run_engine(engine, "bench-fixture/2025-01-01-00", 1)[1])
+        for engine in ("pandas", "arrow")
+    }
+    fixture_ok = same_rows(fixture_outputs["pandas"], fixture_outputs["arrow"])
+
+    print(json.dumps({
+        "plays": len(records),
+        "formats": results,
+        "fixture_same_rows": fixture_ok,
+    }, indent=2))
+    raise SystemExit(0 if ok and fixture_ok else 1)
+
+
+if __name__ == "__main__":
+    main()
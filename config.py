@@ -11,6 +11,10 @@ POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD")
 POSTGRES_HOST = os.getenv("POSTGRES_HOST", "localhost")
 POSTGRES_PORT = int(os.getenv("POSTGRES_PORT", 5432))
 POSTGRES_DB = os.getenv("POSTGRES_DB", "spotify_etl")
+# Connections kept per process by etl.utils.db; size the max for the
+# threads that share it (BACKFILL_DB_CONCURRENCY, service workers)
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 1))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", 8))
 
 MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT")
 MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY")
@@ -22,5 +26,101 @@ SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
 SPOTIFY_REDIRECT_URI = os.getenv("SPOTIFY_REDIRECT_URI")
 REFRESH_TOKEN = os.getenv("SPOTIFY_REFRESH_TOKEN")
 SCOPES = os.getenv("SCOPE")
+SPOTIFY_API_BASE = os.getenv("SPOTIFY_API_BASE", "https://api.spotify.com/v1")
+SPOTIFY_TOKEN_URL = os.getenv("SPOTIFY_TOKEN_URL", "https://accounts.spotify.com/api/token")
+# Safety cap on recently-played pages followed in one run
+SPOTIFY_MAX_PAGES = int(os.getenv("SPOTIFY_MAX_PAGES", 100))
+SPOTIFY_MAX_RETRIES = int(os.getenv("SPOTIFY_MAX_RETRIES", 5))
+SPOTIFY_MAX_BACKOFF_S = float(os.getenv("SPOTIFY_MAX_BACKOFF_S", 60))
+# Per-request (connect, read) timeouts; a stalled connection is retried like a 5xx
+SPOTIFY_CONNECT_TIMEOUT_S = float(os.getenv("SPOTIFY_CONNECT_TIMEOUT_S", 5))
+SPOTIFY_READ_TIMEOUT_S = float(os.getenv("SPOTIFY_READ_TIMEOUT_S", 30))
+# Recent requests kept per client for latency percentiles
+SPOTIFY_LATENCY_HISTORY = int(os.getenv("SPOTIFY_LATENCY_HISTORY", 1000))
+# Multi-account extraction: request budget shared by every account, and how
+# many accounts are fetched at once
+SPOTIFY_RATE_LIMIT_PER_S = float(os.getenv("SPOTIFY_RATE_LIMIT_PER_S", 10))
+SPOTIFY_RATE_LIMIT_BURST = float(os.getenv("SPOTIFY_RATE_LIMIT_BURST", 20))
+EXTRACT_MAX_WORKERS = int(os.getenv("EXTRACT_MAX_WORKERS", 16))
+
+# "row" upserts one row at a time; "bulk" COPYs batches into a staging table
+LOAD_MODE = os.getenv("LOAD_MODE", "row")
+BULK_LOAD_BATCH_SIZE = int(os.getenv("BULK_LOAD_BATCH_SIZE", 50000))
+
+# Dimension key cache used by the row loader
+DIM_CACHE_SIZE = int(os.getenv("DIM_CACHE_SIZE", 100000))
+DIM_CACHE_WARM = os.getenv("DIM_CACHE_WARM", "false").lower() == "true"
+
+# Calendar range pre-generated into dim_date (local time)
+DIM_DATE_START = os.getenv("DIM_DATE_START", "2020-01-01 00:00")
+DIM_DATE_END = os.getenv("DIM_DATE_END", "2030-12-31 23:00")
+
+# How transform hands data to upload: "keys" passes object-store keys through
+# XCom, "fused" runs transform and upload in a single task
+TRANSFORM_HANDOFF = os.getenv("TRANSFORM_HANDOFF", "keys")
+# Transform engine: "pandas" (default) or "arrow" (pyarrow.compute, zstd parquet)
+TRANSFORM_ENGINE = os.getenv("TRANSFORM_ENGINE", "pandas")
+# Rows per parquet row group written by the arrow engine
+PARQUET_ROW_GROUP_SIZE = int(os.getenv("PARQUET_ROW_GROUP_SIZE", 65536))
+
+# Raw landing format: "json" (legacy array), "ndjson.gz" or "ndjson.zst"
+RAW_FORMAT = os.getenv("RAW_FORMAT", "json")
+RAW_READ_CHUNK_SIZE = int(os.getenv("RAW_READ_CHUNK_SIZE", 10000))
+# Raw payloads up to this size are spooled in memory before upload, larger ones on disk
+RAW_SPOOL_BYTES = int(os.getenv("RAW_SPOOL_BYTES", 8 * 1024 * 1024))
+
+# Track metadata / audio feature enrichment between extract and transform
+ENRICH_TRACKS = os.getenv("ENRICH_TRACKS", "false").lower() == "true"
+ENRICH_CACHE_PATH = os.getenv("ENRICH_CACHE_PATH", "/opt/airflow/data/track_cache.sqlite")
+
+# Backfill / reprocessing of historical raw/ prefixes
+BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS", 4))
+BACKFILL_DB_CONCURRENCY = int(os.getenv("BACKFILL_DB_CONCURRENCY", 2))
+
+# Recommender feature matrix
+SPOTIFY_FEATURES_CSV = os.getenv("SPOTIFY_FEATURES_CSV", "data/SpotifyFeatures.csv")
+FEATURE_CACHE_DIR = os.getenv("FEATURE_CACHE_DIR", "data/feature_cache")
+
+# Decayed taste profile kept in Postgres and updated after each load
+TASTE_PROFILE_UPDATE = os.getenv("TASTE_PROFILE_UPDATE", "false").lower() == "true"
+TASTE_DECAY_TAU_S = float(os.getenv("TASTE_DECAY_TAU_S", 86400))
+
+# Recommendation service
+RECOMMENDER_HOST = os.getenv("RECOMMENDER_HOST", "0.0.0.0")
+RECOMMENDER_PORT = int(os.getenv("RECOMMENDER_PORT", 8000))
+RECOMMENDER_TOP_N = int(os.getenv("RECOMMENDER_TOP_N", 15))
+# How often the service checks for a newly published feature store or profile
+RECOMMENDER_POLL_S = float(os.getenv("RECOMMENDER_POLL_S", 30))
+
+# Per-stage metrics (etl/utils/metrics.py): always logged; also exported to a
+# Prometheus textfile directory and/or StatsD when these are set
+METRICS_NAMESPACE = os.getenv("METRICS_NAMESPACE", "spotify_etl")
+METRICS_TEXTFILE_DIR = os.getenv("METRICS_TEXTFILE_DIR", "")
+METRICS_STATSD_HOST = os.getenv("METRICS_STATSD_HOST", "")
+METRICS_STATSD_PORT = int(os.getenv("METRICS_STATSD_PORT", 8125))
+# How often peak memory is sampled while a stage runs (0 = only at stage edges)
+METRICS_RSS_SAMPLE_S = float(os.getenv("METRICS_RSS_SAMPLE_S", 0.05))
+
+# Object store behind raw/, processed/ and intermediate/ objects:
+# "minio" (default), "local" (a directory tree) or "memory" (tests, benchmarks)
+OBJECT_STORE_BACKEND = os.getenv("OBJECT_STORE_BACKEND", "minio")
+OBJECT_STORE_ROOT = os.getenv("OBJECT_STORE_ROOT", "data/object_store")
+# Multipart upload part size and ranged-read buffer for object I/O
+OBJECT_STORE_PART_SIZE = int(os.getenv("OBJECT_STORE_PART_SIZE", 10 * 1024 * 1024))
+OBJECT_STORE_READ_BUFFER = int(os.getenv("OBJECT_STORE_READ_BUFFER", 1024 * 1024))
+
+# fact_play_summary archival (etl/utils/archive.py): months older than this
+# are exported to parquet under FACT_ARCHIVE_PREFIX and detached
+FACT_ARCHIVE_AFTER_MONTHS = int(os.getenv("FACT_ARCHIVE_AFTER_MONTHS", 12))
+FACT_ARCHIVE_PREFIX = os.getenv("FACT_ARCHIVE_PREFIX", "archive/fact_play_summary")
+# Play history read by the recommender, in days (0 = all attached history)
+PLAY_HISTORY_DAYS = int(os.getenv("PLAY_HISTORY_DAYS", 365))
+
+# Spark engine for large backfills (etl/recently_played/spark_engine.py)
+SPARK_MASTER = os.getenv("SPARK_MASTER", "local[*]")
+SPARK_PACKAGES = os.getenv("SPARK_PACKAGES", "org.postgresql:postgresql:42.7.3,org.apache.hadoop:hadoop-aws:3.3.4")
+SPARK_PROCESSED_ROOT = os.getenv("SPARK_PROCESSED_ROOT", "processed_spark")
+SPARK_JDBC_BATCH_SIZE = int(os.getenv("SPARK_JDBC_BATCH_SIZE", 10000))
+SPARK_JDBC_PARTITIONS = int(os.getenv("SPARK_JDBC_PARTITIONS", 4))
 
 # print("DEBUG:", POSTGRES_USER, POSTGRES_PASSWORD, POSTGRES_HOST, POSTGRES_PORT, POSTGRES_DB)
\ No newline at end of file
@@ -0,0 +1,75 @@
+from airflow.decorators import dag, task
+from datetime import datetime, timedelta
+import sys
+import logging
+
+logger = logging.getLogger(__name__)
+
+sys.path.append('/opt/airflow')
+
+# Heavy ETL modules are imported inside the tasks (see recently_played_dag)
+from config import LOAD_MODE, BACKFILL_WORKERS, BACKFILL_DB_CONCURRENCY
+
+
+default_args = {"owner": "airflow", "retries": 1, "retry_delay": timedelta(minutes=5)}
+
+@dag(
+    dag_id="backfill_recently_played_dag",
+    default_args=default_args,
+    schedule=None,   # triggered manually with a date range
+    start_date=datetime(2025, 1, 1),
+    catchup=False,
+    tags=["spotify", "etl", "backfill"],
+    params={
+        "start": "2025-01-01-00",
+        "end": "2025-01-31-12",
+        "load_mode": LOAD_MODE,
+        "force": False,
+    },
+)
+def backfill_recently_played_dag():
+
+    @task()
+    def list_prefixes_task(params: dict | None = None) -> list[str]:
+        from etl.recently_played.backfill import list_raw_prefixes, parse_bound
+
+        # Same bounds as the CLI: a date-only end covers the whole day
+        start = parse_bound(params["start"])
+        end = parse_bound(params["end"], end=True)
+        prefixes = list_raw_prefixes(start, end)
+        logger.info(f"Found {len(prefixes)} raw prefixes between {start} and {end}")
+        return prefixes
+
+    @task(max_active_tis_per_dagrun=BACKFILL_WORKERS)
+    def transform_prefix_task(prefix: str, params: dict | None = None) -> dict:
+        from etl.recently_played.backfill import is_transformed, transform_prefix
+
+        if not params.get("force") and is_transformed(prefix):
+            logger.info(f"Skipping transform for prefix={prefix}: _SUCCESS marker exists")
+            return {"prefix": prefix, "status": "skipped"}
+        return {**transform_prefix(prefix), "status": "transformed"}
+
+    # Caps concurrent Postgres loads across the whole run
+    @task(max_active_tis_per_dagrun=BACKFILL_DB_CONCURRENCY)
+    def load_prefix_task(result: dict, params: dict | None = None) -> dict:
+        from etl.recently_played.backfill import is_loaded, load_prefix
+
+        prefix = result["prefix"]
+        if not params.get("force") and is_loaded(prefix):
+            logger.info(f"Skipping load for prefix={prefix}: already loaded")
+            return {**result, "status": "skipped"}
+        return {**result, **load_prefix(prefix, params.get("load_mode", LOAD_MODE)), "status": "done"}
+
+    @task()
+    def report_task(results: list[dict]):
+        from etl.recently_played.backfill import format_report
+
+        logger.info("Backfill throughput report:\n" + format_report({r["prefix"]: r for r in results}))
+
+    prefixes = list_prefixes_task()
+    transformed = transform_prefix_task.expand(prefix=prefixes)
+    loaded = load_prefix_task.expand(result=transformed)
+    report_task(loaded)
+
+
+backfill_recently_played_dag = backfill_recently_played_dag()
@@ -0,0 +1,77 @@
+from airflow.decorators import dag, task
+from datetime import datetime, timedelta
+import sys
+import logging
+
+logger = logging.getLogger(__name__)
+
+sys.path.append('/opt/airflow')
+
+# Heavy ETL modules are imported inside the tasks (see recently_played_dag)
+from etl.utils.metrics import stage
+from config import LOAD_MODE, TRANSFORM_ENGINE, TASTE_PROFILE_UPDATE, EXTRACT_MAX_WORKERS, BACKFILL_DB_CONCURRENCY
+
+
+default_args = {"owner": "airflow", "retries": 1, "retry_delay": timedelta(minutes=5)}
+
+@dag(
+    dag_id="recently_played_accounts_dag",
+    default_args=default_args,
+    schedule="0 0,12 * * *",   # same windows as recently_played_dag
+    start_date=datetime(2025, 1, 1),
+    catchup=False,
+    tags=["spotify", "etl", "accounts"],
+    params={"load_mode": LOAD_MODE},  # "row" or "bulk"
+)
+def recently_played_accounts_dag():
+
+    @task()
+    def extract_accounts_task() -> list[str]:
+        from etl.recently_played.extract_accounts import extract_active_accounts
+
+        # Every active account in spotify_account, fetched concurrently under one rate limiter
+        with stage("dag.extract_accounts_task") as metrics:
+            prefixes = extract_active_accounts(hours=12, max_workers=EXTRACT_MAX_WORKERS)
+            metrics.rows_out = len(prefixes)
+            logger.info(f"Extracted {len(prefixes)} account prefixes")
+            return prefixes
+
+    @task()
+    def transform_upload_task(prefix: str) -> str:
+        from etl.recently_played.transform import transform_and_upload
+
+        with stage("dag.transform_upload_task", prefix=prefix):
+            _, rows = transform_and_upload(prefix, TRANSFORM_ENGINE)
+            logger.info(f"Transformed {rows} rows for prefix={prefix}")
+            return prefix
+
+    # Loads of different listeners touch the same dimension rows; cap how many run at once
+    @task(max_active_tis_per_dagrun=BACKFILL_DB_CONCURRENCY)
+    def load_task(prefix: str, params: dict | None = None) -> str:
+        from etl.recently_played.load import download_processed, load_to_postgres
+
+        with stage("dag.load_task", prefix=prefix) as metrics:
+            load_mode = (params or {}).get("load_mode", LOAD_MODE)
+            df = download_processed(prefix)
+            loaded = load_to_postgres(df, mode=load_mode, prefix=prefix)
+            metrics.rows_in, metrics.rows_out = len(df), loaded
+            logger.info(f"Loaded {loaded} of {len(df)} rows for prefix={prefix}")
+            return prefix
+
+    @task(max_active_tis_per_dagrun=BACKFILL_DB_CONCURRENCY)
+    def update_taste_profile_task(prefix: str):
+        from recommendations.taste_profile import refresh_taste_profile
+        from etl.recently_played.load import download_processed
+
+        with stage("dag.update_taste_profile_task", prefix=prefix):
+            refresh_taste_profile(download_processed(prefix), prefix)
+
+    # DAG flow: one mapped task instance per account prefix
+    prefixes = extract_accounts_task()
+    uploaded = transform_upload_task.expand(prefix=prefixes)
+    loaded = load_task.expand(prefix=uploaded)
+    if TASTE_PROFILE_UPDATE:
+        update_taste_profile_task.expand(prefix=loaded)
+
+
+recently_played_accounts_dag = recently_played_accounts_dag()
@@ -1,17 +1,18 @@
 from airflow.decorators import dag, task
+from airflow.exceptions import AirflowSkipException
 from datetime import datetime, timedelta
 import sys
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 sys.path.append('/opt/airflow')
 
-# Import modular functions
-from etl.recently_played.extract import get_access_token, get_last_window_timestamp_ms, fetch_recently_played, upload_raw, write_success_marker
-from etl.recently_played.transform import download_raw, transform, upload_transformed
-from etl.recently_played.load import download_processed, load_to_postgres
+# The scheduler re-parses this file constantly: only config and the stdlib-only
+# metrics helper are imported here. Each task imports the ETL modules it runs
+# (pandas, pyarrow, minio, psycopg2) when it executes.
+from etl.utils.metrics import stage
+from config import LOAD_MODE, TRANSFORM_HANDOFF, TRANSFORM_ENGINE, ENRICH_TRACKS, TASTE_PROFILE_UPDATE
 
 
 default_args = {"owner": "airflow", "retries": 1, "retry_delay": timedelta(minutes=5)}
@@ -23,65 +24,126 @@ default_args = {"owner": "airflow", "retries": 1, "retry_delay": timedelta(minut
     start_date=datetime(2025, 1, 1),
     catchup=False,
     tags=["spotify", "etl"],
+    params={"load_mode": LOAD_MODE},  # "row" or "bulk"
 )
 def recently_played_dag():
 
     @task()
     def extract_task() -> str:
+        from etl.recently_played.extract import (
+            get_access_token, get_last_window_timestamp_ms, extract_to_raw, read_watermark,
+        )
+
         logger.info("Starting extract_task...")
 
-        token = get_access_token()
+        get_access_token()  # warms the shared client's token cache
         logger.info("Got Spotify access token")
 
-        after_ms, window_start = get_last_window_timestamp_ms(hours=12)
+        fallback_ms, window_start = get_last_window_timestamp_ms(hours=12)
         prefix = window_start.strftime("%Y-%m-%d-%H")
-        logger.info(f"Window start={window_start}, prefix={prefix}")
-
-        records = fetch_recently_played(after_ms, token)
-        logger.info(f"Fetched {len(records)} records")
+        with stage("dag.extract_task", prefix=prefix) as metrics:
+            # Resume from the last ingested play; the wall-clock window is only
+            # used on the very first run
+            after_ms = read_watermark()
+            if after_ms is None:
+                after_ms = fallback_ms
+            logger.info(f"Fetching plays after {after_ms}, prefix={prefix}")
+
+            # Pages are written to raw/ as they arrive; the marker and the
+            # watermark follow once the object is complete
+            records = extract_to_raw(after_ms, prefix)
+            logger.info(f"Uploaded {records} raw records with prefix={prefix}")
+            metrics.rows_out = records
+            if records == 0:
+                # Nothing new since the watermark: skip transform and load
+                raise AirflowSkipException(f"No new plays for prefix={prefix}")
+
+            return prefix
 
-        upload_raw(records, prefix)
-        logger.info(f"Uploaded raw data with prefix={prefix}")
-
-        write_success_marker("spotify-data", prefix)
-        logger.info("Success marker written")
+    @task()
+    def enrich_task(prefix: str) -> str:
+        from etl.recently_played.enrich import enrich_prefix
 
-        return prefix
+        with stage("dag.enrich_task", prefix=prefix):
+            logger.info(f"Starting enrich_task for prefix={prefix}")
+            enrich_prefix(prefix)
+            return prefix
 
     @task()
     def transform_task(prefix: str) -> dict:
-        logger.info(f"Starting transform_task for prefix={prefix}")
-        df_raw = download_raw(prefix)
-        logger.info(f"Downloaded raw data: {len(df_raw)} rows")
+        from etl.recently_played.transform import transform_and_upload
 
-        df_clean = transform(df_raw)
-        logger.info(f"Transformed data: {len(df_clean)} rows")
-
-        return {"prefix": prefix, "df_clean": df_clean.to_json()}
+        with stage("dag.transform_task", prefix=prefix):
+            logger.info(f"Starting transform_task for prefix={prefix}, engine={TRANSFORM_ENGINE}")
+            # Only the object key goes through XCom
+            key, rows = transform_and_upload(prefix, TRANSFORM_ENGINE, intermediate=True)
+            logger.info(f"Transformed data: {rows} rows written to {key}")
+            return {"prefix": prefix, "key": key}
 
     @task()
     def upload_transformed_task(data: dict) -> str:
-        import pandas as pd
+        from etl.recently_played.transform import publish_intermediate
+
         prefix = data["prefix"]
-        df_clean = pd.read_json(data["df_clean"])
-        upload_transformed(df_clean, prefix)
-        logger.info(f"Uploaded transformed data for prefix={prefix}")
-        return prefix
+        with stage("dag.upload_transformed_task", prefix=prefix):
+            publish_intermediate(data["key"], prefix)
+            logger.info(f"Uploaded transformed data for prefix={prefix}")
+            return prefix
+
+    @task()
+    def transform_upload_task(prefix: str) -> str:
+        from etl.recently_played.transform import transform_and_upload
+
+        with stage("dag.transform_upload_task", prefix=prefix):
+            logger.info(f"Starting fused transform/upload for prefix={prefix}, engine={TRANSFORM_ENGINE}")
+            key, rows = transform_and_upload(prefix, TRANSFORM_ENGINE)
+            logger.info(f"Uploaded {rows} transformed rows to {key}")
+            return prefix
+
+    @task()
+    def load_task(prefix: str, params: dict | None = None):
+        from etl.recently_played.load import download_processed, load_to_postgres
+
+        with stage("dag.load_task", prefix=prefix) as metrics:
+            load_mode = (params or {}).get("load_mode", LOAD_MODE)
+            logger.info(f"Starting load_task for prefix={prefix}, load_mode={load_mode}")
+            df = download_processed(prefix)
+            logger.info(f"Downloaded processed data: {len(df)} rows")
+
+            # The load ledger makes retries of this task a no-op for applied events
+            loaded = load_to_postgres(df, mode=load_mode, prefix=prefix)
+            metrics.rows_in, metrics.rows_out = len(df), loaded
+            logger.info(f"Loaded {loaded} of {len(df)} rows into Postgres successfully")
+
+            if ENRICH_TRACKS:
+                from etl.recently_played.enrich import load_enriched
+
+                load_enriched(prefix)
+            return prefix
 
     @task()
-    def load_task(prefix: str):
-        logger.info(f"Starting load_task for prefix={prefix}")
-        df = download_processed(prefix)
-        logger.info(f"Downloaded processed data: {len(df)} rows")
+    def update_taste_profile_task(prefix: str):
+        from recommendations.taste_profile import refresh_taste_profile
+        from etl.recently_played.load import download_processed
 
-        load_to_postgres(df)
-        logger.info(f"Loaded {len(df)} rows into Postgres successfully")
+        with stage("dag.update_taste_profile_task", prefix=prefix):
+            logger.info(f"Updating taste profile for prefix={prefix}")
+            df = download_processed(prefix)
+            # Only the plays this prefix newly applied are folded in
+            refresh_taste_profile(df, prefix)
 
     # DAG flow
     prefix = extract_task()
-    transform_result = transform_task(prefix)
-    uploaded_prefix = upload_transformed_task(transform_result)
-    load_task(uploaded_prefix)
+    if ENRICH_TRACKS:
+        prefix = enrich_task(prefix)
+    if TRANSFORM_HANDOFF == "fused":
+        uploaded_prefix = transform_upload_task(prefix)
+    else:
+        transform_result = transform_task(prefix)
+        uploaded_prefix = upload_transformed_task(transform_result)
+    loaded_prefix = load_task(uploaded_prefix)
+    if TASTE_PROFILE_UPDATE:
+        update_taste_profile_task(loaded_prefix)
 
 
 recently_played_dag = recently_played_dag()
\ No newline at end of file
@@ -0,0 +1,27 @@
+-- Migrate dim_date from BIGSERIAL surrogate keys to computed yyyymmddhh keys.
+-- Remaps fact_play_summary.date_key in the same transaction. Old serial keys
+-- are far below 1970010100, so old and new keys never collide mid-update.
+BEGIN;
+
+ALTER TABLE fact_play_summary
+    DROP CONSTRAINT IF EXISTS fact_play_summary_date_key_fkey;
+
+UPDATE fact_play_summary f
+SET date_key = d.year::BIGINT * 1000000 + d.month * 10000 + d.day * 100 + d.hour_of_day
+FROM dim_date d
+WHERE f.date_key = d.date_key;
+
+UPDATE dim_date
+SET date_key = year::BIGINT * 1000000 + month * 10000 + day * 100 + hour_of_day;
+
+ALTER TABLE dim_date ALTER COLUMN date_key DROP DEFAULT;
+DROP SEQUENCE IF EXISTS dim_date_date_key_seq;
+
+ALTER TABLE fact_play_summary
+    ADD CONSTRAINT fact_play_summary_date_key_fkey
+    FOREIGN KEY (date_key) REFERENCES dim_date (date_key);
+
+COMMIT;
+
+-- Afterwards pre-generate the calendar:
+--   python -m etl.utils.date_dim --start "2020-01-01 00:00" --end "2030-12-31 23:00"
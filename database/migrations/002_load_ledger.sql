@@ -0,0 +1,18 @@
+-- Load ledger for idempotent loads. Prefixes loaded before this migration are
+-- not in the ledger; record them once without re-applying their facts:
+--   python -m etl.recently_played.load mark-applied <prefix>
+CREATE TABLE IF NOT EXISTS load_ledger (
+    prefix VARCHAR PRIMARY KEY,
+    row_count BIGINT NOT NULL,
+    applied_events BIGINT NOT NULL DEFAULT 0,
+    loaded_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS load_ledger_event (
+    song_id VARCHAR NOT NULL,
+    played_at TIMESTAMPTZ NOT NULL,
+    prefix VARCHAR,
+    PRIMARY KEY (song_id, played_at)
+);
+
+CREATE INDEX IF NOT EXISTS load_ledger_event_prefix_idx ON load_ledger_event (prefix);
@@ -0,0 +1,28 @@
+-- Incrementally maintained taste profile. The first update after this
+-- migration builds the profile from full play history.
+-- Decayed taste profile: running sum of feature vectors weighted by
+-- exp(-(as_of - played_at) / tau_seconds), updated from newly loaded plays
+CREATE TABLE IF NOT EXISTS taste_profile (
+    profile_id VARCHAR PRIMARY KEY,
+    feature_hash VARCHAR NOT NULL,
+    decayed_sum DOUBLE PRECISION[] NOT NULL,
+    weight_sum DOUBLE PRECISION NOT NULL,
+    as_of TIMESTAMPTZ NOT NULL,
+    tau_seconds DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Tracks already folded into a profile, excluded from its recommendations
+CREATE TABLE IF NOT EXISTS taste_profile_track (
+    profile_id VARCHAR NOT NULL,
+    track_id VARCHAR NOT NULL,
+    PRIMARY KEY (profile_id, track_id)
+);
+
+-- Load prefixes already folded into a profile
+CREATE TABLE IF NOT EXISTS taste_profile_prefix (
+    profile_id VARCHAR NOT NULL,
+    prefix VARCHAR NOT NULL,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (profile_id, prefix)
+);
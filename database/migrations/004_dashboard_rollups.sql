@@ -0,0 +1,56 @@
+-- Dashboard rollups and fact foreign key indexes. The rollups are backfilled
+-- from existing facts here; afterwards every load keeps them current.
+-- Repair at any time with: python -m etl.utils.rollups
+
+-- Foreign key lookups on the fact table. song_key leads the natural key's
+-- unique index until 005 puts user_key in front and adds
+-- fact_play_summary_song_key_idx; 006 replaces date_key_idx with BRIN indexes.
+CREATE INDEX IF NOT EXISTS fact_play_summary_artist_key_idx ON fact_play_summary (artist_key);
+CREATE INDEX IF NOT EXISTS fact_play_summary_date_key_idx ON fact_play_summary (date_key);
+
+-- Dashboard rollups, kept current by the load step (etl/utils/rollups.py)
+CREATE TABLE IF NOT EXISTS rollup_hour_dow (
+    day_of_week VARCHAR NOT NULL,
+    hour_of_day INT NOT NULL,
+    play_count BIGINT NOT NULL DEFAULT 0,
+    total_duration_ms BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day_of_week, hour_of_day)
+);
+
+CREATE TABLE IF NOT EXISTS rollup_artist (
+    artist_key BIGINT PRIMARY KEY REFERENCES dim_artist (artist_key),
+    play_count BIGINT NOT NULL DEFAULT 0,
+    total_duration_ms BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS rollup_song_hour (
+    song_key BIGINT NOT NULL REFERENCES dim_song (song_key),
+    hour_of_day INT NOT NULL,
+    play_count BIGINT NOT NULL DEFAULT 0,
+    total_duration_ms BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (song_key, hour_of_day)
+);
+
+CREATE INDEX IF NOT EXISTS rollup_artist_play_count_idx ON rollup_artist (play_count DESC);
+CREATE INDEX IF NOT EXISTS rollup_song_hour_play_count_idx ON rollup_song_hour (play_count DESC);
+
+BEGIN;
+TRUNCATE rollup_hour_dow, rollup_artist, rollup_song_hour;
+
+INSERT INTO rollup_hour_dow (day_of_week, hour_of_day, play_count, total_duration_ms)
+SELECT COALESCE(d.day_of_week, 'Unknown'), d.hour_of_day, SUM(f.play_count), SUM(f.total_duration_ms)
+FROM fact_play_summary f
+JOIN dim_date d ON f.date_key = d.date_key
+GROUP BY 1, d.hour_of_day;
+
+INSERT INTO rollup_artist (artist_key, play_count, total_duration_ms)
+SELECT artist_key, SUM(play_count), SUM(total_duration_ms)
+FROM fact_play_summary
+GROUP BY artist_key;
+
+INSERT INTO rollup_song_hour (song_key, hour_of_day, play_count, total_duration_ms)
+SELECT f.song_key, d.hour_of_day, SUM(f.play_count), SUM(f.total_duration_ms)
+FROM fact_play_summary f
+JOIN dim_date d ON f.date_key = d.date_key
+GROUP BY f.song_key, d.hour_of_day;
+COMMIT;
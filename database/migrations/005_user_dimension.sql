@@ -0,0 +1,57 @@
+-- Per-listener warehouse for multi-account extraction. Existing facts,
+-- ledger events and recommendations belong to the configured single
+-- account, user_key 0. Add accounts with:
+--   python -m etl.utils.accounts add <account_id> <refresh_token>
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS dim_user (
+    user_key BIGSERIAL PRIMARY KEY,
+    account_id VARCHAR UNIQUE NOT NULL,
+    display_name VARCHAR
+);
+
+INSERT INTO dim_user (user_key, account_id) VALUES (0, 'default') ON CONFLICT DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS spotify_account (
+    account_id VARCHAR PRIMARY KEY REFERENCES dim_user (account_id),
+    refresh_token VARCHAR NOT NULL,
+    active BOOLEAN NOT NULL DEFAULT TRUE,
+    added_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Drop the old single-listener unique constraints (their generated names
+-- depend on identifier truncation, so look them up)
+DO $$
+DECLARE
+    c RECORD;
+BEGIN
+    FOR c IN
+        SELECT conrelid::regclass AS tbl, conname
+        FROM pg_constraint
+        WHERE contype = 'u'
+          AND conrelid IN ('fact_play_summary'::regclass, 'recommendation_list'::regclass)
+    LOOP
+        EXECUTE format('ALTER TABLE %s DROP CONSTRAINT %I', c.tbl, c.conname);
+    END LOOP;
+END $$;
+
+-- Facts: the natural key now includes the listener
+ALTER TABLE fact_play_summary
+    ADD COLUMN IF NOT EXISTS user_key BIGINT NOT NULL DEFAULT 0 REFERENCES dim_user (user_key);
+ALTER TABLE fact_play_summary
+    ADD CONSTRAINT fact_play_summary_user_natural_key UNIQUE (user_key, song_key, artist_key, date_key);
+-- song_key was covered by the old unique constraint
+CREATE INDEX IF NOT EXISTS fact_play_summary_song_key_idx ON fact_play_summary (song_key);
+
+-- Ledger events: two listeners can play the same track at the same instant
+ALTER TABLE load_ledger_event ADD COLUMN IF NOT EXISTS user_key BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE load_ledger_event DROP CONSTRAINT IF EXISTS load_ledger_event_pkey;
+ALTER TABLE load_ledger_event ADD PRIMARY KEY (user_key, song_id, played_at);
+
+-- Recommendations are kept per listener
+ALTER TABLE recommendation_list
+    ADD COLUMN IF NOT EXISTS user_key BIGINT NOT NULL DEFAULT 0 REFERENCES dim_user (user_key);
+ALTER TABLE recommendation_list
+    ADD CONSTRAINT recommendation_list_user_natural_key UNIQUE (user_key, track_name, artist_name, week_of_year, year);
+
+COMMIT;
@@ -0,0 +1,89 @@
+-- Monthly range partitioning of fact_play_summary on date_key, BRIN
+-- indexes for time-range scans and the archive bookkeeping table.
+-- Rebuilds the table in one transaction: existing rows are copied into one
+-- partition per local month and play_id keeps its sequence.
+-- Archive cold months afterwards with: python -m etl.utils.archive archive
+BEGIN;
+
+ALTER TABLE fact_play_summary RENAME TO fact_play_summary_unpartitioned;
+-- Free the index and constraint names for the partitioned table
+ALTER TABLE fact_play_summary_unpartitioned DROP CONSTRAINT IF EXISTS fact_play_summary_user_natural_key;
+DROP INDEX IF EXISTS fact_play_summary_artist_key_idx;
+DROP INDEX IF EXISTS fact_play_summary_date_key_idx;
+DROP INDEX IF EXISTS fact_play_summary_song_key_idx;
+
+CREATE TABLE fact_play_summary (
+    play_id BIGINT NOT NULL DEFAULT nextval('fact_play_summary_play_id_seq'),
+    user_key BIGINT NOT NULL DEFAULT 0 REFERENCES dim_user (user_key),
+    song_key BIGINT REFERENCES dim_song (song_key),
+    artist_key BIGINT REFERENCES dim_artist (artist_key),
+    date_key BIGINT REFERENCES dim_date (date_key),
+    play_count BIGINT NOT NULL DEFAULT 0,
+    total_duration_ms BIGINT NOT NULL DEFAULT 0,
+    played_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (play_id, date_key),
+    CONSTRAINT fact_play_summary_user_natural_key UNIQUE (
+        user_key,
+        song_key,
+        artist_key,
+        date_key
+    )
+) PARTITION BY RANGE (date_key);
+-- Keep the sequence when the old table is dropped
+ALTER SEQUENCE fact_play_summary_play_id_seq OWNED BY fact_play_summary.play_id;
+
+CREATE TABLE fact_play_summary_default PARTITION OF fact_play_summary DEFAULT;
+
+CREATE INDEX fact_play_summary_artist_key_idx ON fact_play_summary (artist_key);
+CREATE INDEX fact_play_summary_song_key_idx ON fact_play_summary (song_key);
+CREATE INDEX fact_play_summary_date_key_brin ON fact_play_summary USING BRIN (date_key);
+CREATE INDEX fact_play_summary_played_at_brin ON fact_play_summary USING BRIN (played_at);
+
+CREATE TABLE IF NOT EXISTS fact_play_archive (
+    month_key INT PRIMARY KEY,
+    object_key VARCHAR NOT NULL,
+    row_count BIGINT NOT NULL,
+    archived_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION ensure_fact_play_partition(month_key INT) RETURNS TEXT AS $$
+DECLARE
+    part TEXT := format('fact_play_summary_%s', month_key);
+    lo BIGINT := month_key::BIGINT * 10000 + 100;
+    hi BIGINT := to_char(to_date(month_key::TEXT, 'YYYYMM') + INTERVAL '1 month', 'YYYYMM')::BIGINT * 10000 + 100;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(part)) THEN
+        RETURN part;
+    END IF;
+    PERFORM pg_advisory_xact_lock(hashtext('fact_play_summary_partitions'));
+    IF EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(part)) THEN
+        RETURN part;
+    END IF;
+    IF EXISTS (SELECT 1 FROM fact_play_archive a WHERE a.month_key = ensure_fact_play_partition.month_key) THEN
+        RETURN NULL;
+    END IF;
+
+    EXECUTE format('CREATE TABLE IF NOT EXISTS %I (LIKE fact_play_summary INCLUDING DEFAULTS)', part);
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM fact_play_summary_default WHERE date_key >= %s AND date_key < %s RETURNING *) '
+        'INSERT INTO %I SELECT * FROM moved', lo, hi, part
+    );
+    EXECUTE format('ALTER TABLE fact_play_summary ATTACH PARTITION %I FOR VALUES FROM (%s) TO (%s)', part, lo, hi);
+    RETURN part;
+END;
+$$ LANGUAGE plpgsql;
+
+-- One partition per month that already has plays, then copy the rows over
+SELECT ensure_fact_play_partition(m)
+FROM (SELECT DISTINCT (date_key / 10000)::INT AS m FROM fact_play_summary_unpartitioned
+      WHERE date_key IS NOT NULL ORDER BY 1) months;
+
+INSERT INTO fact_play_summary (
+    play_id, user_key, song_key, artist_key, date_key, play_count, total_duration_ms, played_at
+)
+SELECT play_id, user_key, song_key, artist_key, date_key, play_count, total_duration_ms, played_at
+FROM fact_play_summary_unpartitioned;
+
+DROP TABLE fact_play_summary_unpartitioned;
+
+COMMIT;
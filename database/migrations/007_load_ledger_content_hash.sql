@@ -0,0 +1,5 @@
+-- Content hash of the processed prefix a ledger entry was loaded from, so a
+-- rewritten prefix with the same row count is loaded again. Entries written
+-- before this migration have no hash and are re-checked against the event
+-- ledger on their next load.
+ALTER TABLE load_ledger ADD COLUMN IF NOT EXISTS content_hash VARCHAR;
@@ -0,0 +1,24 @@
+-- Track metadata and audio features from the enrich step (ENRICH_TRACKS),
+-- keyed by dim_song.song_id. Filled by load_task after each load.
+CREATE TABLE IF NOT EXISTS dim_song_attributes (
+    song_id VARCHAR PRIMARY KEY,
+    album_id VARCHAR,
+    album_name VARCHAR,
+    release_date VARCHAR,
+    popularity INT,
+    explicit BOOLEAN,
+    isrc VARCHAR,
+    danceability DOUBLE PRECISION,
+    energy DOUBLE PRECISION,
+    key INT,
+    loudness DOUBLE PRECISION,
+    mode INT,
+    speechiness DOUBLE PRECISION,
+    acousticness DOUBLE PRECISION,
+    instrumentalness DOUBLE PRECISION,
+    liveness DOUBLE PRECISION,
+    valence DOUBLE PRECISION,
+    tempo DOUBLE PRECISION,
+    time_signature INT,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
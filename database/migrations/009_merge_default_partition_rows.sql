@@ -0,0 +1,64 @@
+-- Moving a month's rows out of the default partition copied them one for
+-- one, so two rows with the same natural key (late plays of a restored
+-- archive month, or rows already in the partition table) made the ATTACH
+-- fail. The move now sums them per natural key first.
+-- Move a month's rows out of the default partition into its partition table
+-- (not yet attached). Rows are summed per natural key and added to rows the
+-- table already holds (a restored archive month), the way the loaders
+-- upsert, so the ATTACH that follows never sees a duplicate key.
+CREATE OR REPLACE FUNCTION move_default_fact_rows(part TEXT, lo BIGINT, hi BIGINT) RETURNS VOID AS $$
+BEGIN
+    EXECUTE format($sql$
+        WITH moved AS (
+            DELETE FROM fact_play_summary_default WHERE date_key >= %1$s AND date_key < %2$s RETURNING *
+        ), merged AS (
+            SELECT MIN(play_id) AS play_id, user_key, song_key, artist_key, date_key,
+                   SUM(play_count) AS play_count, SUM(total_duration_ms) AS total_duration_ms,
+                   MAX(played_at) AS played_at
+            FROM moved
+            GROUP BY user_key, song_key, artist_key, date_key
+        ), updated AS (
+            UPDATE %3$I p
+            SET play_count = p.play_count + m.play_count,
+                total_duration_ms = p.total_duration_ms + m.total_duration_ms,
+                played_at = GREATEST(p.played_at, m.played_at)
+            FROM merged m
+            WHERE (p.user_key, p.song_key, p.artist_key, p.date_key)
+                  = (m.user_key, m.song_key, m.artist_key, m.date_key)
+            RETURNING m.play_id
+        )
+        INSERT INTO %3$I (play_id, user_key, song_key, artist_key, date_key, play_count, total_duration_ms, played_at)
+        SELECT play_id, user_key, song_key, artist_key, date_key, play_count, total_duration_ms, played_at
+        FROM merged
+        WHERE play_id NOT IN (SELECT play_id FROM updated)
+    $sql$, lo, hi, part);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Attach the partition for a local month (yyyymm) if it does not exist yet,
+-- moving any of its rows out of the default partition. Archived months get
+-- no new partition: late rows for them stay in the default partition.
+CREATE OR REPLACE FUNCTION ensure_fact_play_partition(month_key INT) RETURNS TEXT AS $$
+DECLARE
+    part TEXT := format('fact_play_summary_%s', month_key);
+    lo BIGINT := month_key::BIGINT * 10000 + 100;
+    hi BIGINT := to_char(to_date(month_key::TEXT, 'YYYYMM') + INTERVAL '1 month', 'YYYYMM')::BIGINT * 10000 + 100;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(part)) THEN
+        RETURN part;
+    END IF;
+    -- Concurrent loads of the same new month: one creates it, the others wait
+    PERFORM pg_advisory_xact_lock(hashtext('fact_play_summary_partitions'));
+    IF EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(part)) THEN
+        RETURN part;
+    END IF;
+    IF EXISTS (SELECT 1 FROM fact_play_archive a WHERE a.month_key = ensure_fact_play_partition.month_key) THEN
+        RETURN NULL;
+    END IF;
+
+    EXECUTE format('CREATE TABLE IF NOT EXISTS %I (LIKE fact_play_summary INCLUDING DEFAULTS)', part);
+    PERFORM move_default_fact_rows(part, lo, hi);
+    EXECUTE format('ALTER TABLE fact_play_summary ATTACH PARTITION %I FOR VALUES FROM (%s) TO (%s)', part, lo, hi);
+    RETURN part;
+END;
+$$ LANGUAGE plpgsql;
@@ -12,8 +12,33 @@ CREATE TABLE IF NOT EXISTS dim_song (
     song_duration_ms BIGINT
 );
 
+-- Enriched track metadata and audio features (ENRICH_TRACKS), by song_id
+CREATE TABLE IF NOT EXISTS dim_song_attributes (
+    song_id VARCHAR PRIMARY KEY,
+    album_id VARCHAR,
+    album_name VARCHAR,
+    release_date VARCHAR,
+    popularity INT,
+    explicit BOOLEAN,
+    isrc VARCHAR,
+    danceability DOUBLE PRECISION,
+    energy DOUBLE PRECISION,
+    key INT,
+    loudness DOUBLE PRECISION,
+    mode INT,
+    speechiness DOUBLE PRECISION,
+    acousticness DOUBLE PRECISION,
+    instrumentalness DOUBLE PRECISION,
+    liveness DOUBLE PRECISION,
+    valence DOUBLE PRECISION,
+    tempo DOUBLE PRECISION,
+    time_signature INT,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- date_key is a smart key computed from the local hour: yyyymmddhh
 CREATE TABLE IF NOT EXISTS dim_date (
-    date_key BIGSERIAL PRIMARY KEY,
+    date_key BIGINT PRIMARY KEY,
     year INT,
     month INT,
     day INT,
@@ -28,35 +53,212 @@ CREATE TABLE IF NOT EXISTS dim_date (
     )
 );
 
+-- Listeners. user_key 0 is the single account configured through
+-- SPOTIFY_REFRESH_TOKEN; multi-account extraction adds one row per account
+CREATE TABLE IF NOT EXISTS dim_user (
+    user_key BIGSERIAL PRIMARY KEY,
+    account_id VARCHAR UNIQUE NOT NULL,
+    display_name VARCHAR
+);
+
+INSERT INTO dim_user (user_key, account_id) VALUES (0, 'default') ON CONFLICT DO NOTHING;
+
+-- Accounts and refresh tokens read by multi-account extraction
+CREATE TABLE IF NOT EXISTS spotify_account (
+    account_id VARCHAR PRIMARY KEY REFERENCES dim_user (account_id),
+    refresh_token VARCHAR NOT NULL,
+    active BOOLEAN NOT NULL DEFAULT TRUE,
+    added_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
 -- Fact
 CREATE TABLE IF NOT EXISTS fact_play_summary (
-    play_id BIGSERIAL PRIMARY KEY,
+    play_id BIGSERIAL,
+    user_key BIGINT NOT NULL DEFAULT 0 REFERENCES dim_user (user_key),
     song_key BIGINT REFERENCES dim_song (song_key),
     artist_key BIGINT REFERENCES dim_artist (artist_key),
     date_key BIGINT REFERENCES dim_date (date_key),
     play_count BIGINT NOT NULL DEFAULT 0,
     total_duration_ms BIGINT NOT NULL DEFAULT 0,
     played_at TIMESTAMPTZ NOT NULL,
-    UNIQUE (
+    PRIMARY KEY (play_id, date_key),
+    CONSTRAINT fact_play_summary_user_natural_key UNIQUE (
+        user_key,
         song_key,
         artist_key,
         date_key
     )
+) PARTITION BY RANGE (date_key);
+
+-- Monthly partitions on the local month of date_key (yyyymm0100 up to the
+-- next month), created on demand by ensure_fact_play_partition; rows with no
+-- matching partition land in the default partition until one is created
+CREATE TABLE IF NOT EXISTS fact_play_summary_default PARTITION OF fact_play_summary DEFAULT;
+
+-- Foreign key lookups on the fact table; user_key is covered by the unique constraint
+CREATE INDEX IF NOT EXISTS fact_play_summary_artist_key_idx ON fact_play_summary (artist_key);
+CREATE INDEX IF NOT EXISTS fact_play_summary_song_key_idx ON fact_play_summary (song_key);
+-- Plays arrive roughly in time order, so block-range indexes serve time-range scans
+CREATE INDEX IF NOT EXISTS fact_play_summary_date_key_brin ON fact_play_summary USING BRIN (date_key);
+CREATE INDEX IF NOT EXISTS fact_play_summary_played_at_brin ON fact_play_summary USING BRIN (played_at);
+
+-- Months exported to parquet and detached from fact_play_summary (etl/utils/archive.py)
+CREATE TABLE IF NOT EXISTS fact_play_archive (
+    month_key INT PRIMARY KEY,
+    object_key VARCHAR NOT NULL,
+    row_count BIGINT NOT NULL,
+    archived_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Move a month's rows out of the default partition into its partition table
+-- (not yet attached). Rows are summed per natural key and added to rows the
+-- table already holds (a restored archive month), the way the loaders
+-- upsert, so the ATTACH that follows never sees a duplicate key.
+CREATE OR REPLACE FUNCTION move_default_fact_rows(part TEXT, lo BIGINT, hi BIGINT) RETURNS VOID AS $$
+BEGIN
+    EXECUTE format($sql$
+        WITH moved AS (
+            DELETE FROM fact_play_summary_default WHERE date_key >= %1$s AND date_key < %2$s RETURNING *
+        ), merged AS (
+            SELECT MIN(play_id) AS play_id, user_key, song_key, artist_key, date_key,
+                   SUM(play_count) AS play_count, SUM(total_duration_ms) AS total_duration_ms,
+                   MAX(played_at) AS played_at
+            FROM moved
+            GROUP BY user_key, song_key, artist_key, date_key
+        ), updated AS (
+            UPDATE %3$I p
+            SET play_count = p.play_count + m.play_count,
+                total_duration_ms = p.total_duration_ms + m.total_duration_ms,
+                played_at = GREATEST(p.played_at, m.played_at)
+            FROM merged m
+            WHERE (p.user_key, p.song_key, p.artist_key, p.date_key)
+                  = (m.user_key, m.song_key, m.artist_key, m.date_key)
+            RETURNING m.play_id
+        )
+        INSERT INTO %3$I (play_id, user_key, song_key, artist_key, date_key, play_count, total_duration_ms, played_at)
+        SELECT play_id, user_key, song_key, artist_key, date_key, play_count, total_duration_ms, played_at
+        FROM merged
+        WHERE play_id NOT IN (SELECT play_id FROM updated)
+    $sql$, lo, hi, part);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Attach the partition for a local month (yyyymm) if it does not exist yet,
+-- moving any of its rows out of the default partition. Archived months get
+-- no new partition: late rows for them stay in the default partition.
+CREATE OR REPLACE FUNCTION ensure_fact_play_partition(month_key INT) RETURNS TEXT AS $$
+DECLARE
+    part TEXT := format('fact_play_summary_%s', month_key);
+    lo BIGINT := month_key::BIGINT * 10000 + 100;
+    hi BIGINT := to_char(to_date(month_key::TEXT, 'YYYYMM') + INTERVAL '1 month', 'YYYYMM')::BIGINT * 10000 + 100;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(part)) THEN
+        RETURN part;
+    END IF;
+    -- Concurrent loads of the same new month: one creates it, the others wait
+    PERFORM pg_advisory_xact_lock(hashtext('fact_play_summary_partitions'));
+    IF EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(part)) THEN
+        RETURN part;
+    END IF;
+    IF EXISTS (SELECT 1 FROM fact_play_archive a WHERE a.month_key = ensure_fact_play_partition.month_key) THEN
+        RETURN NULL;
+    END IF;
+
+    EXECUTE format('CREATE TABLE IF NOT EXISTS %I (LIKE fact_play_summary INCLUDING DEFAULTS)', part);
+    PERFORM move_default_fact_rows(part, lo, hi);
+    EXECUTE format('ALTER TABLE fact_play_summary ATTACH PARTITION %I FOR VALUES FROM (%s) TO (%s)', part, lo, hi);
+    RETURN part;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Dashboard rollups, kept current by the load step (etl/utils/rollups.py)
+CREATE TABLE IF NOT EXISTS rollup_hour_dow (
+    day_of_week VARCHAR NOT NULL,
+    hour_of_day INT NOT NULL,
+    play_count BIGINT NOT NULL DEFAULT 0,
+    total_duration_ms BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day_of_week, hour_of_day)
+);
+
+CREATE TABLE IF NOT EXISTS rollup_artist (
+    artist_key BIGINT PRIMARY KEY REFERENCES dim_artist (artist_key),
+    play_count BIGINT NOT NULL DEFAULT 0,
+    total_duration_ms BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS rollup_song_hour (
+    song_key BIGINT NOT NULL REFERENCES dim_song (song_key),
+    hour_of_day INT NOT NULL,
+    play_count BIGINT NOT NULL DEFAULT 0,
+    total_duration_ms BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (song_key, hour_of_day)
 );
 
+CREATE INDEX IF NOT EXISTS rollup_artist_play_count_idx ON rollup_artist (play_count DESC);
+CREATE INDEX IF NOT EXISTS rollup_song_hour_play_count_idx ON rollup_song_hour (play_count DESC);
+
 -- Recommendation
 CREATE TABLE IF NOT EXISTS recommendation_list (
     rec_id BIGSERIAL PRIMARY KEY,
+    user_key BIGINT NOT NULL DEFAULT 0 REFERENCES dim_user (user_key),
     track_name TEXT NOT NULL,
     artist_name TEXT NOT NULL,
     recommended_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
     week_of_year INT NOT NULL,
     year INT NOT NULL,
     rank INT NOT NULL,
-    UNIQUE (
+    CONSTRAINT recommendation_list_user_natural_key UNIQUE (
+        user_key,
         track_name,
         artist_name,
         week_of_year,
         year
     )
-);
\ No newline at end of file
+);
+
+-- Load ledger: which prefixes and which play events have been applied to
+-- fact_play_summary, so retries and reprocessing never double-count
+CREATE TABLE IF NOT EXISTS load_ledger (
+    prefix VARCHAR PRIMARY KEY,
+    row_count BIGINT NOT NULL,
+    applied_events BIGINT NOT NULL DEFAULT 0,
+    content_hash VARCHAR,
+    loaded_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS load_ledger_event (
+    user_key BIGINT NOT NULL DEFAULT 0,
+    song_id VARCHAR NOT NULL,
+    played_at TIMESTAMPTZ NOT NULL,
+    prefix VARCHAR,
+    PRIMARY KEY (user_key, song_id, played_at)
+);
+
+CREATE INDEX IF NOT EXISTS load_ledger_event_prefix_idx ON load_ledger_event (prefix);
+
+-- Decayed taste profile: running sum of feature vectors weighted by
+-- exp(-(as_of - played_at) / tau_seconds), updated from newly loaded plays
+CREATE TABLE IF NOT EXISTS taste_profile (
+    profile_id VARCHAR PRIMARY KEY,
+    feature_hash VARCHAR NOT NULL,
+    decayed_sum DOUBLE PRECISION[] NOT NULL,
+    weight_sum DOUBLE PRECISION NOT NULL,
+    as_of TIMESTAMPTZ NOT NULL,
+    tau_seconds DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Tracks already folded into a profile, excluded from its recommendations
+CREATE TABLE IF NOT EXISTS taste_profile_track (
+    profile_id VARCHAR NOT NULL,
+    track_id VARCHAR NOT NULL,
+    PRIMARY KEY (profile_id, track_id)
+);
+
+-- Load prefixes already folded into a profile
+CREATE TABLE IF NOT EXISTS taste_profile_prefix (
+    profile_id VARCHAR NOT NULL,
+    prefix VARCHAR NOT NULL,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (profile_id, prefix)
+);
@@ -0,0 +1,191 @@
+import argparse
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime
+from config import LOAD_MODE, BACKFILL_WORKERS, BACKFILL_DB_CONCURRENCY
+from etl.utils.object_store import MemoryObjectStore, get_object_store
+from etl.recently_played.transform import transform_and_upload
+from etl.recently_played.load import download_processed, load_to_postgres
+from etl.utils.db import connection
+from etl.utils.ledger import get_ledger_entry
+from etl.utils.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+PREFIX_FORMAT = "%Y-%m-%d-%H"
+
+
+def list_raw_prefixes(start: datetime, end: datetime) -> list[str]:
+    """
+    List raw/<prefix>/ windows whose start lies within [start, end], for the
+    configured account (<window>) and every other account (<account_id>/<window>).
+    """
+    store = get_object_store()
+    prefixes = []
+    for name in store.list_prefixes("raw/"):
+        if is_window(name):
+            if in_range(name, start, end):
+                prefixes.append(name)
+            continue
+        # Not a window: an account directory
+        prefixes += [
+            f"{name}/{window}" for window in store.list_prefixes(f"raw/{name}/")
+            if is_window(window) and in_range(window, start, end)
+        ]
+    return sorted(prefixes)
+
+
+def is_window(name: str) -> bool:
+    try:
+        datetime.strptime(name, PREFIX_FORMAT)
+        return True
+    except ValueError:
+        return False
+
+
+def in_range(window: str, start: datetime, end: datetime) -> bool:
+    return start <= datetime.strptime(window, PREFIX_FORMAT) <= end
+
+
+def parse_bound(value: str, end: bool = False) -> datetime:
+    """
+    A --start/--end window, "YYYY-MM-DD-HH" or "YYYY-MM-DD". A date-only end
+    bound covers that whole day, up to its 23:00 window. Raises ValueError
+    on anything else.
+    """
+    try:
+        return datetime.strptime(value, PREFIX_FORMAT)
+    except ValueError:
+        pass
+    try:
+        day = datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}") from None
+    return day.replace(hour=23) if end else day
+
+
+def has_marker(path: str) -> bool:
+    return get_object_store().exists(path)
+
+
+def is_transformed(prefix: str) -> bool:
+    return has_marker(f"processed/{prefix}/_SUCCESS")
+
+
+def is_loaded(prefix: str) -> bool:
+    """A prefix counts as loaded once the load ledger has an entry for it."""
+    with connection() as conn, conn.cursor() as cur:
+        return get_ledger_entry(cur, prefix) is not None
+
+
+def transform_prefix(prefix: str) -> dict:
+    """Download, transform and upload one raw prefix. Runs in a worker process."""
+    started = time.perf_counter()
+    with stage("backfill.transform", prefix=prefix):
+        _, rows = transform_and_upload(prefix)
+    return {"prefix": prefix, "rows": rows, "transform_s": time.perf_counter() - started}
+
+
+def load_prefix(prefix: str, load_mode: str = LOAD_MODE) -> dict:
+    started = time.perf_counter()
+    with stage("backfill.load", prefix=prefix):
+        df = download_processed(prefix)
+        loaded = load_to_postgres(df, mode=load_mode, prefix=prefix)
+    return {"prefix": prefix, "loaded": loaded, "load_s": time.perf_counter() - started}
+
+
+def format_report(results: dict[str, dict]) -> str:
+    lines = [f"{'prefix':<16} {'status':<10} {'rows':>8} {'transform_s':>12} {'load_s':>8} {'rows/s':>10}"]
+    for prefix in sorted(results):
+        r = results[prefix]
+        seconds = r.get("transform_s", 0.0) + r.get("load_s", 0.0)
+        rows = r.get("loaded", r.get("rows", 0))
+        rate = rows / seconds if seconds else 0.0
+        lines.append(
+            f"{prefix:<16} {r['status']:<10} {rows:>8} {r.get('transform_s', 0.0):>12.2f} "
+            f"{r.get('load_s', 0.0):>8.2f} {rate:>10.0f}"
+        )
+    return "\n".join(lines)
+
+
+def run_backfill(
+    start: datetime,
+    end: datetime,
+    workers: int = BACKFILL_WORKERS,
+    db_concurrency: int = BACKFILL_DB_CONCURRENCY,
+    load_mode: str = LOAD_MODE,
+    force: bool = False,
+) -> dict[str, dict]:
+    """
+    Reprocess every raw prefix in [start, end]. Transforms run in a process
+    pool; each finished prefix is queued for loading on a thread pool capped
+    at db_concurrency connections. Prefixes already marked transformed or
+    loaded are skipped, so re-running after a crash resumes where it stopped.
+    """
+    if isinstance(get_object_store(), MemoryObjectStore):
+        # Transform workers are separate processes with their own empty store
+        raise ValueError("The backfill cannot run on the memory object store; use minio or local")
+    prefixes = list_raw_prefixes(start, end)
+    logger.info(f"Backfill over {len(prefixes)} raw prefixes between {start} and {end}")
+    results = {p: {"status": "pending"} for p in prefixes}
+
+    with ProcessPoolExecutor(max_workers=workers) as transform_pool, \
+            ThreadPoolExecutor(max_workers=db_concurrency) as load_pool:
+        load_futures = {}
+        transform_futures = {}
+
+        for prefix in prefixes:
+            if force or not is_transformed(prefix):
+                transform_futures[transform_pool.submit(transform_prefix, prefix)] = prefix
+            elif is_loaded(prefix):
+                results[prefix]["status"] = "skipped"
+            else:
+                load_futures[load_pool.submit(load_prefix, prefix, load_mode)] = prefix
+
+        for future in as_completed(transform_futures):
+            prefix = transform_futures[future]
+            try:
+                results[prefix].update(future.result())
+            except Exception:
+                logger.error(f"Transform failed for prefix={prefix}", exc_info=True)
+                results[prefix]["status"] = "failed"
+                continue
+            load_futures[load_pool.submit(load_prefix, prefix, load_mode)] = prefix
+
+        for future in as_completed(load_futures):
+            prefix = load_futures[future]
+            try:
+                results[prefix].update(future.result())
+                results[prefix]["status"] = "done"
+            except Exception:
+                logger.error(f"Load failed for prefix={prefix}", exc_info=True)
+                results[prefix]["status"] = "failed"
+
+    return results
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Reprocess historical raw/ prefixes")
+    parser.add_argument("--start", required=True, help="first window, e.g. 2025-01-01 or 2025-01-01-00")
+    parser.add_argument("--end", required=True, help="last window, e.g. 2025-01-31-12; a date covers the whole day")
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS)
+    parser.add_argument("--db-concurrency", type=int, default=BACKFILL_DB_CONCURRENCY)
+    parser.add_argument("--load-mode", default=LOAD_MODE, choices=["row", "bulk"])
+    parser.add_argument("--force", action="store_true", help="reprocess even if markers exist")
+    args = parser.parse_args()
+    try:
+        start, end = parse_bound(args.start), parse_bound(args.end, end=True)
+    except ValueError as e:
+        parser.error(str(e))
+
+    results = run_backfill(
+        start,
+        end,
+        workers=args.workers,
+        db_concurrency=args.db_concurrency,
+        load_mode=args.load_mode,
+        force=args.force,
+    )
+    print(format_report(results))
@@ -0,0 +1,169 @@
+import logging
+import pandas as pd
+from config import ENRICH_CACHE_PATH
+from etl.utils.db import transaction, copy_frame
+from etl.utils.object_store import get_object_store
+from etl.utils.spotify_client import SpotifyClient, get_spotify_client
+from etl.utils.track_cache import TrackCache
+
+logger = logging.getLogger(__name__)
+
+# Spotify's several-tracks and several-audio-features endpoints accept 50 IDs
+BATCH_SIZE = 50
+
+AUDIO_FEATURES = [
+    "danceability", "energy", "key", "loudness", "mode", "speechiness",
+    "acousticness", "instrumentalness", "liveness", "valence", "tempo", "time_signature",
+]
+
+# dim_song_attributes columns, and those of them that are integers
+ATTRIBUTE_COLUMNS = [
+    "song_id", "album_id", "album_name", "release_date", "popularity", "explicit", "isrc",
+] + AUDIO_FEATURES
+INT_COLUMNS = ["popularity", "key", "mode", "time_signature"]
+
+
+def _batches(ids: list[str], size: int = BATCH_SIZE):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def fetch_tracks(song_ids: list[str], client: SpotifyClient) -> dict[str, dict]:
+    tracks = {}
+    for batch in _batches(song_ids):
+        data = client.get("tracks", params={"ids": ",".join(batch)})
+        for track in data.get("tracks", []):
+            if not track:
+                continue
+            tracks[track["id"]] = {
+                "song_id": track["id"],
+                "album_id": track.get("album", {}).get("id"),
+                "album_name": track.get("album", {}).get("name"),
+                "release_date": track.get("album", {}).get("release_date"),
+                "popularity": track.get("popularity"),
+                "explicit": track.get("explicit"),
+                "isrc": track.get("external_ids", {}).get("isrc"),
+                "artist_ids": [a["id"] for a in track.get("artists", [])],
+                "artist_names": [a["name"] for a in track.get("artists", [])],
+            }
+    return tracks
+
+
+def fetch_audio_features(song_ids: list[str], client: SpotifyClient) -> tuple[dict[str, dict], set[str]]:
+    """
+    Audio features by song_id, and the IDs whose lookup failed. The first
+    failing batch ends the lookup, so it and every later batch count as failed.
+    """
+    features = {}
+    for start in range(0, len(song_ids), BATCH_SIZE):
+        batch = song_ids[start:start + BATCH_SIZE]
+        try:
+            data = client.get("audio-features", params={"ids": ",".join(batch)})
+        except Exception:
+            # Not every app is allowed to call audio-features; keep track metadata
+            logger.warning("Audio features lookup failed; continuing without them", exc_info=True)
+            return features, set(song_ids[start:])
+        for item in data.get("audio_features", []):
+            if item:
+                features[item["id"]] = {name: item.get(name) for name in AUDIO_FEATURES}
+    return features, set()
+
+
+def enrich_tracks(song_ids, client: SpotifyClient | None = None, cache: TrackCache | None = None) -> pd.DataFrame:
+    """
+    Resolve track metadata and audio features for the given IDs. Cached
+    tracks are served from the local cache; the rest are fetched in batches
+    of 50 and written back to it. Tracks whose audio features could not be
+    fetched are cached with features_missing=True and only their features
+    are looked up again on the next run.
+    """
+    client = client or get_spotify_client()
+    owns_cache = cache is None
+    cache = cache or TrackCache(ENRICH_CACHE_PATH)
+
+    try:
+        unique_ids = sorted({str(i) for i in song_ids if pd.notna(i)})
+        cached = cache.get_many(unique_ids)
+        missing = [i for i in unique_ids if i not in cached]
+        retry = [i for i in unique_ids if cached.get(i, {}).get("features_missing")]
+
+        fetched = {}
+        if missing or retry:
+            tracks = fetch_tracks(missing, client)
+            features, failed = fetch_audio_features(missing + retry, client)
+            for song_id, track in tracks.items():
+                fetched[song_id] = {**track, **features.get(song_id, {}), "features_missing": song_id in failed}
+            for song_id in retry:
+                if song_id not in failed:
+                    fetched[song_id] = {**cached[song_id], **features.get(song_id, {}), "features_missing": False}
+            cache.put_many(fetched)
+
+        logger.info(
+            f"Enriched {len(unique_ids)} tracks: {len(cached)} from cache, {len(fetched)} fetched, "
+            f"{len(retry)} retried for audio features (hit ratio {cache.hit_ratio():.1%})"
+        )
+        return pd.DataFrame(list({**cached, **fetched}.values()))
+    finally:
+        if owns_cache:
+            cache.close()
+
+
+def upload_enriched(df: pd.DataFrame, date_prefix: str):
+    path = f"enriched/{date_prefix}/tracks.parquet"
+    get_object_store().put_parquet(path, df)
+    logger.info(f"Uploaded {len(df)} enriched tracks to {path}")
+
+
+def download_enriched(date_prefix: str) -> pd.DataFrame:
+    path = f"enriched/{date_prefix}/tracks.parquet"
+    return get_object_store().read_parquet(path)
+
+
+def raw_song_ids(date_prefix: str) -> set[str]:
+    """The distinct song IDs of a raw prefix, read chunk by chunk."""
+    from etl.recently_played.transform import iter_raw_chunks
+
+    song_ids = set()
+    for chunk in iter_raw_chunks(date_prefix):
+        if "song_id" in chunk:
+            song_ids.update(chunk["song_id"].dropna().astype(str))
+    return song_ids
+
+
+def enrich_prefix(date_prefix: str, client: SpotifyClient | None = None) -> pd.DataFrame:
+    """Enrich the tracks of a raw prefix and write enriched/<prefix>/tracks.parquet."""
+    df = enrich_tracks(raw_song_ids(date_prefix), client)
+    upload_enriched(df, date_prefix)
+    return df
+
+
+def load_enriched(date_prefix: str) -> int:
+    """
+    Upsert a prefix's enriched tracks into dim_song_attributes. Audio
+    features that could not be fetched this time keep their stored values.
+    """
+    df = download_enriched(date_prefix)
+    if df.empty:
+        return 0
+    frame = df.reindex(columns=ATTRIBUTE_COLUMNS)
+    frame[INT_COLUMNS] = frame[INT_COLUMNS].astype("Int64")
+
+    columns = ", ".join(ATTRIBUTE_COLUMNS)
+    updates = ",\n            ".join(
+        f"{c} = COALESCE(EXCLUDED.{c}, dim_song_attributes.{c})" if c in AUDIO_FEATURES else f"{c} = EXCLUDED.{c}"
+        for c in ATTRIBUTE_COLUMNS[1:]
+    )
+    with transaction() as conn, conn.cursor() as cur:
+        cur.execute("""
+            CREATE TEMP TABLE stage_song_attributes (LIKE dim_song_attributes INCLUDING DEFAULTS) ON COMMIT DROP;
+        """)
+        copy_frame(cur, "stage_song_attributes", frame, ATTRIBUTE_COLUMNS)
+        cur.execute(f"""
+            INSERT INTO dim_song_attributes ({columns}, updated_at)
+            SELECT {columns}, NOW() FROM stage_song_attributes
+            ON CONFLICT (song_id) DO UPDATE
+            SET {updates},
+            updated_at = EXCLUDED.updated_at;
+        """)
+    logger.info(f"Upserted {len(frame)} enriched tracks of prefix={date_prefix} into dim_song_attributes")
+    return len(frame)
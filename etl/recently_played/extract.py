@@ -1,21 +1,28 @@
+import itertools
 import logging
-import json, datetime, requests
+import json, datetime, tempfile
 from datetime import datetime, timedelta, timezone
-from io import BytesIO
-from config import MINIO_BUCKET
-from etl.utils.spotify_auth import refresh_access_token
-from etl.utils.minio_utils import init_minio_client
+from config import SPOTIFY_MAX_PAGES, RAW_FORMAT, RAW_SPOOL_BYTES
+from etl.utils.spotify_client import SpotifyClient, get_spotify_client
+from etl.utils.object_store import get_object_store
+from etl.utils.accounts import DEFAULT_ACCOUNT
+from etl.utils.ndjson import CONTENT_TYPES, compressed_writer, write_ndjson
+from etl.utils.metrics import instrumented
 
-# ---------- Logging Setup ----------
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s"
-)
+logger = logging.getLogger(__name__)
+
+WATERMARK_PATH = "state/recently_played/watermark.json"
+
+
+def watermark_path(account_id: str = DEFAULT_ACCOUNT) -> str:
+    if account_id == DEFAULT_ACCOUNT:
+        return WATERMARK_PATH
+    return f"state/recently_played/{account_id}/watermark.json"
 
 # ---------- Helpers ----------
 def get_access_token() -> str:
-    token = refresh_access_token()
-    logging.info("Spotify access token retrieved")
+    token = get_spotify_client().access_token()
+    logger.info("Spotify access token retrieved")
     return token
 
 def get_last_window_timestamp_ms(hours: int = 12) -> tuple[int, datetime]:
@@ -27,33 +34,149 @@ def get_last_window_timestamp_ms(hours: int = 12) -> tuple[int, datetime]:
     now = datetime.now(timezone.utc)
     window_start = now - timedelta(hours=hours)
 
-    logging.info(f"Computed ETL window start: {window_start}")
+    logger.info(f"Computed ETL window start: {window_start}")
     return int(window_start.timestamp() * 1000), window_start
 
 
-def fetch_recently_played(after_ms: int, access_token: str) -> list[dict]:
-    headers = {"Authorization": f"Bearer {access_token}"}
-    params = {"after": after_ms, "limit": 50}
-    url = "https://api.spotify.com/v1/me/player/recently-played"
-    response = requests.get(url, headers=headers, params=params)
-    response.raise_for_status()
-    data = response.json()
-    items = data.get("items", [])
-    logging.info(f"Fetched {len(items)} recently played tracks from Spotify")
-    return [
-        {
-            "song_id": item["track"]["id"],
-            "song_title": item["track"]["name"],
-            "artist_name": item["track"]["artists"][0]["name"],
-            "artist_id": item["track"]["artists"][0]["id"],
-            "played_at": item["played_at"],
-            "song_duration_ms": item["track"]["duration_ms"],
-        }
-        for item in items
-    ]
-
-def upload_raw(records: list[dict], yesterday_date):
-    client = init_minio_client()
+def played_at_ms(played_at: str) -> int:
+    """Convert a Spotify ISO-8601 played_at string to epoch milliseconds."""
+    ts = datetime.fromisoformat(played_at.replace("Z", "+00:00"))
+    return int(ts.timestamp() * 1000)
+
+
+def read_watermark(account_id: str = DEFAULT_ACCOUNT) -> int | None:
+    """Return the played_at (ms) of the newest ingested play, or None on first run."""
+    path = watermark_path(account_id)
+    try:
+        state = json.loads(get_object_store().get_bytes(path).decode("utf-8"))
+    except FileNotFoundError:
+        logger.info(f"No watermark found at {path}")
+        return None
+    logger.info(f"Read watermark played_at_ms={state['played_at_ms']}")
+    return int(state["played_at_ms"])
+
+
+def write_watermark(records: list[dict], account_id: str = DEFAULT_ACCOUNT) -> int | None:
+    """Advance the watermark to the newest played_at in records."""
+    newest = max((played_at_ms(r["played_at"]) for r in records), default=None)
+    return save_watermark(newest, account_id)
+
+
+def save_watermark(newest: int | None, account_id: str = DEFAULT_ACCOUNT) -> int | None:
+    """Advance the watermark to newest (ms); None leaves it unchanged."""
+    if newest is None:
+        logger.info("No records fetched; watermark unchanged")
+        return None
+    data_bytes = json.dumps({"played_at_ms": newest}).encode("utf-8")
+    get_object_store().put_bytes(watermark_path(account_id), data_bytes, content_type="application/json")
+    logger.info(f"Watermark for {account_id} advanced to played_at_ms={newest}")
+    return newest
+
+
+def iter_recently_played(after_ms: int, client: SpotifyClient | None = None,
+                         max_pages: int = SPOTIFY_MAX_PAGES):
+    """
+    Yield every play strictly after after_ms as a raw record, page by page,
+    following the API's `next` links (or `cursors.after` when no link is
+    given) until a page comes back empty or the cursor stops moving.
+    """
+    client = client or get_spotify_client()
+    endpoint = "me/player/recently-played"
+    url, params = endpoint, {"after": after_ms, "limit": 50}
+    cursor = after_ms
+    seen, visited = set(), set()
+    pages = 0
+
+    for _ in range(max_pages):
+        data = client.get(url, params=params)
+        pages += 1
+        visited.add((url, tuple(sorted((params or {}).items()))))
+
+        page_items = data.get("items", [])
+        for item in page_items:
+            key = (item["track"]["id"], item["played_at"])
+            if key in seen or played_at_ms(item["played_at"]) <= after_ms:
+                continue
+            seen.add(key)
+            yield raw_record(item)
+
+        if not page_items:
+            break
+        next_url = data.get("next")
+        cursor_after = (data.get("cursors") or {}).get("after")
+        if next_url:
+            url, params = next_url, None
+        elif cursor_after and int(cursor_after) > cursor:
+            # Back to the endpoint itself: a followed `next` URL already carries its own query
+            cursor = int(cursor_after)
+            url, params = endpoint, {"after": cursor, "limit": 50}
+        else:
+            break
+        if (url, tuple(sorted((params or {}).items()))) in visited:
+            break
+    else:
+        logger.warning(f"Stopped after max_pages={max_pages}; more plays may be pending")
+
+    logger.info(f"Fetched {len(seen)} recently played tracks from Spotify in {pages} page(s)")
+    logger.info(f"Spotify request latency: {client.latency_summary()}")
+
+
+def raw_record(item: dict) -> dict:
+    return {
+        "song_id": item["track"]["id"],
+        "song_title": item["track"]["name"],
+        "artist_name": item["track"]["artists"][0]["name"],
+        "artist_id": item["track"]["artists"][0]["id"],
+        "played_at": item["played_at"],
+        "song_duration_ms": item["track"]["duration_ms"],
+    }
+
+
+@instrumented("extract.fetch")
+def fetch_recently_played(after_ms: int, client: SpotifyClient | None = None,
+                          max_pages: int = SPOTIFY_MAX_PAGES) -> list[dict]:
+    """iter_recently_played, collected into a list."""
+    return list(iter_recently_played(after_ms, client, max_pages))
+
+
+@instrumented("extract.to_raw")
+def extract_to_raw(after_ms: int, date_prefix: str, client: SpotifyClient | None = None,
+                   account_id: str = DEFAULT_ACCOUNT, raw_format: str = RAW_FORMAT) -> int:
+    """
+    Stream plays after after_ms into raw/<date_prefix>/ as the pages arrive,
+    write the _SUCCESS marker, then advance the account's watermark. Returns
+    the number of records landed; with no new plays nothing is written and
+    the prefix does not exist.
+    """
+    plays = iter_recently_played(after_ms, client)
+    first = next(plays, None)
+    if first is None:
+        logger.info(f"No plays after {after_ms}; nothing landed under raw/{date_prefix}/")
+        return 0
+    landed = {"records": 0, "newest": None}
+
+    def records():
+        for record in itertools.chain([first], plays):
+            ms = played_at_ms(record["played_at"])
+            landed["records"] += 1
+            landed["newest"] = ms if landed["newest"] is None else max(landed["newest"], ms)
+            yield record
+
+    upload_raw(records(), date_prefix, raw_format)
+    write_success_marker(date_prefix)
+    save_watermark(landed["newest"], account_id)
+    return landed["records"]
+
+
+@instrumented("extract.upload_raw", count_input=True)
+def upload_raw(records, yesterday_date, raw_format: str = RAW_FORMAT):
+    """
+    Land raw records under raw/<prefix>/. The legacy "json" format writes one
+    JSON array; the ndjson formats compress records one at a time into a
+    spooled file and stream it up with a multipart upload, so records may be
+    any iterable.
+    """
+    store = get_object_store()
 
     if isinstance(yesterday_date, str):
         # If string, assume it's already like "2024/08/22"
@@ -62,15 +185,26 @@ def upload_raw(records: list[dict], yesterday_date):
         # If datetime, format it
         date_prefix = yesterday_date.strftime("%Y-%m-%d-%H")
 
-    path = f"raw/{date_prefix}/recently_played.json"
-    data_bytes = json.dumps(records, indent=2).encode("utf-8")
-    client.put_object(MINIO_BUCKET, path, BytesIO(data_bytes), length=len(data_bytes), content_type="application/json")
-    logging.info(f"Uploaded {len(records)} records to MinIO at {path}")
+    path = f"raw/{date_prefix}/recently_played.{raw_format}"
+    if raw_format == "json":
+        records = list(records)
+        data_bytes = json.dumps(records, indent=2).encode("utf-8")
+        store.put_bytes(path, data_bytes, content_type="application/json")
+        logger.info(f"Uploaded {len(records)} records to {store.bucket}/{path}")
+        return date_prefix
+
+    with tempfile.SpooledTemporaryFile(max_size=RAW_SPOOL_BYTES) as spool:
+        with compressed_writer(spool, raw_format) as writer:
+            count = write_ndjson(records, writer)
+        size = spool.tell()
+        spool.seek(0)
+        store.put_stream(path, spool, length=size, content_type=CONTENT_TYPES[raw_format])
+    logger.info(f"Uploaded {count} records ({size} compressed bytes) to {store.bucket}/{path}")
     return date_prefix
 
 
-def write_success_marker(bucket: str, date_prefix: str):
-    client = init_minio_client()
+def write_success_marker(date_prefix: str):
+    store = get_object_store()
     path = f"raw/{date_prefix}/_SUCCESS"
-    client.put_object(bucket, path, BytesIO(b""), 0, content_type="text/plain")
-    logging.info(f"Success marker written to {bucket}/{path}")
\ No newline at end of file
+    store.put_bytes(path, b"", content_type="text/plain")
+    logger.info(f"Success marker written to {store.bucket}/{path}")
\ No newline at end of file
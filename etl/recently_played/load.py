@@ -1,105 +1,350 @@
 import pandas as pd
-from io import BytesIO
 import logging
-from etl.utils.db import get_connection
+import time
+from etl.utils.db import connection, transaction, copy_frame
 from etl.utils.fact_loader import insert_fact_play_summary
-from etl.utils.dim_loader import upsert_artist, upsert_song, upsert_date
-from etl.utils.minio_utils import init_minio_client
-from config import MINIO_BUCKET
+from etl.utils.dim_cache import DimensionKeyCache
+from etl.utils.date_dim import date_key_for
+from etl.utils.bulk_loader import create_stage_table, copy_to_stage, filter_new_events, merge_stage, truncate_stage, STAGE_COLUMNS, MISSING_TEXT
+from etl.utils.partitions import ensure_month_partitions
+from etl.utils.ledger import record_event, content_hash, get_ledger_entry, is_applied, upsert_ledger_entry
+from etl.utils.rollups import RollupDelta, merge_stage_rollups
+from etl.utils.accounts import DEFAULT_USER_KEY, user_key_for_prefix
+from etl.utils.object_store import get_object_store
+from etl.utils.metrics import instrumented
+from config import LOAD_MODE, BULK_LOAD_BATCH_SIZE, DIM_CACHE_SIZE, DIM_CACHE_WARM
 
-# Configure logger
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def safe_int(value, default=0):
     """Convert value to int safely, return default if NaN."""
     return int(value) if pd.notna(value) else default
 
+@instrumented("load.download_processed")
 def download_processed(date_prefix: str) -> pd.DataFrame:
     logger.info(f"Downloading processed data for date_prefix={date_prefix}")
-    client = init_minio_client()
     path = f"processed/{date_prefix}/recently_played.parquet"
 
     try:
-        response = client.get_object(MINIO_BUCKET, path)
-        df = pd.read_parquet(BytesIO(response.read()))
+        # Ranged reads: pyarrow fetches the footer, then only the column chunks it needs
+        df = get_object_store().read_parquet(path)
         logger.info(f"Downloaded {len(df)} rows from {path}")
-    except Exception as e:
+    except Exception:
         logger.error(f"Failed to download processed data from {path}", exc_info=True)
         raise
-    finally:
-        response.close()
-        response.release_conn()
 
     return df
 
-def load_to_postgres(df: pd.DataFrame):
-    logger.info(f"Loading dataframe with {len(df)} rows into Postgres")
-    conn = get_connection()
-    cursor = conn.cursor()
+def load_row(cursor, idx, row, cache: DimensionKeyCache, prefix: str | None = None,
+             rollups: RollupDelta | None = None, user_key: int = DEFAULT_USER_KEY) -> bool:
+    """Upsert dimensions and the fact for one row. Returns False if the row was skipped."""
+    # Skip rows with missing critical values
+    if pd.isna(row.get("played_at")) or pd.isna(row.get("artist_id")) or pd.isna(row.get("song_id")):
+        logger.warning(f"Skipping row {idx} due to missing critical values: {row.to_dict()}")
+        return False
+
+    # Skip events an earlier load already applied
+    if not record_event(cursor, str(row["song_id"]), row["played_at"], prefix, user_key):
+        logger.debug(f"Skipping row {idx}: event already applied")
+        return False
+
+    # Ensure string IDs and names
+    artist_id = str(row["artist_id"])
+    song_id = str(row["song_id"])
+    artist_name = str(row["artist_name"])
+    song_title = str(row["song_title"])
+
+    # Safe numeric conversions
+    song_duration_ms = safe_int(row.get("song_duration_ms"), default=0)
+    play_count = safe_int(row.get("play_count"), default=1)
+
+    # Upsert dimension tables (only when the key is new or attributes changed)
+    artist_key = cache.artist_key(cursor, artist_id, artist_name)
+    song_key = cache.song_key(cursor, song_id, song_title, song_duration_ms)
+
+    played_at = row["played_at"]   # already datetime (UTC)
+
+    year = safe_int(row["year"])
+    month = safe_int(row["month"])
+    day = safe_int(row["day"])
+    hour_of_day = safe_int(row["hour_of_day"])
+    day_of_week = row.get("day_of_week", "Unknown")
+
+    date_key = cache.date_key(cursor, year, month, day, hour_of_day, day_of_week)
+
+    if not date_key:
+        return False
+
+    insert_fact_play_summary(
+        cursor,
+        song_key,
+        artist_key,
+        date_key,
+        played_at,
+        play_count=play_count,
+        total_duration_ms=song_duration_ms,
+        user_key=user_key,
+    )
+    if rollups is not None:
+        rollup_day = str(day_of_week) if pd.notna(day_of_week) else "Unknown"
+        rollups.add(song_key, artist_key, rollup_day, hour_of_day, play_count, song_duration_ms)
+
+    logger.debug(
+        f"Inserted fact for song_id={song_id}, artist_id={artist_id} at {played_at}"
+    )
+    return True
+
+
+def new_dim_cache(cursor) -> DimensionKeyCache:
+    cache = DimensionKeyCache(maxsize=DIM_CACHE_SIZE)
+    if DIM_CACHE_WARM:
+        artists, songs, dates = cache.warm(cursor)
+        logger.info(f"Warmed dimension cache: {artists} artists, {songs} songs, {dates} dates")
+    return cache
+
+
+def frame_date_keys(df: pd.DataFrame) -> pd.Series:
+    """date_key of every row that has one (or the local-time fields to compute it)."""
+    if "date_key" in df:
+        keys = pd.to_numeric(df["date_key"], errors="coerce")
+    else:
+        keys = pd.Series(float("nan"), index=df.index)
+    parts = df.reindex(columns=["year", "month", "day", "hour_of_day"]).apply(pd.to_numeric, errors="coerce")
+    keys = keys.fillna(date_key_for(parts["year"], parts["month"], parts["day"], parts["hour_of_day"]))
+    return keys.dropna().astype("int64")
+
+
+def load_rows(cursor, df: pd.DataFrame, cache: DimensionKeyCache, prefix: str | None = None,
+              savepoints: bool = False, user_key: int = DEFAULT_USER_KEY) -> int:
+    """
+    Row-by-row load. With savepoints=True a failing row is rolled back on its
+    own so the surrounding transaction stays usable. Rollup increments are
+    written in one batch at the end.
+    """
+    loaded = 0
+    rollups = RollupDelta()
+    ensure_month_partitions(cursor, frame_date_keys(df))
+    for idx, row in df.iterrows():
+        logger.debug(f"Processing row {idx}: {row.to_dict()}")
+
+        try:
+            if savepoints:
+                cursor.execute("SAVEPOINT load_row;")
+            if load_row(cursor, idx, row, cache, prefix, rollups, user_key):
+                loaded += 1
+            if savepoints:
+                cursor.execute("RELEASE SAVEPOINT load_row;")
+            cache.commit()
+            rollups.commit()
+        except Exception:
+            cache.rollback()
+            rollups.rollback()
+            if savepoints:
+                cursor.execute("ROLLBACK TO SAVEPOINT load_row;")
+            logger.warning(f"Skipping row {idx} due to processing error", exc_info=True)
+            # Skip row and continue
+            continue
+    rollups.flush(cursor)
+    return loaded
+
+
+def prepare_bulk_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Apply the per-row validation rules to a whole frame at once and return a
+    frame shaped like the staging table. Rows the row loader would skip are
+    dropped here with a warning.
+    """
+    missing = df["played_at"].isna() | df["artist_id"].isna() | df["song_id"].isna()
+    if missing.any():
+        logger.warning(f"Skipping {int(missing.sum())} rows due to missing critical values")
+    df = df[~missing]
+
+    out = pd.DataFrame(index=df.index)
+    out["artist_id"] = df["artist_id"].astype(str)
+    out["artist_name"] = df["artist_name"].astype(object).fillna(MISSING_TEXT).astype(str)
+    out["song_id"] = df["song_id"].astype(str)
+    out["song_title"] = df["song_title"].astype(object).fillna(MISSING_TEXT).astype(str)
+
+    duration = df["song_duration_ms"] if "song_duration_ms" in df else pd.Series(0, index=df.index)
+    play_count = df["play_count"] if "play_count" in df else pd.Series(1, index=df.index)
+    out["song_duration_ms"] = pd.to_numeric(duration, errors="coerce").fillna(0).astype("int64")
+    out["play_count"] = pd.to_numeric(play_count, errors="coerce").fillna(1).astype("int64")
+
+    out["played_at"] = pd.to_datetime(df["played_at"], errors="coerce", utc=True)
+    for col in ["year", "month", "day", "hour_of_day"]:
+        out[col] = pd.to_numeric(df[col], errors="coerce")
+    day_of_week = df["day_of_week"] if "day_of_week" in df else pd.Series("Unknown", index=df.index)
+    out["day_of_week"] = day_of_week.fillna("Unknown").astype(str)
+
+    invalid = out["played_at"].isna() | out[["year", "month", "day", "hour_of_day"]].isna().any(axis=1)
+    if invalid.any():
+        logger.warning(f"Skipping {int(invalid.sum())} rows due to unparseable date values")
+    out = out[~invalid]
+    for col in ["year", "month", "day", "hour_of_day"]:
+        out[col] = out[col].astype("int64")
+    if "date_key" in df:
+        out["date_key"] = pd.to_numeric(df.loc[out.index, "date_key"], errors="coerce")
+        out["date_key"] = out["date_key"].fillna(
+            date_key_for(out["year"], out["month"], out["day"], out["hour_of_day"])
+        ).astype("int64")
+    else:
+        out["date_key"] = date_key_for(out["year"], out["month"], out["day"], out["hour_of_day"])
+
+    out["seq"] = range(len(out))
+    return out[STAGE_COLUMNS]
+
+
+def bulk_load_rows(cursor, df: pd.DataFrame, prefix: str | None, batch_size: int = BULK_LOAD_BATCH_SIZE,
+                   user_key: int = DEFAULT_USER_KEY) -> int:
+    """
+    COPY batches into a staging table and merge them with set-based statements.
+    A batch that fails to merge is retried row by row so bad rows are skipped
+    just like in the row loader.
+    """
+    logger.info(f"Bulk loading dataframe with {len(df)} rows into Postgres (batch_size={batch_size})")
+    loaded = 0
+
+    create_stage_table(cursor)
+    for offset in range(0, len(df), batch_size):
+        batch = df.iloc[offset:offset + batch_size]
+        cursor.execute("SAVEPOINT bulk_batch;")
+        try:
+            staged = prepare_bulk_frame(batch)
+            copy_to_stage(cursor, staged)
+            new_events = filter_new_events(cursor, prefix, user_key)
+            merge_stage(cursor, user_key)
+            merge_stage_rollups(cursor)
+            truncate_stage(cursor)
+            cursor.execute("RELEASE SAVEPOINT bulk_batch;")
+            if new_events < len(staged):
+                logger.info(f"Skipped {len(staged) - new_events} already-applied events")
+            loaded += new_events
+        except Exception:
+            cursor.execute("ROLLBACK TO SAVEPOINT bulk_batch;")
+            logger.warning(
+                f"Bulk merge failed for rows {offset}-{offset + len(batch) - 1}, falling back to row load",
+                exc_info=True,
+            )
+            cache = DimensionKeyCache(maxsize=DIM_CACHE_SIZE)
+            loaded += load_rows(cursor, batch, cache, prefix, savepoints=True, user_key=user_key)
+    return loaded
+
+
+@instrumented("load.postgres", count_input=True)
+def load_to_postgres(df: pd.DataFrame, mode: str = LOAD_MODE, prefix: str | None = None, force: bool = False) -> int:
+    """
+    Load a processed frame. Every (song_id, played_at) event is recorded in
+    the load ledger, so events applied by an earlier attempt are never
+    counted twice. A prefix whose ledger entry already covers the same rows
+    (row count and content hash) is a no-op unless force=True (used to repair
+    partial loads). The listener comes from the prefix ("<account_id>/<window>").
+    """
+    if mode not in ("row", "bulk"):
+        raise ValueError(f"Unknown load mode: {mode}")
+
+    logger.info(f"Loading dataframe with {len(df)} rows into Postgres (mode={mode}, prefix={prefix})")
+    started = time.perf_counter()
 
     try:
-        for idx, row in df.iterrows():
-            logger.debug(f"Processing row {idx}: {row.to_dict()}")
-
-            try:
-                # Skip rows with missing critical values
-                if pd.isna(row.get("played_at")) or pd.isna(row.get("artist_id")) or pd.isna(row.get("song_id")):
-                    logger.warning(f"Skipping row {idx} due to missing critical values: {row.to_dict()}")
-                    continue
-
-                # Ensure string IDs and names
-                artist_id = str(row["artist_id"])
-                song_id = str(row["song_id"])
-                artist_name = str(row["artist_name"])
-                song_title = str(row["song_title"])
-
-                # Safe numeric conversions
-                song_duration_ms = safe_int(row.get("song_duration_ms"), default=0)
-                play_count = safe_int(row.get("play_count"), default=1)
-
-                # Upsert dimension tables
-                artist_key = upsert_artist(cursor, artist_id, artist_name)
-                song_key = upsert_song(cursor, song_id, song_title, song_duration_ms)
-
-                played_at = row["played_at"]   # already datetime (UTC)
-
-                year = safe_int(row["year"])
-                month = safe_int(row["month"])
-                day = safe_int(row["day"])
-                hour_of_day = safe_int(row["hour_of_day"])
-                day_of_week = row.get("day_of_week", "Unknown")
-
-                date_key = upsert_date(cursor, year, month, day, hour_of_day, day_of_week)
-
-                if date_key:
-                    insert_fact_play_summary(
-                        cursor,
-                        song_key,
-                        artist_key,
-                        date_key,
-                        played_at,
-                        play_count=play_count,
-                        total_duration_ms=song_duration_ms,
-                    )
-
-                    logger.debug(
-                        f"Inserted fact for song_id={song_id}, artist_id={artist_id} at {played_at}"
-                    )
-
-            except Exception as e:
-                logger.warning(f"Skipping row {idx} due to processing error", exc_info=True)
-                # Skip row and continue
-                continue
-
-        conn.commit()
-        logger.info("Postgres load committed successfully")
-
-    except Exception as e:
-        conn.rollback()
+        with transaction() as conn, conn.cursor() as cursor:
+            digest = content_hash(df) if prefix is not None else None
+            if prefix is not None and not force:
+                entry = get_ledger_entry(cursor, prefix)
+                if is_applied(entry, len(df), digest):
+                    logger.info(f"Prefix {prefix} already applied ({entry[1]} events); skipping load")
+                    return 0
+
+            user_key = user_key_for_prefix(cursor, prefix)
+            if mode == "bulk":
+                loaded = bulk_load_rows(cursor, df, prefix, user_key=user_key)
+            else:
+                cache = new_dim_cache(cursor)
+                # Savepoints keep the transaction usable after a failing row
+                loaded = load_rows(cursor, df, cache, prefix, savepoints=True, user_key=user_key)
+                logger.info(f"Dimension cache stats: {cache.stats()}")
+
+            if prefix is not None:
+                upsert_ledger_entry(cursor, prefix, len(df), loaded, digest)
+
+    except Exception:
         logger.error("Error during Postgres load, rolled back transaction", exc_info=True)
         raise
-    finally:
-        cursor.close()
-        conn.close()
-        logger.info("Postgres connection closed")
\ No newline at end of file
+
+    elapsed = time.perf_counter() - started
+    rate = loaded / elapsed if elapsed > 0 else 0.0
+    logger.info(f"Postgres load committed successfully: {loaded} rows in {elapsed:.2f}s ({rate:.0f} rows/sec)")
+    return loaded
+
+
+def verify_prefix(date_prefix: str) -> dict:
+    """
+    Compare a processed prefix with the load ledger. Events in the parquet
+    that the ledger has never seen mean the prefix was only partially loaded.
+    """
+    df = download_processed(date_prefix)
+    events = df.dropna(subset=["song_id", "played_at"])[["song_id", "played_at"]].drop_duplicates()
+    # Read-only: connection() rolls back, dropping the temp table
+    with connection() as conn, conn.cursor() as cursor:
+        user_key = user_key_for_prefix(cursor, date_prefix)
+        cursor.execute("""
+            CREATE TEMP TABLE verify_events (song_id VARCHAR, played_at TIMESTAMPTZ) ON COMMIT DROP;
+        """)
+        copy_frame(cursor, "verify_events", events.assign(song_id=events["song_id"].astype(str)),
+                   ["song_id", "played_at"])
+        cursor.execute("""
+            SELECT COUNT(*) FROM verify_events v
+            WHERE NOT EXISTS (
+                SELECT 1 FROM load_ledger_event e
+                WHERE e.user_key = %s AND e.song_id = v.song_id AND e.played_at = v.played_at
+            );
+        """, (user_key,))
+        missing = cursor.fetchone()[0]
+
+    if missing == 0:
+        status = "complete"
+    elif missing == len(events):
+        status = "not_loaded"
+    else:
+        status = "partial"
+    result = {"prefix": date_prefix, "events": len(events), "missing_events": missing, "status": status}
+    logger.info(f"Ledger verification: {result}")
+    return result
+
+
+def repair_prefix(date_prefix: str, mode: str = LOAD_MODE) -> int:
+    """Re-apply only the events of a prefix that the ledger has not recorded."""
+    df = download_processed(date_prefix)
+    return load_to_postgres(df, mode=mode, prefix=date_prefix, force=True)
+
+
+def mark_applied(date_prefix: str) -> int:
+    """
+    Record a prefix's events in the ledger without touching the facts. Used
+    once for prefixes that were loaded before the ledger existed.
+    """
+    df = download_processed(date_prefix)
+    with transaction() as conn, conn.cursor() as cursor:
+        create_stage_table(cursor)
+        copy_to_stage(cursor, prepare_bulk_frame(df))
+        recorded = filter_new_events(cursor, date_prefix, user_key_for_prefix(cursor, date_prefix))
+        upsert_ledger_entry(cursor, date_prefix, len(df), recorded, content_hash(df))
+    logger.info(f"Marked {recorded} events of prefix={date_prefix} as applied")
+    return recorded
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect and repair the load ledger")
+    parser.add_argument("action", choices=["verify", "repair", "mark-applied"])
+    parser.add_argument("prefix", help="processed/<prefix>/ window, e.g. 2025-01-01-00 or <account_id>/2025-01-01-00")
+    parser.add_argument("--load-mode", default=LOAD_MODE, choices=["row", "bulk"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.action == "verify":
+        print(verify_prefix(args.prefix))
+    elif args.action == "repair":
+        print(f"Applied {repair_prefix(args.prefix, args.load_mode)} missing events")
+    else:
+        print(f"Recorded {mark_applied(args.prefix)} events")
@@ -0,0 +1,437 @@
+"""
+Spark engine for large backfills. Runs the same rules as the pandas
+transform (validate_and_clean -> dedupe -> local-time fields) over many raw/
+prefixes in one job, writes the result as parquet partitioned by account and
+window, and bulk-writes the rows to Postgres over JDBC before merging them
+with the same set-based statements as the bulk loader.
+
+Runs in local mode by default (SPARK_MASTER=local[*]); only a JRE is needed.
+
+    python -m etl.recently_played.spark_engine backfill --start 2025-01-01 --end 2025-01-31-12
+    python -m etl.recently_played.spark_engine parity [--fixture benchmarks/fixtures/recently_played.json]
+"""
+import argparse
+import hashlib
+import logging
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+import pandas as pd
+from config import (
+    OBJECT_STORE_BACKEND, OBJECT_STORE_ROOT, MINIO_BUCKET, MINIO_ENDPOINT, MINIO_ACCESS_KEY, MINIO_SECRET_KEY,
+    POSTGRES_HOST, POSTGRES_PORT, POSTGRES_DB, POSTGRES_USER, POSTGRES_PASSWORD,
+    SPARK_MASTER, SPARK_PACKAGES, SPARK_PROCESSED_ROOT, SPARK_JDBC_BATCH_SIZE, SPARK_JDBC_PARTITIONS,
+)
+from etl.recently_played.transform import LOCAL_TZ, find_raw_object
+from etl.utils.accounts import DEFAULT_ACCOUNT, account_for_prefix
+from etl.utils.bulk_loader import (
+    STAGE_TABLE, STAGE_COLUMNS, MISSING_TEXT, create_stage_table, filter_new_events, merge_stage,
+)
+from etl.utils.object_store import get_object_store
+
+logger = logging.getLogger(__name__)
+
+RAW_COLUMNS = ["song_id", "song_title", "artist_name", "artist_id", "played_at", "song_duration_ms"]
+OUTPUT_COLUMNS = RAW_COLUMNS + ["played_at_local", "year", "month", "day", "hour_of_day", "day_of_week", "date_key"]
+INT_COLUMNS = ["song_duration_ms", "year", "month", "day", "hour_of_day", "date_key"]
+
+# Unlogged so JDBC inserts skip the WAL; rows live only until their prefix is merged
+SPARK_STAGE_TABLE = "spark_stage_play"
+# content_hash of a prefix without a single valid event
+EMPTY_CONTENT_HASH = hashlib.sha256(b"").hexdigest()
+
+
+# ---------- Session ----------
+def get_spark(app_name: str = "spotify-etl"):
+    from pyspark.sql import SparkSession
+
+    builder = (
+        SparkSession.builder.master(SPARK_MASTER).appName(app_name)
+        .config("spark.sql.session.timeZone", "UTC")
+        # JVM-side date handling (casts, parquet/JDBC timestamps) must not use the host zone
+        .config("spark.driver.extraJavaOptions", "-Duser.timezone=UTC")
+        .config("spark.executor.extraJavaOptions", "-Duser.timezone=UTC")
+        # Overwrite only the account/window partitions a run rewrites
+        .config("spark.sql.sources.partitionOverwriteMode", "dynamic")
+    )
+    if SPARK_PACKAGES:
+        builder = builder.config("spark.jars.packages", SPARK_PACKAGES)
+    if OBJECT_STORE_BACKEND == "minio":
+        endpoint = MINIO_ENDPOINT if "://" in (MINIO_ENDPOINT or "") else f"http://{MINIO_ENDPOINT}"
+        builder = (
+            builder.config("spark.hadoop.fs.s3a.endpoint", endpoint)
+            .config("spark.hadoop.fs.s3a.access.key", MINIO_ACCESS_KEY)
+            .config("spark.hadoop.fs.s3a.secret.key", MINIO_SECRET_KEY)
+            .config("spark.hadoop.fs.s3a.path.style.access", "true")
+            .config("spark.hadoop.fs.s3a.connection.ssl.enabled", str(endpoint.startswith("https")).lower())
+        )
+    return builder.getOrCreate()
+
+
+def object_url(key: str) -> str:
+    """Where Spark reads or writes an object-store key."""
+    if OBJECT_STORE_BACKEND == "minio":
+        return f"s3a://{MINIO_BUCKET}/{key}"
+    if OBJECT_STORE_BACKEND == "local":
+        return f"file://{os.path.abspath(os.path.join(OBJECT_STORE_ROOT, key))}"
+    raise ValueError(f"The Spark engine cannot read the {OBJECT_STORE_BACKEND} object store")
+
+
+def raw_schema():
+    from pyspark.sql.types import StructType, StructField, StringType, LongType
+
+    return StructType([
+        StructField("song_id", StringType()),
+        StructField("song_title", StringType()),
+        StructField("artist_name", StringType()),
+        StructField("artist_id", StringType()),
+        StructField("played_at", StringType()),
+        StructField("song_duration_ms", LongType()),
+    ])
+
+
+# ---------- Transform ----------
+def read_raw(spark, prefixes: list[str]):
+    """
+    All raw records of the prefixes as one frame with a `prefix` column and
+    `_row`, the record's position in its object (dedupe keeps the first).
+    Raw objects are not splittable (JSON arrays, gzip/zstd), so each object
+    is read by a single task in order.
+    """
+    from pyspark.sql import functions as F
+
+    store = get_object_store()
+    by_format = {}
+    for prefix in prefixes:
+        path, fmt = find_raw_object(store, prefix)
+        by_format.setdefault(fmt, []).append(object_url(path))
+
+    frames = []
+    for fmt, paths in by_format.items():
+        # Legacy objects are one JSON array; ndjson.* is one record per line
+        df = spark.read.schema(raw_schema()).json(paths, multiLine=(fmt == "json"))
+        frames.append(df)
+    df = frames[0]
+    for other in frames[1:]:
+        df = df.unionByName(other)
+
+    return (
+        df.withColumn("prefix", F.regexp_extract(F.input_file_name(), r"/raw/(.+)/recently_played\.[^/]+$", 1))
+        .withColumn("_row", F.monotonically_increasing_id())
+    )
+
+
+def transform_frame(df):
+    """
+    Spark version of transform(): same drops, same dedupe (first occurrence
+    of a song_id/played_at pair within a prefix) and same local-time fields.
+    played_at_local is the same instant as played_at; Spark timestamps carry
+    no zone, so readers convert it to LOCAL_TZ as the pandas engine stores it.
+    """
+    from pyspark.sql import functions as F
+    from pyspark.sql.window import Window
+
+    # validate_and_clean
+    df = df.dropna(how="all", subset=RAW_COLUMNS)
+    df = df.dropna(how="any", subset=["song_duration_ms", "played_at"])
+
+    # Malformed timestamps become null, as with pandas errors="coerce", even under ANSI mode
+    df = df.withColumn("played_at", F.try_to_timestamp("played_at"))
+
+    first = Window.partitionBy("prefix", "song_id", "played_at").orderBy("_row")
+    df = df.withColumn("_dup", F.row_number().over(first)).where(F.col("_dup") == 1).drop("_dup")
+
+    local = F.from_utc_timestamp("played_at", LOCAL_TZ)
+    df = (
+        df.withColumn("played_at_local", F.col("played_at"))
+        .withColumn("year", F.year(local))
+        .withColumn("month", F.month(local))
+        .withColumn("day", F.dayofmonth(local))
+        .withColumn("hour_of_day", F.hour(local))
+        .withColumn("day_of_week", F.date_format(local, "EEEE"))
+    )
+    df = df.withColumn(
+        "date_key",
+        F.col("year").cast("long") * 1000000 + F.col("month") * 10000 + F.col("day") * 100 + F.col("hour_of_day"),
+    )
+    return df.select(*OUTPUT_COLUMNS, "prefix", "_row")
+
+
+def with_partitions(df):
+    """account and window columns split from the prefix ("<window>" or "<account_id>/<window>")."""
+    from pyspark.sql import functions as F
+
+    has_account = F.col("prefix").contains("/")
+    return (
+        df.withColumn("account", F.when(has_account, F.substring_index("prefix", "/", 1)).otherwise(DEFAULT_ACCOUNT))
+        .withColumn("window", F.substring_index("prefix", "/", -1))
+    )
+
+
+def write_processed(df, root: str = SPARK_PROCESSED_ROOT):
+    """Parquet partitioned by account/window; rewriting a window replaces only that partition."""
+    url = object_url(root)
+    with_partitions(df).drop("_row", "prefix").write.mode("overwrite").partitionBy("account", "window").parquet(url)
+    logger.info(f"Wrote processed parquet to {url}")
+
+
+# ---------- Load ----------
+def jdbc_options() -> dict:
+    return {
+        "url": f"jdbc:postgresql://{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}",
+        "user": POSTGRES_USER,
+        "password": POSTGRES_PASSWORD,
+        "driver": "org.postgresql.Driver",
+    }
+
+
+def create_spark_stage(cur):
+    cur.execute(f"""
+        CREATE UNLOGGED TABLE IF NOT EXISTS {SPARK_STAGE_TABLE} (
+            run_id VARCHAR NOT NULL,
+            prefix VARCHAR NOT NULL,
+            seq BIGINT NOT NULL,
+            artist_id VARCHAR NOT NULL,
+            artist_name VARCHAR NOT NULL,
+            song_id VARCHAR NOT NULL,
+            song_title VARCHAR NOT NULL,
+            song_duration_ms BIGINT NOT NULL,
+            play_count BIGINT NOT NULL,
+            played_at TIMESTAMPTZ NOT NULL,
+            year INT NOT NULL,
+            month INT NOT NULL,
+            day INT NOT NULL,
+            hour_of_day INT NOT NULL,
+            day_of_week VARCHAR NOT NULL,
+            date_key BIGINT NOT NULL
+        );
+    """)
+    cur.execute(f"CREATE INDEX IF NOT EXISTS {SPARK_STAGE_TABLE}_run_idx ON {SPARK_STAGE_TABLE} (run_id, prefix);")
+
+
+def stage_frame(df, run_id: str):
+    """The bulk loader's prepare_bulk_frame rules, shaped like the stage table."""
+    from pyspark.sql import functions as F
+    from pyspark.sql.window import Window
+
+    df = df.dropna(subset=["played_at", "artist_id", "song_id", "year", "month", "day", "hour_of_day"])
+    return df.select(
+        F.lit(run_id).alias("run_id"),
+        "prefix",
+        (F.row_number().over(Window.partitionBy("prefix").orderBy("_row")) - 1).alias("seq"),
+        "artist_id",
+        F.coalesce("artist_name", F.lit(MISSING_TEXT)).alias("artist_name"),
+        "song_id",
+        F.coalesce("song_title", F.lit(MISSING_TEXT)).alias("song_title"),
+        "song_duration_ms",
+        F.lit(1).cast("long").alias("play_count"),
+        "played_at",
+        "year",
+        "month",
+        "day",
+        "hour_of_day",
+        F.coalesce("day_of_week", F.lit("Unknown")).alias("day_of_week"),
+        "date_key",
+    )
+
+
+def write_stage_jdbc(df, run_id: str):
+    """Bulk-insert the run's rows into the unlogged stage table over JDBC."""
+    (
+        stage_frame(df, run_id)
+        .repartition(SPARK_JDBC_PARTITIONS, "prefix")
+        .write.format("jdbc")
+        .options(**jdbc_options())
+        .option("dbtable", SPARK_STAGE_TABLE)
+        .option("batchsize", SPARK_JDBC_BATCH_SIZE)
+        .option("numPartitions", SPARK_JDBC_PARTITIONS)
+        # Keep the table (and its index) created by create_spark_stage
+        .option("truncate", "false")
+        .mode("append")
+        .save()
+    )
+
+
+def content_hashes(df) -> dict[str, str]:
+    """
+    etl.utils.ledger.content_hash of every prefix of a transformed frame,
+    computed before staging drops any rows, as the pandas loaders hash the
+    whole processed frame. Lines sort by bytes as Python sorts them.
+    """
+    from pyspark.sql import functions as F
+
+    events = (
+        df.dropna(subset=["song_id", "played_at"])
+        .select("prefix", F.concat_ws("|", "song_id", F.unix_micros("played_at").cast("string")).alias("line"))
+        .distinct()
+    )
+    digests = events.groupBy("prefix").agg(
+        F.sha2(F.array_join(F.array_sort(F.collect_list("line")), "\n"), 256).alias("digest")
+    )
+    return {r["prefix"]: r["digest"] for r in digests.collect()}
+
+
+def merge_spark_prefix(cur, run_id: str, prefix: str, row_count: int, digest: str,
+                       force: bool = False) -> int | None:
+    """
+    Merge one prefix of a run from the JDBC stage, with the load ledger and
+    rollups exactly as load_to_postgres(mode="bulk") would. Returns the
+    number of newly applied events, or None if the prefix was already loaded.
+    """
+    from etl.utils.accounts import user_key_for
+    from etl.utils.ledger import get_ledger_entry, is_applied, upsert_ledger_entry
+    from etl.utils.rollups import merge_stage_rollups
+
+    entry = get_ledger_entry(cur, prefix)
+    if is_applied(entry, row_count, digest) and not force:
+        cur.execute(f"DELETE FROM {SPARK_STAGE_TABLE} WHERE run_id = %s AND prefix = %s;", (run_id, prefix))
+        return None
+
+    create_stage_table(cur)
+    cur.execute(f"""
+        INSERT INTO {STAGE_TABLE} ({", ".join(STAGE_COLUMNS)})
+        SELECT {", ".join(STAGE_COLUMNS)} FROM {SPARK_STAGE_TABLE}
+        WHERE run_id = %s AND prefix = %s;
+    """, (run_id, prefix))
+    user_key = user_key_for(cur, account_for_prefix(prefix))
+    applied = filter_new_events(cur, prefix, user_key)
+    merge_stage(cur, user_key)
+    merge_stage_rollups(cur)
+    upsert_ledger_entry(cur, prefix, row_count, applied, digest)
+    cur.execute(f"DELETE FROM {SPARK_STAGE_TABLE} WHERE run_id = %s AND prefix = %s;", (run_id, prefix))
+    return applied
+
+
+def load_jdbc(df, row_counts: dict[str, int], digests: dict[str, str], force: bool = False) -> dict[str, int | None]:
+    """
+    Write the frame's rows over JDBC, then merge each prefix in its own
+    transaction so a failure leaves the other prefixes applied.
+    """
+    from etl.utils.db import cursor, transaction
+
+    run_id = uuid.uuid4().hex
+    with cursor() as cur:
+        create_spark_stage(cur)
+    started = time.perf_counter()
+    write_stage_jdbc(df, run_id)
+    logger.info(f"Staged run {run_id} over JDBC in {time.perf_counter() - started:.2f}s")
+
+    results = {}
+    for prefix in sorted(row_counts):
+        with transaction() as conn, conn.cursor() as cur:
+            digest = digests.get(prefix, EMPTY_CONTENT_HASH)
+            results[prefix] = merge_spark_prefix(cur, run_id, prefix, row_counts[prefix], digest, force)
+        logger.info(f"Merged prefix={prefix}: {results[prefix]} new events")
+    return results
+
+
+# ---------- Drivers ----------
+def run_spark_backfill(start: datetime, end: datetime, force: bool = False, spark=None) -> dict[str, dict]:
+    """Transform and load every raw prefix in [start, end] with one Spark job."""
+    from etl.recently_played.backfill import list_raw_prefixes, is_loaded
+
+    prefixes = list_raw_prefixes(start, end)
+    results = {p: {"status": "pending"} for p in prefixes}
+    todo = prefixes if force else [p for p in prefixes if not is_loaded(p)]
+    for prefix in set(prefixes) - set(todo):
+        results[prefix]["status"] = "skipped"
+    logger.info(f"Spark backfill over {len(todo)} of {len(prefixes)} raw prefixes between {start} and {end}")
+    if not todo:
+        return results
+
+    spark = spark or get_spark("spotify-etl-backfill")
+    started = time.perf_counter()
+    df = transform_frame(read_raw(spark, todo)).cache()
+    row_counts = {r["prefix"]: r["count"] for r in df.groupBy("prefix").count().collect()}
+    digests = content_hashes(df)
+    write_processed(df)
+    transform_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    loaded = load_jdbc(df, row_counts, digests, force)
+    load_s = time.perf_counter() - started
+    df.unpersist()
+
+    for prefix in todo:
+        applied = loaded.get(prefix)
+        results[prefix].update({
+            "status": "skipped" if applied is None and prefix in row_counts else "done",
+            "rows": row_counts.get(prefix, 0),
+            "loaded": applied or 0,
+            # One job covers every prefix; spread its time evenly for the report
+            "transform_s": transform_s / len(todo),
+            "load_s": load_s / len(todo),
+        })
+    return results
+
+
+def pandas_output(records: pd.DataFrame) -> pd.DataFrame:
+    from etl.recently_played.transform import transform
+
+    return transform(records.copy())
+
+
+def normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """Engine-independent form for comparison: UTC instants, nullable int64 counters, stable order."""
+    out = df[OUTPUT_COLUMNS].copy()
+    out["played_at"] = pd.to_datetime(out["played_at"], utc=True)
+    out["played_at_local"] = pd.to_datetime(out["played_at_local"], utc=True)
+    for col in INT_COLUMNS:
+        out[col] = out[col].astype("Int64")
+    for col in ["song_id", "song_title", "artist_name", "artist_id", "day_of_week"]:
+        out[col] = out[col].astype(object)
+    return out.sort_values(["song_id", "played_at"]).reset_index(drop=True)
+
+
+def check_parity(fixture: str, spark=None) -> bool:
+    """Run both engines over a raw JSON fixture and compare their output."""
+    import json
+
+    with open(fixture, encoding="utf-8") as f:
+        records = pd.DataFrame(json.load(f))
+    expected = normalize(pandas_output(records))
+
+    spark = spark or get_spark("spotify-etl-parity")
+    df = spark.read.schema(raw_schema()).json(os.path.abspath(fixture), multiLine=True)
+    from pyspark.sql import functions as F
+
+    df = df.withColumn("prefix", F.lit("fixture")).withColumn("_row", F.monotonically_increasing_id())
+    actual = normalize(transform_frame(df).drop("prefix", "_row").toPandas())
+
+    try:
+        pd.testing.assert_frame_equal(expected, actual, check_dtype=False)
+    except AssertionError as e:
+        logger.error(f"Spark output differs from pandas on {fixture}:\n{e}")
+        return False
+    logger.info(f"Spark and pandas engines agree on {fixture} ({len(expected)} rows)")
+    return True
+
+
+def main():
+    from etl.recently_played.backfill import format_report, parse_bound
+
+    parser = argparse.ArgumentParser(description="Spark engine for transform and load")
+    sub = parser.add_subparsers(dest="command", required=True)
+    backfill = sub.add_parser("backfill", help="transform and load raw prefixes in a date range")
+    backfill.add_argument("--start", required=True, help="first window, e.g. 2025-01-01 or 2025-01-01-00")
+    backfill.add_argument("--end", required=True, help="last window, e.g. 2025-01-31-12; a date covers the whole day")
+    backfill.add_argument("--force", action="store_true", help="reload prefixes already in the ledger")
+    parity = sub.add_parser("parity", help="compare the Spark and pandas transforms on a fixture")
+    parity.add_argument("--fixture", default="benchmarks/fixtures/recently_played.json")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "parity":
+        sys.exit(0 if check_parity(args.fixture) else 1)
+
+    try:
+        start, end = parse_bound(args.start), parse_bound(args.end, end=True)
+    except ValueError as e:
+        parser.error(str(e))
+    print(format_report(run_spark_backfill(start, end, args.force)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,17 @@
 import json
+import tempfile
 import pandas as pd
-from io import BytesIO
+import pyarrow as pa
+import pyarrow.parquet as pq
 from datetime import datetime, timedelta
 import datetime
 import logging
-from config import MINIO_BUCKET
-from etl.utils.minio_utils import init_minio_client
+from config import RAW_READ_CHUNK_SIZE, TRANSFORM_ENGINE, OBJECT_STORE_PART_SIZE
+from etl.utils.object_store import ObjectStore, get_object_store
+from etl.utils.date_dim import LOCAL_TZ, date_key_for
+from etl.utils.ndjson import RAW_FORMATS, compressed_reader, iter_ndjson_chunks
+from etl.utils.metrics import add_rows_in, instrumented, stage
 
-# Configure logger
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
@@ -20,27 +23,51 @@ def get_last_window_timestamp_ms(hours: int = 12) -> tuple[int, datetime.datetim
     now = datetime.datetime.now()
     window_start = now - datetime.timedelta(hours=hours)
 
-    logging.info(f"Computed ETL window start: {window_start}")
+    logger.info(f"Computed ETL window start: {window_start}")
     return int(window_start.timestamp() * 1000), window_start
 
 
-def download_raw(date_prefix: str) -> pd.DataFrame:
-    logger.info(f"Downloading raw data for date_prefix={date_prefix}")
-    client = init_minio_client()
-    raw_path = f"raw/{date_prefix}/recently_played.json"
+def find_raw_object(store: ObjectStore, date_prefix: str) -> tuple[str, str]:
+    """Return (path, format) of the raw object for a prefix, preferring compressed formats."""
+    for fmt in reversed(RAW_FORMATS):
+        path = f"raw/{date_prefix}/recently_played.{fmt}"
+        if store.exists(path):
+            return path, fmt
+    raise FileNotFoundError(f"No raw object found under raw/{date_prefix}/")
+
+
+def iter_raw_chunks(date_prefix: str, chunksize: int = RAW_READ_CHUNK_SIZE):
+    """
+    Yield the raw records of a prefix as DataFrames of at most chunksize rows.
+    NDJSON objects are decompressed and parsed incrementally from the HTTP
+    stream; legacy JSON arrays are read whole and then split.
+    """
+    store = get_object_store()
+    raw_path, fmt = find_raw_object(store, date_prefix)
 
     try:
-        response = client.get_object(MINIO_BUCKET, raw_path)
-        data = json.loads(response.read().decode("utf-8"))
-        logger.info(f"Downloaded raw JSON with {len(data)} records from {raw_path}")
-    except Exception as e:
+        with store.open_read(raw_path) as body:
+            if fmt == "json":
+                data = json.loads(body.read().decode("utf-8"))
+                for start in range(0, len(data), chunksize):
+                    yield pd.DataFrame(data[start:start + chunksize])
+            else:
+                with compressed_reader(body, fmt) as reader:
+                    for records in iter_ndjson_chunks(reader, chunksize):
+                        yield pd.DataFrame(records)
+    except Exception:
         logger.error(f"Failed to download raw data from {raw_path}", exc_info=True)
         raise
-    finally:
-        response.close()
-        response.release_conn()
 
-    return pd.DataFrame(data)
+
+@instrumented("transform.download_raw")
+def download_raw(date_prefix: str) -> pd.DataFrame:
+    """The whole prefix as one frame; the pipeline itself streams with iter_raw_chunks."""
+    logger.info(f"Downloading raw data for date_prefix={date_prefix}")
+    chunks = list(iter_raw_chunks(date_prefix))
+    df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+    logger.info(f"Downloaded raw data with {len(df)} records in {len(chunks)} chunk(s)")
+    return df
 
 
 def validate_and_clean(df: pd.DataFrame) -> pd.DataFrame:
@@ -57,8 +84,20 @@ def validate_and_clean(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+@instrumented("transform.transform", count_input=True)
 def transform(df: pd.DataFrame) -> pd.DataFrame:
     logger.info("Transforming dataframe")
+    df = transform_chunk(df, set())
+    logger.info("Transformation complete")
+    return df
+
+
+def transform_chunk(df: pd.DataFrame, seen: set) -> pd.DataFrame:
+    """
+    Transform one chunk of raw records. seen holds the (song_id, played_at)
+    pairs of earlier chunks and is updated, so a play repeated across chunks
+    is only kept the first time.
+    """
     df = validate_and_clean(df)
 
     df["song_duration_ms"] = df["song_duration_ms"].astype(int)
@@ -68,45 +107,144 @@ def transform(df: pd.DataFrame) -> pd.DataFrame:
 
     before = len(df)
     df = df.drop_duplicates(subset=["song_id", "played_at"])
+    keys = list(zip(df["song_id"], df["played_at"]))
+    df = df[pd.Series([key not in seen for key in keys], index=df.index, dtype=bool)].copy()
+    seen.update(keys)
     after = len(df)
     logger.info(f"Removed {before - after} duplicate rows; {after} rows remain")
 
     # Add local-time derived fields (VN)
-    df["played_at_local"] = df["played_at"].dt.tz_convert("Asia/Ho_Chi_Minh")
+    df["played_at_local"] = df["played_at"].dt.tz_convert(LOCAL_TZ)
     df["year"] = df["played_at_local"].dt.year
     df["month"] = df["played_at_local"].dt.month
     df["day"] = df["played_at_local"].dt.day
     df["hour_of_day"] = df["played_at_local"].dt.hour
     df["day_of_week"] = df["played_at_local"].dt.day_name()
-
-    logger.info("Transformation complete")
+    df["date_key"] = date_key_for(df["year"], df["month"], df["day"], df["hour_of_day"])
     return df
 
 
+def iter_transformed(date_prefix: str, chunksize: int = RAW_READ_CHUNK_SIZE):
+    """Transformed frames of a prefix, one per raw chunk."""
+    seen = set()
+    chunks = 0
+    for chunk in iter_raw_chunks(date_prefix, chunksize):
+        chunks += 1
+        add_rows_in(len(chunk))
+        yield transform_chunk(chunk, seen)
+    if chunks == 0:
+        logger.error("Dataset is empty")
+        raise ValueError("Dataset empty!")
+
+
+def put_parquet(store: ObjectStore, df: pd.DataFrame, path: str):
+    store.put_parquet(path, df)
+
+
+def put_parquet_chunks(store: ObjectStore, frames, path: str) -> int:
+    """
+    Write transformed frames as one parquet object, a row group per frame,
+    through a spooled temp file. Returns the number of rows written.
+    """
+    # Lazy: transform_arrow imports this module
+    from etl.recently_played.transform_arrow import PROCESSED_SCHEMA
+
+    rows = 0
+    with tempfile.SpooledTemporaryFile(max_size=OBJECT_STORE_PART_SIZE) as spool:
+        with pq.ParquetWriter(spool, PROCESSED_SCHEMA) as writer:
+            for df in frames:
+                if df.empty:
+                    continue
+                table = pa.Table.from_pandas(df.reindex(columns=PROCESSED_SCHEMA.names),
+                                             schema=PROCESSED_SCHEMA, preserve_index=False)
+                writer.write_table(table)
+                rows += len(df)
+        length = spool.tell()
+        spool.seek(0)
+        store.put_stream(path, spool, length, "application/parquet")
+    return rows
+
+
+def write_processed_success(store: ObjectStore, date_prefix: str):
+    store.put_bytes(f"processed/{date_prefix}/_SUCCESS", b"", content_type="text/plain")
+
+
+@instrumented("transform.upload", count_input=True)
 def upload_transformed(df: pd.DataFrame, date_prefix: str):
     logger.info(f"Uploading transformed dataframe with {len(df)} rows for date_prefix={date_prefix}")
-    client = init_minio_client()
+    store = get_object_store()
     path = f"processed/{date_prefix}/recently_played.parquet"
 
     try:
-        buf = BytesIO()
-        df.to_parquet(buf, index=False)
-        buf.seek(0)
-        client.put_object(
-            MINIO_BUCKET,
-            path,
-            buf,
-            buf.getbuffer().nbytes,
-            content_type="application/parquet",
-        )
-        client.put_object(
-            MINIO_BUCKET,
-            f"processed/{date_prefix}/_SUCCESS",
-            BytesIO(b""),
-            0,
-            content_type="text/plain",
-        )
+        put_parquet(store, df, path)
+        write_processed_success(store, date_prefix)
         logger.info(f"Uploaded parquet and _SUCCESS marker to {path}")
     except Exception:
         logger.error("Failed to upload transformed data", exc_info=True)
-        raise
\ No newline at end of file
+        raise
+
+
+@instrumented("transform.upload_intermediate", count_input=True)
+def upload_intermediate(df: pd.DataFrame, date_prefix: str) -> str:
+    """
+    Write the transformed frame once as typed parquet and return its object
+    key, so tasks can hand off the key through XCom instead of the data.
+    """
+    store = get_object_store()
+    path = f"intermediate/{date_prefix}/recently_played.parquet"
+    put_parquet(store, df, path)
+    logger.info(f"Wrote intermediate parquet with {len(df)} rows to {path}")
+    return path
+
+
+@instrumented("transform.publish")
+def publish_intermediate(key: str, date_prefix: str):
+    """Promote an intermediate parquet to processed/ with a server-side copy."""
+    store = get_object_store()
+    path = f"processed/{date_prefix}/recently_played.parquet"
+
+    try:
+        store.copy(key, path)
+        write_processed_success(store, date_prefix)
+        store.remove(key)
+        logger.info(f"Published {key} to {path} with _SUCCESS marker")
+    except Exception:
+        logger.error(f"Failed to publish intermediate data {key}", exc_info=True)
+        raise
+
+
+def transform_and_upload(date_prefix: str, engine: str = TRANSFORM_ENGINE, intermediate: bool = False) -> tuple[str, int]:
+    """
+    Download, transform and write one prefix with the chosen engine ("pandas"
+    or "arrow"), to processed/ or, with intermediate=True, to intermediate/.
+    Returns (object key, rows).
+    """
+    if engine == "arrow":
+        from etl.recently_played.transform_arrow import transform_prefix
+
+        return transform_prefix(date_prefix, intermediate)
+    if engine != "pandas":
+        raise ValueError(f"Unknown transform engine: {engine}")
+
+    return stream_transform(date_prefix, intermediate)
+
+
+def stream_transform(date_prefix: str, intermediate: bool = False) -> tuple[str, int]:
+    """
+    pandas engine: transform raw chunks one at a time and append each to the
+    output parquet as it is produced, so memory stays flat in the prefix size.
+    """
+    store = get_object_store()
+    root = "intermediate" if intermediate else "processed"
+    path = f"{root}/{date_prefix}/recently_played.parquet"
+    with stage("transform.stream", prefix=date_prefix) as metrics:
+        try:
+            rows = put_parquet_chunks(store, iter_transformed(date_prefix), path)
+            if not intermediate:
+                write_processed_success(store, date_prefix)
+        except Exception:
+            logger.error(f"Failed to transform {date_prefix} into {path}", exc_info=True)
+            raise
+        metrics.rows_out = rows
+    logger.info(f"Wrote {rows} transformed rows to {path}")
+    return path, rows
@@ -0,0 +1,198 @@
+"""
+Arrow-native transform. Same rules as transform.transform (drop empty rows,
+drop rows without duration or played_at, keep the first of duplicate
+song_id/played_at pairs, derive local-time fields in LOCAL_TZ), but raw
+payloads are parsed straight into typed Arrow columns and every step runs in
+pyarrow.compute, with no pandas object columns in between. Output is parquet
+with an explicit schema, zstd compression, dictionary-encoded strings and
+row-group statistics.
+
+Selected with TRANSFORM_ENGINE=arrow; see transform.transform_and_upload.
+"""
+import json
+import logging
+import tempfile
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.json as pa_json
+import pyarrow.parquet as pq
+from config import OBJECT_STORE_PART_SIZE, PARQUET_ROW_GROUP_SIZE
+from etl.utils.date_dim import LOCAL_TZ
+from etl.utils.ndjson import compressed_reader
+from etl.utils.object_store import ObjectStore, get_object_store
+from etl.utils.metrics import instrumented
+from etl.recently_played.transform import find_raw_object, write_processed_success
+
+logger = logging.getLogger(__name__)
+
+UTC_TIMESTAMP = pa.timestamp("us", tz="UTC")
+
+RAW_SCHEMA = pa.schema([
+    ("song_id", pa.string()),
+    ("song_title", pa.string()),
+    ("artist_name", pa.string()),
+    ("artist_id", pa.string()),
+    ("played_at", pa.string()),
+    ("song_duration_ms", pa.int64()),
+])
+
+# Column order and types of the pandas engine's output; date_key is widened
+# to int64 like dim_date.date_key
+PROCESSED_SCHEMA = pa.schema([
+    ("song_id", pa.string()),
+    ("song_title", pa.string()),
+    ("artist_name", pa.string()),
+    ("artist_id", pa.string()),
+    ("played_at", UTC_TIMESTAMP),
+    ("song_duration_ms", pa.int64()),
+    ("played_at_local", pa.timestamp("us", tz=LOCAL_TZ)),
+    ("year", pa.int32()),
+    ("month", pa.int32()),
+    ("day", pa.int32()),
+    ("hour_of_day", pa.int32()),
+    ("day_of_week", pa.string()),
+    ("date_key", pa.int64()),
+])
+
+STRING_COLUMNS = [f.name for f in PROCESSED_SCHEMA if pa.types.is_string(f.type)]
+
+
+# ---------- Read ----------
+@instrumented("transform_arrow.read_raw")
+def read_raw_table(date_prefix: str) -> pa.Table:
+    """The raw records of a prefix as a typed table (RAW_SCHEMA)."""
+    store = get_object_store()
+    raw_path, fmt = find_raw_object(store, date_prefix)
+    with store.open_read(raw_path) as body:
+        if fmt == "json":
+            # Legacy objects are one JSON array, which the Arrow reader cannot stream
+            return pa.Table.from_pylist(json.loads(body.read().decode("utf-8")), schema=RAW_SCHEMA)
+        with compressed_reader(body, fmt) as reader:
+            return read_ndjson(reader)
+
+
+def read_ndjson(reader) -> pa.Table:
+    options = pa_json.ParseOptions(explicit_schema=RAW_SCHEMA, unexpected_field_behavior="ignore")
+    try:
+        return pa_json.read_json(reader, parse_options=options)
+    except pa.ArrowInvalid as e:
+        # An empty object has no rows to infer blocks from
+        if "Empty JSON file" in str(e):
+            return RAW_SCHEMA.empty_table()
+        raise
+
+
+# ---------- Transform ----------
+def parse_timestamps(values: pa.ChunkedArray) -> pa.ChunkedArray:
+    """ISO-8601 strings to UTC timestamps; malformed values become null (pandas errors="coerce")."""
+    try:
+        return pc.cast(values, UTC_TIMESTAMP)
+    except pa.ArrowInvalid:
+        parsed = []
+        for value in values.to_pylist():
+            try:
+                parsed.append(pc.cast(pa.array([value]), UTC_TIMESTAMP)[0].as_py())
+            except pa.ArrowInvalid:
+                parsed.append(None)
+        return pa.chunked_array([pa.array(parsed, UTC_TIMESTAMP)])
+
+
+def validate_and_clean(table: pa.Table) -> pa.Table:
+    if table.num_rows == 0:
+        logger.error("Dataset is empty")
+        raise ValueError("Dataset empty!")
+
+    before = table.num_rows
+    all_null = None
+    for name in table.column_names:
+        col_null = pc.is_null(table[name])
+        all_null = col_null if all_null is None else pc.and_(all_null, col_null)
+    table = table.filter(pc.invert(all_null))
+    table = table.filter(pc.and_(pc.is_valid(table["song_duration_ms"]), pc.is_valid(table["played_at"])))
+    logger.info(f"Dropped {before - table.num_rows} invalid rows; {table.num_rows} rows remain")
+    return table
+
+
+def drop_duplicate_plays(table: pa.Table) -> pa.Table:
+    """Keep the first row of every (song_id, played_at) pair, in input order."""
+    table = table.append_column("_row", pa.array(range(table.num_rows), pa.int64()))
+    first = table.group_by(["song_id", "played_at"], use_threads=False).aggregate([("_row", "min")])
+    keep = pc.sort_indices(first["_row_min"])
+    return table.take(pc.take(first["_row_min"], keep)).drop_columns(["_row"])
+
+
+@instrumented("transform_arrow.transform", count_input=True)
+def transform_table(table: pa.Table) -> pa.Table:
+    logger.info("Transforming table (arrow)")
+    table = validate_and_clean(table)
+
+    table = table.set_column(
+        table.schema.get_field_index("played_at"), "played_at", parse_timestamps(table["played_at"])
+    )
+
+    before = table.num_rows
+    table = drop_duplicate_plays(table)
+    logger.info(f"Removed {before - table.num_rows} duplicate rows; {table.num_rows} rows remain")
+
+    # Temporal kernels on a zoned timestamp return that zone's wall-clock fields
+    local = table["played_at"].cast(pa.timestamp("us", tz=LOCAL_TZ))
+    year = pc.year(local).cast(pa.int32())
+    month = pc.month(local).cast(pa.int32())
+    day = pc.day(local).cast(pa.int32())
+    hour = pc.hour(local).cast(pa.int32())
+    date_key = pc.add(
+        pc.add(pc.multiply(year.cast(pa.int64()), 1000000), pc.multiply(month.cast(pa.int64()), 10000)),
+        pc.add(pc.multiply(day.cast(pa.int64()), 100), hour.cast(pa.int64())),
+    )
+    out = pa.table({
+        "song_id": table["song_id"],
+        "song_title": table["song_title"],
+        "artist_name": table["artist_name"],
+        "artist_id": table["artist_id"],
+        "played_at": table["played_at"],
+        "song_duration_ms": table["song_duration_ms"],
+        "played_at_local": local,
+        "year": year,
+        "month": month,
+        "day": day,
+        "hour_of_day": hour,
+        "day_of_week": pc.strftime(local, format="%A"),
+        "date_key": date_key,
+    }, schema=PROCESSED_SCHEMA)
+    logger.info("Transformation complete")
+    return out
+
+
+# ---------- Write ----------
+def put_table(store: ObjectStore, table: pa.Table, path: str, row_group_size: int = PARQUET_ROW_GROUP_SIZE) -> int:
+    """Write a table as tuned parquet through a spooled temp file. Returns the object size."""
+    with tempfile.SpooledTemporaryFile(max_size=OBJECT_STORE_PART_SIZE) as spool:
+        pq.write_table(
+            table, spool,
+            compression="zstd",
+            use_dictionary=STRING_COLUMNS,
+            write_statistics=True,
+            row_group_size=row_group_size,
+        )
+        length = spool.tell()
+        spool.seek(0)
+        return store.put_stream(path, spool, length, "application/parquet")
+
+
+@instrumented("transform_arrow.upload", count_input=True)
+def upload_table(table: pa.Table, date_prefix: str, intermediate: bool = False) -> str:
+    """Write processed/ (with _SUCCESS) or intermediate/ parquet for a prefix; returns its key."""
+    store = get_object_store()
+    root = "intermediate" if intermediate else "processed"
+    path = f"{root}/{date_prefix}/recently_played.parquet"
+    put_table(store, table, path)
+    if not intermediate:
+        write_processed_success(store, date_prefix)
+    logger.info(f"Wrote {table.num_rows} rows to {path}")
+    return path
+
+
+def transform_prefix(date_prefix: str, intermediate: bool = False) -> tuple[str, int]:
+    """Read, transform and write one prefix. Returns (object key, rows)."""
+    table = transform_table(read_raw_table(date_prefix))
+    return upload_table(table, date_prefix, intermediate), table.num_rows
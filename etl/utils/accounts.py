@@ -0,0 +1,106 @@
+"""
+Listener accounts. dim_user holds one row per listener (user_key 0 is the
+single account configured through SPOTIFY_REFRESH_TOKEN); spotify_account
+holds the refresh tokens multi-account extraction reads.
+
+Prefixes of the configured account stay "<window>"; other accounts land
+under "<account_id>/<window>", which is how loads find the listener.
+
+    python -m etl.utils.accounts add <account_id> <refresh_token> [--name NAME]
+    python -m etl.utils.accounts deactivate <account_id>
+    python -m etl.utils.accounts list
+"""
+import argparse
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ACCOUNT = "default"
+DEFAULT_USER_KEY = 0
+
+
+def account_prefix(account_id: str, window: str) -> str:
+    return window if account_id == DEFAULT_ACCOUNT else f"{account_id}/{window}"
+
+
+def account_for_prefix(prefix: str | None) -> str:
+    if prefix and "/" in prefix:
+        return prefix.split("/", 1)[0]
+    return DEFAULT_ACCOUNT
+
+
+def user_key_for(cur, account_id: str) -> int:
+    """Surrogate key of a listener, added to dim_user on first sight."""
+    if account_id == DEFAULT_ACCOUNT:
+        return DEFAULT_USER_KEY
+    cur.execute("""
+        INSERT INTO dim_user (account_id) VALUES (%s)
+        ON CONFLICT (account_id) DO UPDATE SET account_id = EXCLUDED.account_id
+        RETURNING user_key;
+    """, (account_id,))
+    return cur.fetchone()[0]
+
+
+def user_key_for_prefix(cur, prefix: str | None) -> int:
+    return user_key_for(cur, account_for_prefix(prefix))
+
+
+def list_accounts(cur) -> list[tuple[str, str]]:
+    """(account_id, refresh_token) of every active account."""
+    cur.execute("SELECT account_id, refresh_token FROM spotify_account WHERE active ORDER BY account_id;")
+    return cur.fetchall()
+
+
+def add_account(cur, account_id: str, refresh_token: str, display_name: str | None = None) -> int:
+    if account_id == DEFAULT_ACCOUNT or "/" in account_id:
+        raise ValueError(f"Invalid account id: {account_id!r}")
+    cur.execute("""
+        INSERT INTO dim_user (account_id, display_name) VALUES (%s, %s)
+        ON CONFLICT (account_id) DO UPDATE
+        SET display_name = COALESCE(EXCLUDED.display_name, dim_user.display_name)
+        RETURNING user_key;
+    """, (account_id, display_name))
+    user_key = cur.fetchone()[0]
+    cur.execute("""
+        INSERT INTO spotify_account (account_id, refresh_token) VALUES (%s, %s)
+        ON CONFLICT (account_id) DO UPDATE
+        SET refresh_token = EXCLUDED.refresh_token, active = TRUE;
+    """, (account_id, refresh_token))
+    return user_key
+
+
+def deactivate_account(cur, account_id: str) -> bool:
+    cur.execute("UPDATE spotify_account SET active = FALSE WHERE account_id = %s;", (account_id,))
+    return cur.rowcount > 0
+
+
+def main():
+    from etl.utils.db import cursor
+
+    parser = argparse.ArgumentParser(description="Manage Spotify accounts for multi-account extraction")
+    sub = parser.add_subparsers(dest="command", required=True)
+    add = sub.add_parser("add")
+    add.add_argument("account_id")
+    add.add_argument("refresh_token")
+    add.add_argument("--name")
+    off = sub.add_parser("deactivate")
+    off.add_argument("account_id")
+    sub.add_parser("list")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    with cursor() as cur:
+        if args.command == "add":
+            user_key = add_account(cur, args.account_id, args.refresh_token, args.name)
+            logger.info(f"Account {args.account_id} active as user_key={user_key}")
+        elif args.command == "deactivate":
+            if not deactivate_account(cur, args.account_id):
+                raise SystemExit(f"No account {args.account_id}")
+            logger.info(f"Account {args.account_id} deactivated")
+        else:
+            for account_id, _ in list_accounts(cur):
+                print(account_id)
+
+
+if __name__ == "__main__":
+    main()
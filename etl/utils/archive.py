@@ -0,0 +1,206 @@
+"""
+Cold archival of fact_play_summary. Months older than FACT_ARCHIVE_AFTER_MONTHS
+are exported to parquet in the object store (one object per month, with the
+natural song/artist/account ids next to the surrogate keys), verified, then
+detached from the partitioned table and recorded in fact_play_archive.
+Rollups already hold the archived plays' totals and are left as they are.
+
+    python -m etl.utils.archive archive [--older-than 12] [--drop] [--dry-run]
+    python -m etl.utils.archive read --start 2023-01 --end 2023-06 [--account ID] [--out plays.csv]
+    python -m etl.utils.archive restore 2023-01
+"""
+import argparse
+import logging
+from datetime import date
+import pandas as pd
+from config import FACT_ARCHIVE_AFTER_MONTHS, FACT_ARCHIVE_PREFIX
+from etl.utils.object_store import get_object_store
+from etl.utils.partitions import FACT_TABLE, list_month_partitions, partition_name
+
+logger = logging.getLogger(__name__)
+
+FACT_COLUMNS = [
+    "play_id", "user_key", "song_key", "artist_key", "date_key",
+    "play_count", "total_duration_ms", "played_at",
+]
+
+
+def archive_key(month: int) -> str:
+    return f"{FACT_ARCHIVE_PREFIX}/{month}.parquet"
+
+
+def parse_month(value: str) -> int:
+    """"2023-01" or "202301" -> 202301."""
+    digits = value.replace("-", "")
+    if len(digits) != 6 or not digits.isdigit() or not 1 <= int(digits[4:]) <= 12:
+        raise ValueError(f"Invalid month: {value}")
+    return int(digits)
+
+
+def shift_month(month: int, delta: int) -> int:
+    index = (month // 100) * 12 + (month % 100 - 1) + delta
+    return (index // 12) * 100 + index % 12 + 1
+
+
+def cold_months(cur, older_than: int = FACT_ARCHIVE_AFTER_MONTHS, today: date | None = None) -> list[int]:
+    """Attached months that ended more than `older_than` months before the current one."""
+    today = today or date.today()
+    cutoff = shift_month(today.year * 100 + today.month, -older_than)
+    return [m for m in list_month_partitions(cur) if m < cutoff]
+
+
+def export_month(cur, month: int) -> pd.DataFrame:
+    cur.execute(f"""
+        SELECT {", ".join(f"f.{c}" for c in FACT_COLUMNS)}, u.account_id, s.song_id, a.artist_id
+        FROM {partition_name(month)} f
+        LEFT JOIN dim_user u   ON f.user_key = u.user_key
+        LEFT JOIN dim_song s   ON f.song_key = s.song_key
+        LEFT JOIN dim_artist a ON f.artist_key = a.artist_key
+        ORDER BY f.date_key, f.play_id;
+    """)
+    return pd.DataFrame(cur.fetchall(), columns=FACT_COLUMNS + ["account_id", "song_id", "artist_id"])
+
+
+def archive_month(cur, month: int, drop: bool = False) -> int:
+    """
+    Export one month's partition, check the object reads back complete, then
+    detach it (and drop it with drop=True). Runs inside the caller's
+    transaction; nothing is detached if the export fails.
+    """
+    part = partition_name(month)
+    df = export_month(cur, month)
+    key = archive_key(month)
+    store = get_object_store()
+    store.put_parquet(key, df, compression="zstd")
+    written = len(store.read_parquet(key, columns=["play_id"]))
+    if written != len(df):
+        raise RuntimeError(f"Archive {key} has {written} rows, expected {len(df)}; keeping {part} attached")
+
+    cur.execute("""
+        INSERT INTO fact_play_archive (month_key, object_key, row_count, archived_at)
+        VALUES (%s, %s, %s, NOW())
+        ON CONFLICT (month_key) DO UPDATE
+        SET object_key = EXCLUDED.object_key,
+            row_count = EXCLUDED.row_count,
+            archived_at = EXCLUDED.archived_at;
+    """, (month, key, len(df)))
+    cur.execute(f"ALTER TABLE {FACT_TABLE} DETACH PARTITION {part};")
+    if drop:
+        cur.execute(f"DROP TABLE {part};")
+    logger.info(f"Archived {len(df)} rows of {part} to {key}{' and dropped it' if drop else ''}")
+    return len(df)
+
+
+def archive_cold_months(older_than: int = FACT_ARCHIVE_AFTER_MONTHS, drop: bool = False,
+                        dry_run: bool = False) -> dict[int, int]:
+    """Archive every cold month, one transaction per month. Returns {month: rows}."""
+    from etl.utils.db import connection, transaction
+
+    with connection() as conn, conn.cursor() as cur:
+        months = cold_months(cur, older_than)
+    logger.info(f"{len(months)} month(s) older than {older_than} months: {months}")
+    if dry_run:
+        return {m: 0 for m in months}
+
+    archived = {}
+    for month in months:
+        with transaction() as conn, conn.cursor() as cur:
+            archived[month] = archive_month(cur, month, drop)
+    return archived
+
+
+def read_archive(start: str, end: str, account_id: str | None = None, columns: list[str] | None = None) -> pd.DataFrame:
+    """
+    Archived plays for the months start..end ("YYYY-MM", inclusive), straight
+    from the object store; months that were never archived are skipped.
+    """
+    store = get_object_store()
+    first, last = parse_month(start), parse_month(end)
+    if columns is not None and account_id is not None and "account_id" not in columns:
+        columns = columns + ["account_id"]
+
+    frames = []
+    month = first
+    while month <= last:
+        key = archive_key(month)
+        if store.exists(key):
+            frames.append(store.read_parquet(key, columns=columns))
+        month = shift_month(month, 1)
+    if not frames:
+        return pd.DataFrame(columns=columns or FACT_COLUMNS + ["account_id", "song_id", "artist_id"])
+
+    df = pd.concat(frames, ignore_index=True)
+    if account_id is not None:
+        df = df[df["account_id"] == account_id].reset_index(drop=True)
+    logger.info(f"Read {len(df)} archived rows for {start}..{end} from {len(frames)} month(s)")
+    return df
+
+
+def restore_month(cur, month: int) -> int:
+    """
+    Put an archived month back into fact_play_summary: re-attach the detached
+    partition, or rebuild it from the parquet archive if it was dropped.
+    """
+    from etl.utils.db import copy_frame
+
+    part = partition_name(month)
+    cur.execute("SELECT object_key FROM fact_play_archive WHERE month_key = %s;", (month,))
+    row = cur.fetchone()
+    if row is None:
+        raise ValueError(f"Month {month} is not archived")
+
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (part,))
+    if not cur.fetchone()[0]:
+        df = get_object_store().read_parquet(row[0], columns=FACT_COLUMNS)
+        cur.execute(f"CREATE TABLE {part} (LIKE {FACT_TABLE} INCLUDING DEFAULTS);")
+        copy_frame(cur, part, df, FACT_COLUMNS)
+
+    lo = month * 10000 + 100
+    hi = shift_month(month, 1) * 10000 + 100
+    # Plays of the month loaded while it was archived landed in the default
+    # partition; ATTACH fails while it still holds rows of the new range. They
+    # are merged into the archived rows with the same natural key.
+    cur.execute("SELECT move_default_fact_rows(%s, %s, %s);", (part, lo, hi))
+    cur.execute(f"ALTER TABLE {FACT_TABLE} ATTACH PARTITION {part} FOR VALUES FROM ({lo}) TO ({hi});")
+    cur.execute("DELETE FROM fact_play_archive WHERE month_key = %s;", (month,))
+    cur.execute(f"SELECT COUNT(*) FROM {part};")
+    restored = cur.fetchone()[0]
+    logger.info(f"Restored {restored} rows of {part}")
+    return restored
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive cold fact_play_summary partitions to parquet")
+    sub = parser.add_subparsers(dest="command", required=True)
+    archive = sub.add_parser("archive", help="export and detach months older than --older-than")
+    archive.add_argument("--older-than", type=int, default=FACT_ARCHIVE_AFTER_MONTHS, help="months")
+    archive.add_argument("--drop", action="store_true", help="drop partitions after exporting them")
+    archive.add_argument("--dry-run", action="store_true", help="only list the months that would be archived")
+    read = sub.add_parser("read", help="read archived plays back from the object store")
+    read.add_argument("--start", required=True, help="first month, e.g. 2023-01")
+    read.add_argument("--end", required=True, help="last month, e.g. 2023-06")
+    read.add_argument("--account", default=None, help="only this listener's plays")
+    read.add_argument("--out", default=None, help="write a CSV instead of printing a summary")
+    restore = sub.add_parser("restore", help="re-attach an archived month")
+    restore.add_argument("month", help="e.g. 2023-01")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "archive":
+        for month, rows in archive_cold_months(args.older_than, args.drop, args.dry_run).items():
+            print(f"{month}\t{rows}")
+    elif args.command == "read":
+        df = read_archive(args.start, args.end, args.account)
+        if args.out:
+            df.to_csv(args.out, index=False)
+        else:
+            print(df.groupby("account_id")[["play_count", "total_duration_ms"]].sum() if len(df) else "no archived rows")
+    else:
+        from etl.utils.db import transaction
+
+        with transaction() as conn, conn.cursor() as cur:
+            restore_month(cur, parse_month(args.month))
+
+
+if __name__ == "__main__":
+    main()
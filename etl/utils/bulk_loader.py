@@ -0,0 +1,147 @@
+from etl.utils.db import copy_frame
+from etl.utils.partitions import ensure_stage_partitions
+
+STAGE_TABLE = "stage_play"
+
+# What a missing artist name or song title is staged as, str(None) as the loaders always wrote it
+MISSING_TEXT = "None"
+
+STAGE_COLUMNS = [
+    "seq",
+    "artist_id",
+    "artist_name",
+    "song_id",
+    "song_title",
+    "song_duration_ms",
+    "play_count",
+    "played_at",
+    "year",
+    "month",
+    "day",
+    "hour_of_day",
+    "day_of_week",
+    "date_key",
+]
+
+
+def create_stage_table(cur):
+    """Create the session-local staging table used by the bulk loader."""
+    cur.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS {STAGE_TABLE} (
+            seq BIGINT NOT NULL,
+            artist_id VARCHAR NOT NULL,
+            artist_name VARCHAR NOT NULL,
+            song_id VARCHAR NOT NULL,
+            song_title VARCHAR NOT NULL,
+            song_duration_ms BIGINT NOT NULL,
+            play_count BIGINT NOT NULL,
+            played_at TIMESTAMPTZ NOT NULL,
+            year INT NOT NULL,
+            month INT NOT NULL,
+            day INT NOT NULL,
+            hour_of_day INT NOT NULL,
+            day_of_week VARCHAR NOT NULL,
+            date_key BIGINT NOT NULL
+        );
+    """)
+    cur.execute(f"TRUNCATE {STAGE_TABLE};")
+
+
+def copy_to_stage(cur, df):
+    """COPY a prepared frame (columns = STAGE_COLUMNS) into the staging table."""
+    copy_frame(cur, STAGE_TABLE, df, STAGE_COLUMNS,
+               options="FORMAT csv, FORCE_NOT_NULL (artist_name, song_title, day_of_week)")
+
+
+def filter_new_events(cur, prefix, user_key=0):
+    """
+    Drop staged rows whose (song_id, played_at) event is already in the load
+    ledger for this listener (or repeated within the stage) and record the
+    rest as applied. Returns the number of new events left in the stage.
+    """
+    cur.execute(f"""
+        DELETE FROM {STAGE_TABLE} st
+        USING {STAGE_TABLE} dup
+        WHERE st.song_id = dup.song_id
+          AND st.played_at = dup.played_at
+          AND st.seq > dup.seq;
+    """)
+    cur.execute(f"""
+        DELETE FROM {STAGE_TABLE} st
+        USING load_ledger_event e
+        WHERE e.user_key = %s
+          AND e.song_id = st.song_id
+          AND e.played_at = st.played_at;
+    """, (user_key,))
+    cur.execute(f"""
+        INSERT INTO load_ledger_event (user_key, song_id, played_at, prefix)
+        SELECT %s, song_id, played_at, %s FROM {STAGE_TABLE};
+    """, (user_key, prefix))
+    return cur.rowcount
+
+
+def merge_stage(cur, user_key=0):
+    """
+    Resolve dimensions and merge one listener's facts from the staging table
+    with set-based statements. Mirrors the per-row upserts: the last row for a natural key
+    wins for dimension attributes, and facts are aggregated on conflict.
+    """
+    cur.execute(f"""
+        INSERT INTO dim_artist (artist_id, artist_name)
+        SELECT DISTINCT ON (artist_id) artist_id, artist_name
+        FROM {STAGE_TABLE}
+        ORDER BY artist_id, seq DESC
+        ON CONFLICT (artist_id) DO UPDATE
+        SET artist_name = EXCLUDED.artist_name
+        WHERE dim_artist.artist_name IS DISTINCT FROM EXCLUDED.artist_name;
+    """)
+
+    cur.execute(f"""
+        INSERT INTO dim_song (song_id, song_title, song_duration_ms)
+        SELECT DISTINCT ON (song_id) song_id, song_title, song_duration_ms
+        FROM {STAGE_TABLE}
+        ORDER BY song_id, seq DESC
+        ON CONFLICT (song_id) DO UPDATE
+        SET song_title = EXCLUDED.song_title,
+            song_duration_ms = EXCLUDED.song_duration_ms
+        WHERE (dim_song.song_title, dim_song.song_duration_ms)
+              IS DISTINCT FROM (EXCLUDED.song_title, EXCLUDED.song_duration_ms);
+    """)
+
+    cur.execute(f"""
+        INSERT INTO dim_date (date_key, year, month, day, hour_of_day, day_of_week)
+        SELECT DISTINCT date_key, year, month, day, hour_of_day, day_of_week
+        FROM {STAGE_TABLE}
+        ON CONFLICT DO NOTHING;
+    """)
+
+    ensure_stage_partitions(cur, STAGE_TABLE)
+
+    # Rows sharing (song, artist, date) are pre-aggregated because a single
+    # INSERT ... ON CONFLICT cannot update the same target row twice.
+    cur.execute(f"""
+        INSERT INTO fact_play_summary (
+            user_key, song_key, artist_key, date_key, played_at, play_count, total_duration_ms
+        )
+        SELECT %s,
+               s.song_key,
+               a.artist_key,
+               st.date_key,
+               MAX(st.played_at),
+               SUM(st.play_count),
+               SUM(st.song_duration_ms)
+        FROM {STAGE_TABLE} st
+        JOIN dim_song s   ON s.song_id = st.song_id
+        JOIN dim_artist a ON a.artist_id = st.artist_id
+        GROUP BY s.song_key, a.artist_key, st.date_key
+        ON CONFLICT (user_key, song_key, artist_key, date_key)
+        DO UPDATE
+        SET play_count = fact_play_summary.play_count + EXCLUDED.play_count,
+            total_duration_ms = fact_play_summary.total_duration_ms + EXCLUDED.total_duration_ms,
+            played_at = GREATEST(fact_play_summary.played_at, EXCLUDED.played_at);
+    """, (user_key,))
+    return cur.rowcount
+
+
+def truncate_stage(cur):
+    cur.execute(f"TRUNCATE {STAGE_TABLE};")
@@ -0,0 +1,52 @@
+import argparse
+import logging
+from datetime import datetime
+from config import DIM_DATE_START, DIM_DATE_END
+
+logger = logging.getLogger(__name__)
+
+# Local time zone of the listener: dim_date and every date_key are in local
+# hours, while played_at stays UTC
+LOCAL_TZ = "Asia/Ho_Chi_Minh"
+
+
+def date_key_for(year, month, day, hour_of_day):
+    """
+    Smart key for dim_date: yyyymmddhh. Works on plain ints as well as on
+    pandas Series, so the transform stage can compute it column-wise.
+    """
+    return year * 1000000 + month * 10000 + day * 100 + hour_of_day
+
+
+def populate_dim_date(cur, start: str = DIM_DATE_START, end: str = DIM_DATE_END) -> int:
+    """Insert one dim_date row per local hour between start and end (inclusive)."""
+    cur.execute("""
+        INSERT INTO dim_date (date_key, year, month, day, hour_of_day, day_of_week)
+        SELECT to_char(ts, 'YYYYMMDDHH24')::BIGINT,
+               EXTRACT(YEAR FROM ts)::INT,
+               EXTRACT(MONTH FROM ts)::INT,
+               EXTRACT(DAY FROM ts)::INT,
+               EXTRACT(HOUR FROM ts)::INT,
+               to_char(ts, 'FMDay')
+        FROM generate_series(%s::timestamp, %s::timestamp, INTERVAL '1 hour') AS ts
+        ON CONFLICT DO NOTHING;
+    """, (start, end))
+    return cur.rowcount
+
+
+if __name__ == "__main__":
+    from etl.utils.db import cursor
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Pre-generate the dim_date calendar")
+    parser.add_argument("--start", default=DIM_DATE_START, help="first local hour, e.g. 2020-01-01")
+    parser.add_argument("--end", default=DIM_DATE_END, help="last local hour, e.g. 2030-12-31 23:00")
+    args = parser.parse_args()
+
+    # Fail early on malformed bounds rather than inside Postgres
+    datetime.fromisoformat(args.start)
+    datetime.fromisoformat(args.end)
+
+    with cursor() as cur:
+        inserted = populate_dim_date(cur, args.start, args.end)
+    logger.info(f"Inserted {inserted} dim_date rows for {args.start} .. {args.end}")
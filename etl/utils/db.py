@@ -1,11 +1,136 @@
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from io import StringIO
 import psycopg2
-from config import POSTGRES_DB, POSTGRES_USER, POSTGRES_PASSWORD, POSTGRES_HOST, POSTGRES_PORT
+from psycopg2 import extensions
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+from config import POSTGRES_DB, POSTGRES_USER, POSTGRES_PASSWORD, POSTGRES_HOST, POSTGRES_PORT, DB_POOL_MIN, DB_POOL_MAX
+from etl.utils.metrics import add_db_round_trips
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+class CountingCursor(extensions.cursor):
+    """Cursor that reports each statement sent to the server as a round trip."""
+
+    def execute(self, query, vars=None):
+        add_db_round_trips()
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        vars_list = list(vars_list)
+        add_db_round_trips(len(vars_list))
+        return super().executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        add_db_round_trips()
+        return super().copy_expert(sql, file, size)
+
+
+def connect_kwargs() -> dict:
+    return {
+        "dbname": POSTGRES_DB,
+        "user": POSTGRES_USER,
+        "password": POSTGRES_PASSWORD,
+        "host": POSTGRES_HOST,
+        "port": POSTGRES_PORT,
+        "cursor_factory": CountingCursor,
+    }
+
 
 def get_connection():
-    return psycopg2.connect(
-        dbname=POSTGRES_DB,
-        user=POSTGRES_USER,
-        password=POSTGRES_PASSWORD,
-        host=POSTGRES_HOST,
-        port=POSTGRES_PORT
-    )
\ No newline at end of file
+    """A fresh, unpooled connection. Prefer connection()/transaction()."""
+    return psycopg2.connect(**connect_kwargs())
+
+
+def get_pool() -> ThreadedConnectionPool:
+    """
+    Process-wide connection pool, created on first use. A forked worker
+    (backfill process pool) gets its own pool instead of sharing the
+    parent's sockets.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, **connect_kwargs())
+            _pool_pid = os.getpid()
+            logger.info(f"Opened Postgres pool ({DB_POOL_MIN}-{DB_POOL_MAX} connections) to {POSTGRES_HOST}:{POSTGRES_PORT}")
+        return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+
+
+@contextmanager
+def connection():
+    """
+    Borrow a pooled connection. Anything left uncommitted is rolled back
+    before the connection goes back, so the next borrower starts clean;
+    broken connections are discarded rather than returned.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        broken = bool(conn.closed)
+        if not broken and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        pool.putconn(conn, close=broken)
+
+
+@contextmanager
+def transaction():
+    """A pooled connection inside one transaction: committed on success, rolled back on error."""
+    with connection() as conn:
+        try:
+            yield conn
+            add_db_round_trips()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+@contextmanager
+def cursor():
+    """Shorthand for a cursor inside transaction()."""
+    with transaction() as conn:
+        with conn.cursor() as cur:
+            yield cur
+
+
+def insert_values(cur, sql: str, rows, template: str | None = None, page_size: int = 1000, fetch: bool = False):
+    """
+    Multi-row INSERT through execute_values: one round trip per page_size
+    rows instead of one per row. sql contains a single VALUES %s.
+    """
+    rows = list(rows)
+    if not rows:
+        return [] if fetch else 0
+    result = execute_values(cur, sql, rows, template=template, page_size=page_size, fetch=fetch)
+    return result if fetch else len(rows)
+
+
+def copy_frame(cur, table: str, df, columns: list[str], options: str = "FORMAT csv"):
+    """COPY a DataFrame's columns into a table in one round trip."""
+    buf = StringIO()
+    df[columns].to_csv(buf, index=False, header=False)
+    buf.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH ({options})", buf)
+    return len(df)
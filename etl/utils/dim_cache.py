@@ -0,0 +1,124 @@
+from collections import OrderedDict
+from etl.utils.dim_loader import upsert_artist, upsert_song, upsert_date
+
+
+class LRUDict:
+    """Minimal bounded mapping that evicts the least recently used key."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key):
+        if key not in self._data:
+            return None
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DimensionKeyCache:
+    """
+    Caches surrogate keys for dim_artist, dim_song and dim_date by natural key.
+    A cached key is only reused when the attributes match what was last
+    written; a new natural key or changed attributes go through the upsert.
+
+    Entries written since the last commit() can be dropped with rollback()
+    when the caller rolls the database back to a savepoint.
+    """
+
+    def __init__(self, maxsize: int = 100000):
+        self.artists = LRUDict(maxsize)
+        self.songs = LRUDict(maxsize)
+        self.dates = LRUDict(maxsize)
+        self.hits = {"artist": 0, "song": 0, "date": 0}
+        self.misses = {"artist": 0, "song": 0, "date": 0}
+        self._pending = []
+
+    def warm(self, cur):
+        """Pre-load the most recent keys of each dimension table."""
+        cur.execute(
+            "SELECT artist_id, artist_key, artist_name FROM dim_artist ORDER BY artist_key DESC LIMIT %s;",
+            (self.artists.maxsize,),
+        )
+        for artist_id, artist_key, artist_name in cur.fetchall():
+            self.artists.put(artist_id, (artist_key, (artist_name,)))
+
+        cur.execute(
+            "SELECT song_id, song_key, song_title, song_duration_ms FROM dim_song ORDER BY song_key DESC LIMIT %s;",
+            (self.songs.maxsize,),
+        )
+        for song_id, song_key, song_title, song_duration_ms in cur.fetchall():
+            self.songs.put(song_id, (song_key, (song_title, song_duration_ms)))
+
+        cur.execute(
+            """
+            SELECT year, month, day, hour_of_day, day_of_week, date_key
+            FROM dim_date ORDER BY date_key DESC LIMIT %s;
+            """,
+            (self.dates.maxsize,),
+        )
+        for year, month, day, hour_of_day, day_of_week, date_key in cur.fetchall():
+            self.dates.put((year, month, day, hour_of_day, day_of_week), (date_key, ()))
+
+        return len(self.artists), len(self.songs), len(self.dates)
+
+    def _lookup(self, kind, table, natural_key, attrs, upsert):
+        cached = table.get(natural_key)
+        if cached is not None and cached[1] == attrs:
+            self.hits[kind] += 1
+            return cached[0]
+        self.misses[kind] += 1
+        key = upsert()
+        if key:
+            table.put(natural_key, (key, attrs))
+            self._pending.append((table, natural_key))
+        return key
+
+    def artist_key(self, cur, artist_id, artist_name):
+        return self._lookup(
+            "artist", self.artists, artist_id, (artist_name,),
+            lambda: upsert_artist(cur, artist_id, artist_name),
+        )
+
+    def song_key(self, cur, song_id, song_title, song_duration_ms):
+        return self._lookup(
+            "song", self.songs, song_id, (song_title, song_duration_ms),
+            lambda: upsert_song(cur, song_id, song_title, song_duration_ms),
+        )
+
+    def date_key(self, cur, year, month, day, hour_of_day, day_of_week):
+        return self._lookup(
+            "date", self.dates, (year, month, day, hour_of_day, day_of_week), (),
+            lambda: upsert_date(cur, year, month, day, hour_of_day, day_of_week),
+        )
+
+    def commit(self):
+        self._pending.clear()
+
+    def rollback(self):
+        for table, natural_key in self._pending:
+            table.pop(natural_key)
+        self._pending.clear()
+
+    def stats(self) -> dict:
+        hits = sum(self.hits.values())
+        misses = sum(self.misses.values())
+        total = hits + misses
+        return {
+            "hits": dict(self.hits),
+            "misses": dict(self.misses),
+            "round_trips_saved": hits,
+            "hit_ratio": hits / total if total else 0.0,
+        }
@@ -1,3 +1,6 @@
+from etl.utils.date_dim import date_key_for
+
+
 def upsert_artist(cur, artist_id, artist_name):
     cur.execute("""
         INSERT INTO dim_artist (artist_id, artist_name)
@@ -20,18 +23,12 @@ def upsert_song(cur, song_id, song_title, song_duration_ms):
     return cur.fetchone()[0]
 
 def upsert_date(cur, year, month, day, hour_of_day, day_of_week):
+    # date_key is computed (yyyymmddhh), so there is nothing to read back;
+    # the insert only matters for hours outside the pre-generated calendar
+    date_key = date_key_for(year, month, day, hour_of_day)
     cur.execute("""
-        INSERT INTO dim_date (year, month, day, hour_of_day, day_of_week)
-        VALUES (%s, %s, %s, %s, %s)
-        ON CONFLICT (year, month, day, hour_of_day, day_of_week) DO NOTHING
-        RETURNING date_key;
-    """, (year, month, day, hour_of_day, day_of_week))
-    result = cur.fetchone()
-    if result is not None:
-        return result[0]
-    # If not inserted, fetch the existing key
-    cur.execute("""
-        SELECT date_key FROM dim_date
-        WHERE year = %s AND month = %s AND day = %s AND hour_of_day = %s AND day_of_week = %s;
-    """, (year, month, day, hour_of_day, day_of_week))
-    return cur.fetchone()[0]
+        INSERT INTO dim_date (date_key, year, month, day, hour_of_day, day_of_week)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON CONFLICT DO NOTHING;
+    """, (date_key, year, month, day, hour_of_day, day_of_week))
+    return date_key
@@ -1,14 +1,15 @@
-def insert_fact_play_summary(cur, song_key, artist_key, date_key, played_at, play_count=1, total_duration_ms=0):
+def insert_fact_play_summary(cur, song_key, artist_key, date_key, played_at, play_count=1, total_duration_ms=0,
+                             user_key=0):
     cur.execute("""
         INSERT INTO fact_play_summary (
-            song_key, artist_key, date_key, played_at, play_count, total_duration_ms
+            user_key, song_key, artist_key, date_key, played_at, play_count, total_duration_ms
         )
-        VALUES (%s, %s, %s, %s, %s, %s)
-        ON CONFLICT (song_key, artist_key, date_key)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (user_key, song_key, artist_key, date_key)
         DO UPDATE
         SET play_count = fact_play_summary.play_count + EXCLUDED.play_count,
             total_duration_ms = fact_play_summary.total_duration_ms + EXCLUDED.total_duration_ms,
             played_at = GREATEST(fact_play_summary.played_at, EXCLUDED.played_at)
         RETURNING play_id;
-    """, (song_key, artist_key, date_key, played_at, play_count, total_duration_ms))
+    """, (user_key, song_key, artist_key, date_key, played_at, play_count, total_duration_ms))
     return cur.fetchone()[0]
\ No newline at end of file
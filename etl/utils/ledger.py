@@ -0,0 +1,51 @@
+import hashlib
+import pandas as pd
+
+
+def record_event(cur, song_id, played_at, prefix, user_key=0):
+    """Record a listener's play event as applied. Returns False if it was applied before."""
+    cur.execute("""
+        INSERT INTO load_ledger_event (user_key, song_id, played_at, prefix)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (user_key, song_id, played_at) DO NOTHING
+        RETURNING 1;
+    """, (user_key, song_id, played_at, prefix))
+    return cur.fetchone() is not None
+
+
+def content_hash(df: pd.DataFrame) -> str:
+    """
+    sha256 over a frame's distinct (song_id, played_at) events, one
+    "<song_id>|<epoch microseconds>" line each in byte order. Two versions of
+    a prefix with the same row count but different plays hash differently.
+    """
+    events = df.dropna(subset=["song_id", "played_at"])
+    played_at = pd.to_datetime(events["played_at"], utc=True)
+    micros = (played_at - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(microseconds=1)
+    lines = sorted(set(events["song_id"].astype(str) + "|" + micros.astype(str)))
+    return hashlib.sha256("\n".join(lines).encode("utf-8")).hexdigest()
+
+
+def get_ledger_entry(cur, prefix):
+    """Return (row_count, applied_events, content_hash) recorded for a prefix, or None."""
+    cur.execute("""
+        SELECT row_count, applied_events, content_hash FROM load_ledger WHERE prefix = %s;
+    """, (prefix,))
+    return cur.fetchone()
+
+
+def is_applied(entry, row_count, digest) -> bool:
+    """True if a ledger entry already covers this exact version of the prefix."""
+    return entry is not None and entry[0] == row_count and entry[2] == digest
+
+
+def upsert_ledger_entry(cur, prefix, row_count, applied_events, content_hash=None):
+    cur.execute("""
+        INSERT INTO load_ledger (prefix, row_count, applied_events, content_hash, loaded_at)
+        VALUES (%s, %s, %s, %s, NOW())
+        ON CONFLICT (prefix) DO UPDATE
+        SET row_count = EXCLUDED.row_count,
+            applied_events = load_ledger.applied_events + EXCLUDED.applied_events,
+            content_hash = EXCLUDED.content_hash,
+            loaded_at = EXCLUDED.loaded_at;
+    """, (prefix, row_count, applied_events, content_hash))
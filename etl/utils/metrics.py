@@ -0,0 +1,290 @@
+"""
+Per-stage performance metrics.
+
+    with stage("transform", prefix=prefix) as m:
+        m.rows_in = len(df)
+        ...
+
+A stage records duration, rows in/out, object-store bytes, Postgres round
+trips and peak RSS. Counters bumped through add_*() go to the innermost open
+stage; bytes and round trips also roll up into its parents, so a DAG task
+stage totals the I/O of the stages it ran. Finished stages go to a
+structured log line and, when configured, a Prometheus textfile and/or StatsD.
+"""
+import functools
+import json
+import logging
+import os
+import resource
+import socket
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from config import (
+    METRICS_NAMESPACE, METRICS_TEXTFILE_DIR, METRICS_STATSD_HOST, METRICS_STATSD_PORT, METRICS_RSS_SAMPLE_S,
+)
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ["rows_in", "rows_out", "bytes_read", "bytes_written", "db_round_trips"]
+# Resource counters that also accumulate into enclosing stages
+ROLLUP_COUNTERS = {"bytes_read", "bytes_written", "db_round_trips"}
+
+_current = ContextVar("etl_metrics_stage", default=None)
+# Worker threads running in copies of a context share its stages
+_add_lock = threading.Lock()
+
+
+class StageMetrics:
+    def __init__(self, name: str, prefix: str | None, parent: "StageMetrics | None"):
+        self.name = name
+        self.prefix = prefix
+        self.parent = parent
+        self.status = "ok"
+        self.duration_s = 0.0
+        self.peak_rss_bytes = 0
+        for counter in COUNTERS:
+            setattr(self, counter, 0)
+
+    def add(self, counter: str, value: int):
+        stage = self
+        with _add_lock:
+            while stage is not None:
+                setattr(stage, counter, getattr(stage, counter) + value)
+                stage = stage.parent if counter in ROLLUP_COUNTERS else None
+
+    def as_dict(self) -> dict:
+        return {
+            "stage": self.name,
+            "prefix": self.prefix,
+            "status": self.status,
+            "duration_s": round(self.duration_s, 6),
+            "peak_rss_bytes": self.peak_rss_bytes,
+            **{counter: getattr(self, counter) for counter in COUNTERS},
+        }
+
+
+# ---------- Counters ----------
+def current_stage() -> StageMetrics | None:
+    return _current.get()
+
+
+def _add(counter: str, value: int):
+    stage = _current.get()
+    if stage is not None and value:
+        stage.add(counter, int(value))
+
+
+def add_rows_in(n: int):
+    _add("rows_in", n)
+
+
+def add_rows_out(n: int):
+    _add("rows_out", n)
+
+
+def add_bytes_read(n: int):
+    _add("bytes_read", n)
+
+
+def add_bytes_written(n: int):
+    _add("bytes_written", n)
+
+
+def add_db_round_trips(n: int = 1):
+    _add("db_round_trips", n)
+
+
+class CountingReader:
+    """
+    File-like wrapper that reports the bytes passing through it: read from
+    an object-store stream by default, or to another counter (uploads pass
+    add_bytes_written).
+    """
+
+    def __init__(self, raw, count=None):
+        self.raw = raw
+        self.count = count or add_bytes_read
+        self.bytes = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self.bytes += len(data)
+        self.count(len(data))
+        return data
+
+    def readable(self) -> bool:
+        return True
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+# ---------- Peak memory ----------
+def current_rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Not Linux: fall back to the process high-water mark (KiB on Linux, bytes on macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class _RSSSampler:
+    """One background thread sampling RSS while any stage is open."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = set()
+        self._thread = None
+        self._stop = None
+
+    def _run(self, stop: threading.Event):
+        while not stop.wait(METRICS_RSS_SAMPLE_S):
+            self.sample()
+
+    def sample(self):
+        rss = current_rss_bytes()
+        with self._lock:
+            for stage in self._active:
+                stage.peak_rss_bytes = max(stage.peak_rss_bytes, rss)
+
+    def enter(self, stage: StageMetrics):
+        stage.peak_rss_bytes = current_rss_bytes()
+        with self._lock:
+            self._active.add(stage)
+            if self._thread is None and METRICS_RSS_SAMPLE_S > 0:
+                self._stop = threading.Event()
+                self._thread = threading.Thread(target=self._run, args=(self._stop,), name="metrics-rss", daemon=True)
+                self._thread.start()
+
+    def exit(self, stage: StageMetrics):
+        self.sample()
+        with self._lock:
+            self._active.discard(stage)
+            thread = self._thread if not self._active else None
+            if thread is not None:
+                self._stop.set()
+                self._thread = None
+        if thread is not None:
+            thread.join()
+
+
+_sampler = _RSSSampler()
+
+
+# ---------- Stages ----------
+@contextmanager
+def stage(name: str, prefix: str | None = None):
+    parent = _current.get()
+    if prefix is None and parent is not None:
+        prefix = parent.prefix
+    metrics = StageMetrics(name, prefix, parent)
+    token = _current.set(metrics)
+    _sampler.enter(metrics)
+    started = time.perf_counter()
+    try:
+        yield metrics
+    except BaseException:
+        metrics.status = "error"
+        raise
+    finally:
+        metrics.duration_s = time.perf_counter() - started
+        _sampler.exit(metrics)
+        _current.reset(token)
+        emit(metrics)
+
+
+def _row_count(value) -> int | None:
+    if isinstance(value, bool) or isinstance(value, (str, bytes)):
+        return None
+    if isinstance(value, int):
+        return value
+    if hasattr(value, "__len__"):
+        return len(value)
+    return None
+
+
+def instrumented(name: str, count_input: bool = False):
+    """
+    Run a function inside stage(name). rows_out comes from the result (its
+    length, or the value of an int); with count_input, rows_in comes from
+    the first argument.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name) as metrics:
+                if count_input and args:
+                    metrics.rows_in += _row_count(args[0]) or 0
+                result = fn(*args, **kwargs)
+                metrics.rows_out += _row_count(result) or 0
+                return result
+        return wrapper
+    return decorator
+
+
+def emit(metrics: StageMetrics):
+    record = metrics.as_dict()
+    logger.info(f"stage_metrics {json.dumps(record)}")
+    try:
+        if METRICS_TEXTFILE_DIR:
+            write_textfile(record, METRICS_TEXTFILE_DIR)
+        if METRICS_STATSD_HOST:
+            send_statsd(record, METRICS_STATSD_HOST, METRICS_STATSD_PORT)
+    except OSError as e:
+        # Metrics must never fail the pipeline
+        logger.warning(f"Failed to export stage metrics: {e}")
+
+
+# ---------- Sinks ----------
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def prometheus_lines(record: dict) -> list[str]:
+    labels = f'stage="{_label(record["stage"])}",prefix="{_label(record["prefix"] or "")}",status="{record["status"]}"'
+    ns = METRICS_NAMESPACE
+    values = {
+        "stage_duration_seconds": record["duration_s"],
+        "stage_peak_rss_bytes": record["peak_rss_bytes"],
+        **{f"stage_{counter}": record[counter] for counter in COUNTERS},
+        "stage_last_run_timestamp_seconds": round(time.time(), 3),
+    }
+    lines = []
+    for name, value in values.items():
+        lines.append(f"# TYPE {ns}_{name} gauge")
+        lines.append(f"{ns}_{name}{{{labels}}} {value}")
+    return lines
+
+
+def write_textfile(record: dict, directory: str):
+    """
+    One .prom file per stage for node_exporter's textfile collector, holding
+    the latest run. Written to a temp file and renamed so the collector
+    never reads a partial file.
+    """
+    os.makedirs(directory, exist_ok=True)
+    safe_name = "".join(c if c.isalnum() else "_" for c in record["stage"])
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".prom")
+    with os.fdopen(fd, "w") as f:
+        f.write("\n".join(prometheus_lines(record)) + "\n")
+    os.replace(tmp, os.path.join(directory, f"{METRICS_NAMESPACE}_{safe_name}.prom"))
+
+
+def statsd_lines(record: dict) -> list[str]:
+    base = f"{METRICS_NAMESPACE}.{record['stage']}"
+    lines = [
+        f"{base}.duration_ms:{record['duration_s'] * 1000:.3f}|ms",
+        f"{base}.peak_rss_bytes:{record['peak_rss_bytes']}|g",
+        f"{base}.runs.{record['status']}:1|c",
+    ]
+    lines += [f"{base}.{counter}:{record[counter]}|c" for counter in COUNTERS if record[counter]]
+    return lines
+
+
+def send_statsd(record: dict, host: str, port: int = 8125):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.sendto("\n".join(statsd_lines(record)).encode("utf-8"), (host, port))
@@ -0,0 +1,60 @@
+import gzip
+import io
+import json
+
+RAW_FORMATS = ("json", "ndjson.gz", "ndjson.zst")
+
+CONTENT_TYPES = {
+    "json": "application/json",
+    "ndjson.gz": "application/gzip",
+    "ndjson.zst": "application/zstd",
+}
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError("The ndjson.zst raw format requires the 'zstandard' package") from e
+    return zstandard
+
+
+def compressed_writer(fileobj, fmt: str):
+    """Binary writer that compresses into fileobj; closing it leaves fileobj open."""
+    if fmt == "ndjson.gz":
+        return gzip.GzipFile(fileobj=fileobj, mode="wb")
+    if fmt == "ndjson.zst":
+        return _zstandard().ZstdCompressor().stream_writer(fileobj, closefd=False)
+    raise ValueError(f"Unsupported compressed raw format: {fmt}")
+
+
+def compressed_reader(fileobj, fmt: str):
+    """Line-iterable binary reader that decompresses fileobj incrementally."""
+    if fmt == "ndjson.gz":
+        return gzip.GzipFile(fileobj=fileobj, mode="rb")
+    if fmt == "ndjson.zst":
+        return io.BufferedReader(_zstandard().ZstdDecompressor().stream_reader(fileobj))
+    raise ValueError(f"Unsupported compressed raw format: {fmt}")
+
+
+def write_ndjson(records, writer) -> int:
+    count = 0
+    for record in records:
+        writer.write(json.dumps(record).encode("utf-8"))
+        writer.write(b"\n")
+        count += 1
+    return count
+
+
+def iter_ndjson_chunks(reader, chunksize: int):
+    """Yield lists of at most chunksize decoded records."""
+    chunk = []
+    for line in reader:
+        if not line.strip():
+            continue
+        chunk.append(json.loads(line))
+        if len(chunk) >= chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
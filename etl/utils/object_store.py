@@ -0,0 +1,346 @@
+"""
+Object store used by every pipeline stage.
+
+get_object_store() returns one cached store per process, chosen by
+OBJECT_STORE_BACKEND:
+
+- "minio": the MinIO/S3 bucket from config (default)
+- "local": a directory tree under OBJECT_STORE_ROOT
+- "memory": a process-local dict, for tests and benchmarks; worker
+  processes never see its objects, so the backfill rejects it
+
+Uploads stream from file objects (multipart when the length is unknown),
+open_read() streams an object sequentially, and open_seekable() serves
+random access with ranged reads, which is what parquet readers need.
+"""
+import io
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from config import (
+    MINIO_BUCKET, OBJECT_STORE_BACKEND, OBJECT_STORE_ROOT, OBJECT_STORE_PART_SIZE, OBJECT_STORE_READ_BUFFER,
+)
+from etl.utils.metrics import add_bytes_read, add_bytes_written, CountingReader
+
+logger = logging.getLogger(__name__)
+
+
+class _RangedReader(io.RawIOBase):
+    """Seekable raw reader; every read is one ranged request to the store."""
+
+    def __init__(self, store: "ObjectStore", key: str, size: int):
+        self.store = store
+        self.key = key
+        self.size = size
+        self.pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.pos, io.SEEK_END: self.size}[whence]
+        self.pos = max(0, base + offset)
+        return self.pos
+
+    def readinto(self, buffer) -> int:
+        if self.pos >= self.size:
+            return 0
+        length = min(len(buffer), self.size - self.pos)
+        data = self.store.read_range(self.key, self.pos, length)
+        buffer[:len(data)] = data
+        self.pos += len(data)
+        return len(data)
+
+
+class ObjectStore(ABC):
+    """Backend-independent helpers on top of a handful of primitives."""
+
+    bucket = None
+
+    # ---------- Primitives (per backend) ----------
+    @abstractmethod
+    def put_stream(self, key: str, stream, length: int = -1, content_type: str = "application/octet-stream") -> int:
+        """Upload a stream (length -1 when unknown); returns the bytes written."""
+
+    @abstractmethod
+    def _open(self, key: str):
+        """Raw readable for the whole object; FileNotFoundError if it does not exist."""
+
+    @abstractmethod
+    def read_range(self, key: str, offset: int, length: int) -> bytes:
+        """Up to length bytes from offset."""
+
+    @abstractmethod
+    def size(self, key: str) -> int:
+        """Object size in bytes; FileNotFoundError if it does not exist."""
+
+    @abstractmethod
+    def copy(self, src: str, dst: str):
+        """Server-side copy where the backend has one."""
+
+    @abstractmethod
+    def remove(self, key: str):
+        """Delete an object; a missing object is not an error."""
+
+    @abstractmethod
+    def list_prefixes(self, prefix: str) -> list[str]:
+        """Names of the immediate "directories" under prefix (which ends in /)."""
+
+    # ---------- Helpers ----------
+    def put_bytes(self, key: str, data: bytes, content_type: str = "application/octet-stream") -> int:
+        return self.put_stream(key, io.BytesIO(data), len(data), content_type)
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.size(key)
+            return True
+        except FileNotFoundError:
+            return False
+
+    @contextmanager
+    def open_read(self, key: str):
+        """Sequential, streaming reader over the whole object."""
+        raw = self._open(key)
+        try:
+            yield CountingReader(raw)
+        finally:
+            raw.close()
+
+    def open_seekable(self, key: str, buffer_size: int = OBJECT_STORE_READ_BUFFER):
+        """Buffered random-access reader; reads only the byte ranges actually requested."""
+        return io.BufferedReader(_RangedReader(self, key, self.size(key)), buffer_size=buffer_size)
+
+    def get_bytes(self, key: str) -> bytes:
+        with self.open_read(key) as reader:
+            return reader.read()
+
+    def put_parquet(self, key: str, df, **kwargs) -> int:
+        """Write a DataFrame as parquet through a spooled temp file, never a full in-memory copy on large frames."""
+        with tempfile.SpooledTemporaryFile(max_size=OBJECT_STORE_PART_SIZE) as spool:
+            df.to_parquet(spool, index=False, **kwargs)
+            length = spool.tell()
+            spool.seek(0)
+            return self.put_stream(key, spool, length, "application/parquet")
+
+    def read_parquet(self, key: str, **kwargs):
+        import pandas as pd
+
+        with self.open_seekable(key) as reader:
+            return pd.read_parquet(reader, **kwargs)
+
+
+class MinioObjectStore(ObjectStore):
+    def __init__(self, client, bucket: str = MINIO_BUCKET, part_size: int = OBJECT_STORE_PART_SIZE):
+        self.client = client
+        self.bucket = bucket
+        self.part_size = part_size
+
+    @staticmethod
+    def _missing(e) -> bool:
+        return getattr(e, "code", None) in ("NoSuchKey", "NoSuchObject", "ResourceNotFound")
+
+    def put_stream(self, key, stream, length=-1, content_type="application/octet-stream") -> int:
+        counted = CountingReader(stream, count=add_bytes_written)
+        # length=-1 streams a multipart upload in part_size chunks
+        self.client.put_object(self.bucket, key, counted, length=length, part_size=self.part_size,
+                               content_type=content_type)
+        return counted.bytes
+
+    def _open(self, key):
+        from minio.error import S3Error
+
+        try:
+            response = self.client.get_object(self.bucket, key)
+        except S3Error as e:
+            if self._missing(e):
+                raise FileNotFoundError(key) from e
+            raise
+        return _MinioBody(response)
+
+    def read_range(self, key, offset, length) -> bytes:
+        response = self.client.get_object(self.bucket, key, offset=offset, length=length)
+        try:
+            data = response.read()
+        finally:
+            response.close()
+            response.release_conn()
+        add_bytes_read(len(data))
+        return data
+
+    def size(self, key) -> int:
+        from minio.error import S3Error
+
+        try:
+            return self.client.stat_object(self.bucket, key).size
+        except S3Error as e:
+            if self._missing(e):
+                raise FileNotFoundError(key) from e
+            raise
+
+    def copy(self, src, dst):
+        from minio.commonconfig import CopySource
+
+        self.client.copy_object(self.bucket, dst, CopySource(self.bucket, src))
+
+    def remove(self, key):
+        self.client.remove_object(self.bucket, key)
+
+    def list_prefixes(self, prefix) -> list[str]:
+        return [
+            obj.object_name[len(prefix):].rstrip("/")
+            for obj in self.client.list_objects(self.bucket, prefix=prefix, recursive=False)
+            if obj.is_dir
+        ]
+
+
+class _MinioBody:
+    """Streaming response body that returns its connection to the pool on close."""
+
+    def __init__(self, response):
+        self.response = response
+
+    def read(self, size: int = -1) -> bytes:
+        return self.response.read() if size is None or size < 0 else self.response.read(size)
+
+    def close(self):
+        self.response.close()
+        self.response.release_conn()
+
+
+class LocalObjectStore(ObjectStore):
+    """Objects as files under root; writes go to a temp file and are renamed into place."""
+
+    def __init__(self, root: str = OBJECT_STORE_ROOT):
+        self.root = Path(root)
+        self.bucket = str(self.root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+    def put_stream(self, key, stream, length=-1, content_type="application/octet-stream") -> int:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".upload-")
+        with os.fdopen(fd, "wb") as f:
+            shutil.copyfileobj(stream, f, OBJECT_STORE_PART_SIZE)
+            written = f.tell()
+        os.replace(tmp, path)
+        add_bytes_written(written)
+        return written
+
+    def _open(self, key):
+        return open(self._path(key), "rb")
+
+    def read_range(self, key, offset, length) -> bytes:
+        with open(self._path(key), "rb") as f:
+            f.seek(offset)
+            data = f.read(length)
+        add_bytes_read(len(data))
+        return data
+
+    def size(self, key) -> int:
+        return self._path(key).stat().st_size
+
+    def copy(self, src, dst):
+        with open(self._path(src), "rb") as f:
+            self.put_stream(dst, f)
+
+    def remove(self, key):
+        self._path(key).unlink(missing_ok=True)
+
+    def list_prefixes(self, prefix) -> list[str]:
+        directory = self._path(prefix)
+        if not directory.is_dir():
+            return []
+        return sorted(p.name for p in directory.iterdir() if p.is_dir())
+
+
+class MemoryObjectStore(ObjectStore):
+    def __init__(self):
+        self.bucket = "memory"
+        self.objects = {}
+        self._lock = threading.Lock()
+
+    def put_stream(self, key, stream, length=-1, content_type="application/octet-stream") -> int:
+        data = stream.read()
+        with self._lock:
+            self.objects[key] = bytes(data)
+        add_bytes_written(len(data))
+        return len(data)
+
+    def _get(self, key) -> bytes:
+        with self._lock:
+            if key not in self.objects:
+                raise FileNotFoundError(key)
+            return self.objects[key]
+
+    def _open(self, key):
+        return io.BytesIO(self._get(key))
+
+    def read_range(self, key, offset, length) -> bytes:
+        data = self._get(key)[offset:offset + length]
+        add_bytes_read(len(data))
+        return data
+
+    def size(self, key) -> int:
+        return len(self._get(key))
+
+    def copy(self, src, dst):
+        data = self._get(src)
+        with self._lock:
+            self.objects[dst] = data
+
+    def remove(self, key):
+        with self._lock:
+            self.objects.pop(key, None)
+
+    def list_prefixes(self, prefix) -> list[str]:
+        with self._lock:
+            keys = list(self.objects)
+        return sorted({k[len(prefix):].split("/", 1)[0] for k in keys if k.startswith(prefix) and "/" in k[len(prefix):]})
+
+
+_store = None
+_store_pid = None
+_store_lock = threading.Lock()
+
+
+def create_object_store(backend: str = OBJECT_STORE_BACKEND) -> ObjectStore:
+    if backend == "minio":
+        from etl.utils.minio_utils import init_minio_client
+
+        return MinioObjectStore(init_minio_client())
+    if backend == "local":
+        return LocalObjectStore()
+    if backend == "memory":
+        return MemoryObjectStore()
+    raise ValueError(f"Unknown object store backend: {backend}")
+
+
+def get_object_store() -> ObjectStore:
+    """The process-wide store. Forked workers build their own client rather than share sockets."""
+    global _store, _store_pid
+    with _store_lock:
+        if _store is None or _store_pid != os.getpid():
+            _store = create_object_store()
+            _store_pid = os.getpid()
+            logger.info(f"Using {OBJECT_STORE_BACKEND} object store ({_store.bucket})")
+        return _store
+
+
+def set_object_store(store: ObjectStore | None):
+    """Swap the process-wide store (benchmarks, tests); None resets to the configured backend."""
+    global _store, _store_pid
+    with _store_lock:
+        _store, _store_pid = store, (os.getpid() if store is not None else None)
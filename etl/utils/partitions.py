@@ -0,0 +1,62 @@
+"""
+Monthly partitions of fact_play_summary. Partitions cover one local month
+of date_key (yyyymm0100 up to the next month) and are created on demand by
+the ensure_fact_play_partition() SQL function before a load writes facts.
+"""
+import logging
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from etl.utils.date_dim import date_key_for
+
+logger = logging.getLogger(__name__)
+
+FACT_TABLE = "fact_play_summary"
+DEFAULT_PARTITION = f"{FACT_TABLE}_default"
+
+
+def month_key(date_key: int) -> int:
+    """yyyymm of a yyyymmddhh date_key."""
+    return int(date_key) // 10000
+
+
+def partition_name(month: int) -> str:
+    return f"{FACT_TABLE}_{month}"
+
+
+def ensure_month_partitions(cur, date_keys) -> list[int]:
+    """Make sure every month touched by date_keys has its partition. Returns the months."""
+    months = sorted({month_key(k) for k in date_keys})
+    for month in months:
+        cur.execute("SELECT ensure_fact_play_partition(%s);", (month,))
+    return months
+
+
+def ensure_stage_partitions(cur, stage_table: str = "stage_play"):
+    """ensure_month_partitions for every month present in a staging table."""
+    cur.execute(f"""
+        SELECT ensure_fact_play_partition(m)
+        FROM (SELECT DISTINCT (date_key / 10000)::INT AS m FROM {stage_table} ORDER BY 1) months;
+    """)
+
+
+def list_month_partitions(cur) -> list[int]:
+    """Months with an attached partition, oldest first (the default partition is not listed)."""
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass;
+    """, (FACT_TABLE,))
+    prefix = f"{FACT_TABLE}_"
+    return sorted(int(name[len(prefix):]) for (name,) in cur.fetchall() if name[len(prefix):].isdigit())
+
+
+def history_cutoff_key(days: int, tz: str, now: datetime | None = None) -> int | None:
+    """
+    date_key of the local hour `days` ago, for bounding play-history queries
+    so they prune old partitions; None when days is 0 (no bound).
+    """
+    if days <= 0:
+        return None
+    local = (now or datetime.now(ZoneInfo(tz))).astimezone(ZoneInfo(tz)) - timedelta(days=days)
+    return date_key_for(local.year, local.month, local.day, local.hour)
@@ -0,0 +1,52 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every client that talks to the same
+    API. Tokens refill at `rate` per second up to `capacity`; acquire()
+    blocks until one is available. pause() empties the bucket and holds all
+    callers back, so one 429 with Retry-After slows every account down, not
+    just the one that hit it.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.waited_s = 0.0
+
+    def _refill(self, now: float):
+        if now > self._updated:
+            start = max(self._updated, self._paused_until)
+            if now > start:
+                self._tokens = min(self.capacity, self._tokens + (now - start) * self.rate)
+            self._updated = now
+
+    def acquire(self, tokens: float = 1.0):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                if now < self._paused_until:
+                    delay = self._paused_until - now
+                else:
+                    delay = (tokens - self._tokens) / self.rate
+                self.waited_s += delay
+            time.sleep(delay)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens = 0.0
+            self._paused_until = max(self._paused_until, now + seconds)
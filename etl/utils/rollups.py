@@ -0,0 +1,134 @@
+"""
+Pre-aggregated rollups behind the Metabase dashboard. Loads add the plays
+they newly applied, so dashboard tiles read a few small tables instead of
+scanning fact_play_summary.
+"""
+import logging
+from etl.utils.db import insert_values
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_TABLES = {
+    "rollup_hour_dow": ["day_of_week", "hour_of_day"],
+    "rollup_artist": ["artist_key"],
+    "rollup_song_hour": ["song_key", "hour_of_day"],
+}
+
+
+def _upsert_sql(table: str, keys: list[str]) -> str:
+    return f"""
+        INSERT INTO {table} ({", ".join(keys)}, play_count, total_duration_ms)
+        VALUES %s
+        ON CONFLICT ({", ".join(keys)}) DO UPDATE
+        SET play_count = {table}.play_count + EXCLUDED.play_count,
+            total_duration_ms = {table}.total_duration_ms + EXCLUDED.total_duration_ms;
+    """
+
+
+class RollupDelta:
+    """
+    Rollup increments collected during a row load and written in one batch
+    per table. Like DimensionKeyCache, additions for the current row stay
+    pending until commit() so a row rolled back to its savepoint is not counted.
+    """
+
+    def __init__(self):
+        self.totals = {table: {} for table in ROLLUP_TABLES}
+        self._pending = []
+
+    def add(self, song_key, artist_key, day_of_week, hour_of_day, play_count, duration_ms):
+        self._pending.append((song_key, artist_key, day_of_week, hour_of_day, play_count, duration_ms))
+
+    def commit(self):
+        for song_key, artist_key, day_of_week, hour_of_day, play_count, duration_ms in self._pending:
+            for table, key in (
+                ("rollup_hour_dow", (day_of_week, hour_of_day)),
+                ("rollup_artist", (artist_key,)),
+                ("rollup_song_hour", (song_key, hour_of_day)),
+            ):
+                plays, ms = self.totals[table].get(key, (0, 0))
+                self.totals[table][key] = (plays + play_count, ms + duration_ms)
+        self._pending.clear()
+
+    def rollback(self):
+        self._pending.clear()
+
+    def flush(self, cur) -> int:
+        """Write accumulated increments and reset. Returns the number of rollup rows touched."""
+        touched = 0
+        for table, keys in ROLLUP_TABLES.items():
+            rows = [(*key, plays, ms) for key, (plays, ms) in self.totals[table].items()]
+            touched += insert_values(cur, _upsert_sql(table, keys), rows)
+            self.totals[table].clear()
+        return touched
+
+
+def merge_stage_rollups(cur, stage_table: str = "stage_play"):
+    """Add the staged (already ledger-filtered) plays to every rollup."""
+    cur.execute(f"""
+        INSERT INTO rollup_hour_dow (day_of_week, hour_of_day, play_count, total_duration_ms)
+        SELECT day_of_week, hour_of_day, SUM(play_count), SUM(song_duration_ms)
+        FROM {stage_table}
+        GROUP BY day_of_week, hour_of_day
+        ON CONFLICT (day_of_week, hour_of_day) DO UPDATE
+        SET play_count = rollup_hour_dow.play_count + EXCLUDED.play_count,
+            total_duration_ms = rollup_hour_dow.total_duration_ms + EXCLUDED.total_duration_ms;
+    """)
+    cur.execute(f"""
+        INSERT INTO rollup_artist (artist_key, play_count, total_duration_ms)
+        SELECT a.artist_key, SUM(st.play_count), SUM(st.song_duration_ms)
+        FROM {stage_table} st
+        JOIN dim_artist a ON a.artist_id = st.artist_id
+        GROUP BY a.artist_key
+        ON CONFLICT (artist_key) DO UPDATE
+        SET play_count = rollup_artist.play_count + EXCLUDED.play_count,
+            total_duration_ms = rollup_artist.total_duration_ms + EXCLUDED.total_duration_ms;
+    """)
+    cur.execute(f"""
+        INSERT INTO rollup_song_hour (song_key, hour_of_day, play_count, total_duration_ms)
+        SELECT s.song_key, st.hour_of_day, SUM(st.play_count), SUM(st.song_duration_ms)
+        FROM {stage_table} st
+        JOIN dim_song s ON s.song_id = st.song_id
+        GROUP BY s.song_key, st.hour_of_day
+        ON CONFLICT (song_key, hour_of_day) DO UPDATE
+        SET play_count = rollup_song_hour.play_count + EXCLUDED.play_count,
+            total_duration_ms = rollup_song_hour.total_duration_ms + EXCLUDED.total_duration_ms;
+    """)
+
+
+def rebuild_rollups(cur):
+    """
+    Recompute every rollup from fact_play_summary (initial backfill or repair).
+    Only attached partitions are read: restore archived months first
+    (python -m etl.utils.archive restore) to keep their plays in the totals.
+    """
+    cur.execute("TRUNCATE rollup_hour_dow, rollup_artist, rollup_song_hour;")
+    cur.execute("""
+        INSERT INTO rollup_hour_dow (day_of_week, hour_of_day, play_count, total_duration_ms)
+        SELECT COALESCE(d.day_of_week, 'Unknown'), d.hour_of_day, SUM(f.play_count), SUM(f.total_duration_ms)
+        FROM fact_play_summary f
+        JOIN dim_date d ON f.date_key = d.date_key
+        GROUP BY 1, d.hour_of_day;
+    """)
+    cur.execute("""
+        INSERT INTO rollup_artist (artist_key, play_count, total_duration_ms)
+        SELECT artist_key, SUM(play_count), SUM(total_duration_ms)
+        FROM fact_play_summary
+        GROUP BY artist_key;
+    """)
+    cur.execute("""
+        INSERT INTO rollup_song_hour (song_key, hour_of_day, play_count, total_duration_ms)
+        SELECT f.song_key, d.hour_of_day, SUM(f.play_count), SUM(f.total_duration_ms)
+        FROM fact_play_summary f
+        JOIN dim_date d ON f.date_key = d.date_key
+        GROUP BY f.song_key, d.hour_of_day;
+    """)
+
+
+if __name__ == "__main__":
+    from etl.utils.db import cursor
+
+    logging.basicConfig(level=logging.INFO)
+    with cursor() as cur:
+        rebuild_rollups(cur)
+    logger.info("Rebuilt dashboard rollups from fact_play_summary")
@@ -1,16 +1,20 @@
 import requests
-from config  import REFRESH_TOKEN, SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET
+from config  import REFRESH_TOKEN, SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, SPOTIFY_TOKEN_URL
 
-TOKEN_URL = "https://accounts.spotify.com/api/token"
+TOKEN_URL = SPOTIFY_TOKEN_URL
 
-def refresh_access_token():
+def request_access_token(session=None, refresh_token=REFRESH_TOKEN, token_url=TOKEN_URL, timeout=None) -> dict:
+    """Exchange the refresh token; returns the full token response (access_token, expires_in, ...)."""
     payload = {
         "grant_type": "refresh_token",
-        "refresh_token": REFRESH_TOKEN,
+        "refresh_token": refresh_token,
         "client_id": SPOTIFY_CLIENT_ID,
         "client_secret": SPOTIFY_CLIENT_SECRET
     }
-    r = requests.post(TOKEN_URL, data=payload)
+    r = (session or requests).post(token_url, data=payload, timeout=timeout)
     r.raise_for_status()
-    token_info = r.json()
-    return token_info["access_token"]
\ No newline at end of file
+    return r.json()
+
+def refresh_access_token():
+    token_info = request_access_token()
+    return token_info["access_token"]
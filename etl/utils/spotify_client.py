@@ -0,0 +1,169 @@
+import logging
+import threading
+import time
+from collections import Counter, deque
+from functools import lru_cache
+import requests
+from requests.adapters import HTTPAdapter
+from config import (
+    REFRESH_TOKEN,
+    SPOTIFY_API_BASE,
+    SPOTIFY_TOKEN_URL,
+    SPOTIFY_MAX_RETRIES,
+    SPOTIFY_MAX_BACKOFF_S,
+    SPOTIFY_CONNECT_TIMEOUT_S,
+    SPOTIFY_READ_TIMEOUT_S,
+    SPOTIFY_LATENCY_HISTORY,
+)
+from etl.utils.spotify_auth import request_access_token
+from etl.utils.rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Connection failures and timeouts are retried with the same backoff as RETRY_STATUSES
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout)
+
+
+class SpotifyClient:
+    """
+    Thin Spotify Web API client: one pooled requests.Session, an access token
+    cached until shortly before expires_in, (connect, read) timeouts, retries
+    with backoff on 429/5xx and connection errors (honouring Retry-After),
+    request counts by status and the latencies of recent requests. Clients for
+    different accounts can share one rate_limiter so that together they stay
+    under the app's request budget.
+    """
+
+    def __init__(
+        self,
+        refresh_token: str = REFRESH_TOKEN,
+        api_base: str = SPOTIFY_API_BASE,
+        token_url: str = SPOTIFY_TOKEN_URL,
+        max_retries: int = SPOTIFY_MAX_RETRIES,
+        max_backoff_s: float = SPOTIFY_MAX_BACKOFF_S,
+        pool_size: int = 10,
+        expiry_margin_s: int = 60,
+        rate_limiter: TokenBucket | None = None,
+        timeout: tuple[float, float] = (SPOTIFY_CONNECT_TIMEOUT_S, SPOTIFY_READ_TIMEOUT_S),
+        latency_history: int = SPOTIFY_LATENCY_HISTORY,
+    ):
+        self.refresh_token = refresh_token
+        self.api_base = api_base.rstrip("/")
+        self.token_url = token_url
+        self.max_retries = max_retries
+        self.max_backoff_s = max_backoff_s
+        self.expiry_margin_s = expiry_margin_s
+        self.rate_limiter = rate_limiter
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._token = None
+        self._token_expires_at = 0.0
+        self._lock = threading.Lock()
+        # Bounded, so a long-lived pooled client does not grow without limit
+        self.latencies = deque(maxlen=latency_history)  # (method, path, status, seconds)
+        self.status_counts = Counter()  # every request since creation; status None for connection errors
+
+    def access_token(self) -> str:
+        with self._lock:
+            if self._token is None or time.monotonic() >= self._token_expires_at:
+                started = time.perf_counter()
+                token_info = request_access_token(self.session, self.refresh_token, self.token_url, self.timeout)
+                self._record("POST", self.token_url, 200, time.perf_counter() - started)
+                self._token = token_info["access_token"]
+                expires_in = int(token_info.get("expires_in", 3600))
+                self._token_expires_at = time.monotonic() + max(expires_in - self.expiry_margin_s, 0)
+                logger.info(f"Spotify access token refreshed, valid for {expires_in}s")
+            return self._token
+
+    def invalidate_token(self):
+        with self._lock:
+            self._token = None
+
+    def _record(self, method, url, status, seconds):
+        self.latencies.append((method, url.split("?")[0], status, seconds))
+        self.status_counts[status] += 1
+        logger.debug(f"{method} {url} -> {status} in {seconds * 1000:.1f}ms")
+
+    def _backoff(self, response, attempt) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.max_backoff_s)
+            except ValueError:
+                pass
+        return min(2 ** attempt * 0.5, self.max_backoff_s)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        if not url.startswith("http"):
+            url = f"{self.api_base}/{url.lstrip('/')}"
+
+        extra_headers = kwargs.pop("headers", {})
+        kwargs.setdefault("timeout", self.timeout)
+        refreshed = False
+        attempt = 0
+        while True:
+            headers = {"Authorization": f"Bearer {self.access_token()}", **extra_headers}
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, headers=headers, **kwargs)
+            except RETRY_ERRORS as e:
+                self._record(method, url, None, time.perf_counter() - started)
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(None, attempt)
+                logger.warning(f"{method} {url} failed ({type(e).__name__}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self._record(method, url, response.status_code, time.perf_counter() - started)
+
+            if response.status_code == 401 and not refreshed:
+                # Token revoked or expired early: refresh once and retry
+                self.invalidate_token()
+                refreshed = True
+                continue
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                delay = self._backoff(response, attempt)
+                if response.status_code == 429 and self.rate_limiter is not None:
+                    # The budget is per app, not per account: hold everyone back
+                    self.rate_limiter.pause(delay)
+                logger.warning(f"{method} {url} returned {response.status_code}; retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            response.raise_for_status()
+            return response
+
+    def get(self, url: str, params: dict | None = None) -> dict:
+        return self.request("GET", url, params=params).json()
+
+    @property
+    def request_count(self) -> int:
+        return sum(self.status_counts.values())
+
+    def latency_summary(self) -> dict:
+        """Request count since creation; latencies over the recent requests kept."""
+        if not self.latencies:
+            return {"requests": self.request_count}
+        seconds = sorted(s for _, _, _, s in self.latencies)
+        return {
+            "requests": self.request_count,
+            "mean_ms": sum(seconds) / len(seconds) * 1000,
+            "p95_ms": seconds[int(0.95 * (len(seconds) - 1))] * 1000,
+            "max_ms": seconds[-1] * 1000,
+        }
+
+
+@lru_cache(maxsize=None)
+def get_spotify_client() -> SpotifyClient:
+    """Process-wide client for the configured account."""
+    return SpotifyClient()
@@ -0,0 +1,54 @@
+import json
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+class TrackCache:
+    """
+    Persistent SQLite cache of enriched track metadata keyed by song_id, so
+    each track is fetched from the API only once per cache file.
+    """
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS tracks (
+                song_id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                fetched_at TEXT NOT NULL
+            )
+        """)
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, song_ids: list[str]) -> dict[str, dict]:
+        found = {}
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(song_ids), 500):
+            batch = song_ids[start:start + 500]
+            placeholders = ", ".join("?" for _ in batch)
+            rows = self.conn.execute(
+                f"SELECT song_id, payload FROM tracks WHERE song_id IN ({placeholders})", batch
+            ).fetchall()
+            found.update({song_id: json.loads(payload) for song_id, payload in rows})
+        self.hits += len(found)
+        self.misses += len(song_ids) - len(found)
+        return found
+
+    def put_many(self, tracks: dict[str, dict]):
+        now = datetime.now(timezone.utc).isoformat()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO tracks (song_id, payload, fetched_at) VALUES (?, ?, ?)",
+            [(song_id, json.dumps(payload), now) for song_id, payload in tracks.items()],
+        )
+        self.conn.commit()
+
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def close(self):
+        self.conn.close()
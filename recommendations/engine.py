@@ -0,0 +1,163 @@
+import logging
+import threading
+import time
+from pathlib import Path
+import numpy as np
+from config import FEATURE_CACHE_DIR, RECOMMENDER_POLL_S
+from etl.utils.db import connection
+from recommendations.feature_store import (
+    open_feature_store, build_feature_store, publish_feature_store, current_feature_store,
+)
+from recommendations.recommendation import generate_recommendations
+from recommendations.similarity import SimilarityEngine
+from recommendations.taste_profile import DEFAULT_PROFILE, current_profile, profile_version
+from recommendations.track_index import load_track_index
+
+logger = logging.getLogger(__name__)
+
+
+class Recommender:
+    """
+    Everything needed to answer a top-N request from memory: the feature
+    store, its track index, the normalized similarity engine and the taste
+    profile. Instances are never mutated after construction; a reload builds
+    a new one and swaps the reference.
+    """
+
+    def __init__(self, store, index, engine: SimilarityEngine, vector: np.ndarray, exclude: np.ndarray,
+                 profile_version=None):
+        self.store = store
+        self.index = index
+        self.engine = engine
+        self.vector = vector
+        self.exclude = exclude
+        self.profile_version = profile_version
+
+    @classmethod
+    def load_store(cls, store_path: Path) -> "Recommender":
+        """Store, index and engine without a profile; with_profile() adds one."""
+        started = time.perf_counter()
+        store = open_feature_store(store_path)
+        index = load_track_index(store)
+        engine = SimilarityEngine(store.normalized, normalized=True)
+        logger.info(f"Loaded feature store {store.path.name} in {time.perf_counter() - started:.2f}s")
+        return cls(store, index, engine, None, None)
+
+    @classmethod
+    def load(cls, store_path: Path, profile_id: str = DEFAULT_PROFILE) -> "Recommender":
+        return cls.load_store(store_path).with_profile(profile_id)
+
+    def with_profile(self, profile_id: str = DEFAULT_PROFILE) -> "Recommender":
+        """A copy sharing the store and engine, with the taste profile re-read from Postgres."""
+        with connection() as conn, conn.cursor() as cur:
+            version = profile_version(cur, profile_id)
+            vector, exclude = current_profile(cur, self.store, self.index, profile_id)
+        return Recommender(self.store, self.index, self.engine, vector, exclude, version)
+
+    def recommend(self, top_n: int = 15, vector: np.ndarray | None = None):
+        """Top-N (track_name, artist_name) pairs for the profile, or for an explicit vector."""
+        if vector is None:
+            vector = self.vector
+        return generate_recommendations(
+            np.reshape(vector, (1, -1)), self.exclude, self.engine, self.index, self.store.meta, top_n
+        )
+
+
+class RecommenderHolder:
+    """
+    Holds the live feature store and the per-listener Recommenders built on
+    it, and swaps them when the batch job publishes a new feature store
+    (CURRENT pointer) or a taste profile is updated. Profiles are loaded on
+    first request, so the service starts before any listener has plays.
+    Swaps replace references under a lock, so a request sees either the old
+    or the new index.
+    """
+
+    def __init__(self, cache_dir: str = FEATURE_CACHE_DIR, profile_id: str = DEFAULT_PROFILE,
+                 poll_s: float = RECOMMENDER_POLL_S):
+        self.cache_dir = cache_dir
+        self.profile_id = profile_id
+        self.poll_s = poll_s
+        self._reload_lock = threading.Lock()
+        # Recommenders per listener, built on demand from the current store
+        self._profiles_lock = threading.Lock()
+        self._profiles = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+        path = current_feature_store(cache_dir)
+        if path is None:
+            path = build_feature_store(cache_dir=cache_dir)
+            publish_feature_store(path, cache_dir)
+        self.base = Recommender.load_store(path)
+
+    @property
+    def current(self) -> Recommender:
+        """The recommender of the default listener."""
+        return self.for_profile(self.profile_id)
+
+    def for_profile(self, profile_id: str) -> Recommender:
+        """
+        The recommender for a listener, sharing the current store and engine.
+        Raises ValueError when the listener has no profile and no plays.
+        """
+        base = self.base
+        with self._profiles_lock:
+            cached = self._profiles.get(profile_id)
+        if cached is not None and cached.store is base.store:
+            return cached
+
+        # Read the profile outside the lock; a concurrent first request builds the same one
+        recommender = base.with_profile(profile_id)
+        with self._profiles_lock:
+            if self.base is base:
+                self._profiles[profile_id] = recommender
+        return recommender
+
+    def reload(self) -> bool:
+        """Swap in a new store or drop profiles that were updated. Returns True on swap."""
+        with self._reload_lock:
+            path = current_feature_store(self.cache_dir)
+            if path is not None and path.name != self.base.store.path.name:
+                base = Recommender.load_store(path)
+                with self._profiles_lock:
+                    self.base = base
+                    self._profiles = {}
+                logger.info(f"Swapped to feature store {path.name}")
+                return True
+
+            with self._profiles_lock:
+                cached = list(self._profiles.items())
+            stale = []
+            with connection() as conn, conn.cursor() as cur:
+                # Listeners are rebuilt on their next request once their profile moved
+                for profile_id, recommender in cached:
+                    if profile_version(cur, profile_id) != recommender.profile_version:
+                        stale.append((profile_id, recommender))
+            with self._profiles_lock:
+                for profile_id, recommender in stale:
+                    if self._profiles.get(profile_id) is recommender:
+                        del self._profiles[profile_id]
+            for profile_id, recommender in stale:
+                logger.info(f"Taste profile {profile_id} changed since {recommender.profile_version}")
+            return bool(stale)
+
+    def _poll(self):
+        while not self._stop.wait(self.poll_s):
+            try:
+                self.reload()
+            except Exception as e:
+                # Keep serving the current index; try again next poll
+                logger.warning(f"Recommender reload failed: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._poll, name="recommender-reload", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+from pyarrow import feather
+from sklearn.preprocessing import MinMaxScaler
+from config import SPOTIFY_FEATURES_CSV, FEATURE_CACHE_DIR
+from recommendations.similarity import normalize_rows
+
+META_COLUMNS = ["track_id", "track_name", "artist_name"]
+CATEGORICAL = ["genre", "key"]
+DROP_COLUMNS = ["popularity", "mode", "time_signature"]
+NORMALIZED_FILE = "features_normalized.npy"
+
+
+class FeatureStore(NamedTuple):
+    matrix: np.ndarray        # float32 (n_tracks, n_features), memory-mapped when loaded from cache
+    meta: pd.DataFrame        # META_COLUMNS, row-aligned with matrix
+    columns: list[str]        # feature names, column-aligned with matrix
+    path: Path                # cache directory this store was loaded from
+    normalized: np.ndarray    # matrix with L2-normalized rows, memory-mapped like matrix
+
+
+def csv_sha256(csv_path: str, cache_dir: str = FEATURE_CACHE_DIR) -> str:
+    """
+    Content hash of the features CSV. The hash is remembered per
+    (path, size, mtime) so an unchanged file is not re-read on every start.
+    """
+    stat = os.stat(csv_path)
+    index_path = Path(cache_dir) / "csv_hashes.json"
+    index = json.loads(index_path.read_text()) if index_path.exists() else {}
+    stamp = f"{os.path.abspath(csv_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    if stamp in index:
+        return index[stamp]
+
+    digest = hashlib.sha256()
+    with open(csv_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    index[stamp] = digest.hexdigest()
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    # Concurrent starts must never read a half-written index
+    fd, tmp = tempfile.mkstemp(dir=index_path.parent, prefix=".csv_hashes-")
+    with os.fdopen(fd, "w") as f:
+        f.write(json.dumps(index))
+    os.replace(tmp, index_path)
+    return index[stamp]
+
+
+def build_features(csv_path: str):
+    """One-hot encode categoricals, min-max scale numericals and drop irrelevant columns."""
+    df = pd.read_csv(csv_path)
+    df = pd.get_dummies(df, columns=CATEGORICAL)
+
+    scaler = MinMaxScaler()
+    numerical = df.select_dtypes(np.number).columns.tolist()
+    df[numerical] = scaler.fit_transform(df[numerical])
+    df = df.drop(columns=[c for c in DROP_COLUMNS if c in df.columns])
+
+    columns = [c for c in df.columns if c not in META_COLUMNS]
+    matrix = np.ascontiguousarray(df[columns].to_numpy(dtype=np.float32))
+    meta = df[META_COLUMNS].reset_index(drop=True)
+    scaler_params = {
+        "columns": numerical,
+        "data_min": scaler.data_min_.tolist(),
+        "data_max": scaler.data_max_.tolist(),
+    }
+    return matrix, meta, columns, scaler_params
+
+
+def build_feature_store(csv_path: str = SPOTIFY_FEATURES_CSV, cache_dir: str = FEATURE_CACHE_DIR) -> Path:
+    """
+    Write features.npy, its row-normalized copy, meta.arrow and
+    feature_store.json under <cache_dir>/<csv sha256>/. The directory is
+    assembled in a temp location and renamed into place, so readers never
+    see a half-written store.
+    """
+    digest = csv_sha256(csv_path, cache_dir)
+    target = Path(cache_dir) / digest
+    if target.exists():
+        return target
+
+    matrix, meta, columns, scaler_params = build_features(csv_path)
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(dir=cache_dir, prefix=".build-"))
+    try:
+        np.save(tmp / "features.npy", matrix)
+        np.save(tmp / NORMALIZED_FILE, normalize_rows(matrix))
+        meta.to_feather(tmp / "meta.arrow", compression="uncompressed")
+        (tmp / "feature_store.json").write_text(json.dumps({
+            "csv_sha256": digest,
+            "rows": int(matrix.shape[0]),
+            "columns": columns,
+            "scaler": scaler_params,
+        }))
+        os.replace(tmp, target)
+    except OSError:
+        # Another process published the same store first
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not target.exists():
+            raise
+    return target
+
+
+def open_feature_store(path: Path) -> FeatureStore:
+    """Memory-map a published store; pages are shared between processes."""
+    path = Path(path)
+    info = json.loads((path / "feature_store.json").read_text())
+    matrix = np.load(path / "features.npy", mmap_mode="r")
+    if not (path / NORMALIZED_FILE).exists():
+        # Stores built before the normalized copy existed get it once
+        fd, tmp = tempfile.mkstemp(dir=path, prefix=".normalized-", suffix=".npy")
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, normalize_rows(matrix))
+        os.replace(tmp, path / NORMALIZED_FILE)
+    normalized = np.load(path / NORMALIZED_FILE, mmap_mode="r")
+    meta = feather.read_table(path / "meta.arrow", memory_map=True).to_pandas()
+    return FeatureStore(matrix, meta, info["columns"], path, normalized)
+
+
+def publish_feature_store(path: Path, cache_dir: str = FEATURE_CACHE_DIR) -> Path:
+    """
+    Point <cache_dir>/CURRENT at a built store. The pointer is replaced with
+    a rename, so a serving process polling it sees either the old or the new
+    store, never a partial write.
+    """
+    pointer = Path(cache_dir) / "CURRENT"
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, prefix=".current-")
+    with os.fdopen(fd, "w") as f:
+        f.write(Path(path).name)
+    os.replace(tmp, pointer)
+    return pointer
+
+
+def current_feature_store(cache_dir: str = FEATURE_CACHE_DIR) -> Path | None:
+    """The published store directory, or None if nothing was published yet."""
+    pointer = Path(cache_dir) / "CURRENT"
+    if not pointer.exists():
+        return None
+    return Path(cache_dir) / pointer.read_text().strip()
+
+
+def load_feature_store(csv_path: str = SPOTIFY_FEATURES_CSV, cache_dir: str = FEATURE_CACHE_DIR) -> FeatureStore:
+    """Open the cached store for this CSV's content, building it on first use."""
+    return open_feature_store(build_feature_store(csv_path, cache_dir))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the cached recommender feature matrix")
+    parser.add_argument("--csv", default=SPOTIFY_FEATURES_CSV)
+    parser.add_argument("--cache-dir", default=FEATURE_CACHE_DIR)
+    parser.add_argument("--no-publish", action="store_true", help="build without repointing CURRENT")
+    args = parser.parse_args()
+
+    path = build_feature_store(args.csv, args.cache_dir)
+    if not args.no_publish:
+        from recommendations.track_index import load_track_index
+
+        # Build the index before publishing so a serving swap does not have to
+        load_track_index(open_feature_store(path))
+        publish_feature_store(path, args.cache_dir)
+    print(path)
@@ -1,171 +1,138 @@
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import MinMaxScaler
 from datetime import datetime
-from scipy.spatial.distance import cdist
-import psycopg2
-from datetime import datetime
-from config import POSTGRES_DB, POSTGRES_USER, POSTGRES_PASSWORD
+from config import SPOTIFY_FEATURES_CSV
+from etl.utils.db import connection, insert_values
+from etl.utils.accounts import DEFAULT_ACCOUNT, DEFAULT_USER_KEY
+from recommendations.feature_store import load_feature_store
+from recommendations.similarity import SimilarityEngine
+from recommendations.track_index import TrackIndex
+from config import TASTE_DECAY_TAU_S, PLAY_HISTORY_DAYS
+from etl.utils.date_dim import LOCAL_TZ
+from etl.utils.partitions import history_cutoff_key
 
 # Load and preprocess features
 def load_spotify_features(path: str) -> pd.DataFrame:
-    """Load Spotify features, one-hot encode categoricals, normalize numericals, and drop irrelevant columns."""
-    df = pd.read_csv(path)
-
-    # One-hot encode categorical features
-    categorical = ["genre", "key"]
-    df = pd.get_dummies(df, columns=categorical)
-
-    # Normalize numerical features
-    scaler = MinMaxScaler()
-    numerical = df.select_dtypes(np.number).columns.tolist()
-    df[numerical] = scaler.fit_transform(df[numerical])
-
-    # Drop irrelevant columns if present
-    drop_cols = ["popularity", "mode", "time_signature"]
-    df = df.drop(columns=[c for c in drop_cols if c in df.columns])
-
-    return df
+    """
+    Load Spotify features, one-hot encode categoricals, normalize numericals, and drop irrelevant columns.
+    The normalized matrix is cached per CSV content hash (see feature_store) and memory-mapped on later runs.
+    """
+    store = load_feature_store(path)
+    features = pd.DataFrame(store.matrix, columns=store.columns, copy=False)
+    return pd.concat([store.meta, features], axis=1)
 
 # Database fetch
-def get_recently_played() -> pd.DataFrame:
-    """Fetch recently played songs from Postgres fact + dimension tables."""
-    conn = psycopg2.connect(
-        dbname=POSTGRES_DB,
-        user=POSTGRES_USER,
-        password=POSTGRES_PASSWORD,
-        host="localhost",
-        port="15432"
-    )
+def get_recently_played(account_id: str = DEFAULT_ACCOUNT) -> pd.DataFrame:
+    """
+    Fetch a listener's recently played songs from Postgres fact + dimension tables.
+    Only the last PLAY_HISTORY_DAYS are read (decay makes older plays negligible),
+    which lets Postgres skip older monthly partitions.
+    """
     query = """
         SELECT s.song_id, s.song_title, a.artist_name, a.artist_id, 
                s.song_duration_ms, fp.played_at
         FROM fact_play_summary fp
+        JOIN dim_user u   ON fp.user_key = u.user_key
         JOIN dim_song s   ON fp.song_key = s.song_key
         JOIN dim_artist a ON fp.artist_key = a.artist_key
+        WHERE u.account_id = %s
+          AND (%s::BIGINT IS NULL OR fp.date_key >= %s)
     """
-    df = pd.read_sql(query, conn)
-    conn.close()
-    return df
+    cutoff = history_cutoff_key(PLAY_HISTORY_DAYS, LOCAL_TZ)
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(query, (account_id, cutoff, cutoff))
+        columns = [c.name for c in cur.description]
+        return pd.DataFrame(cur.fetchall(), columns=columns)
 
 # Playlist construction
-def generate_playlist_df(recent_df: pd.DataFrame, spotify_features: pd.DataFrame) -> pd.DataFrame:
-    """Merge recent plays with Spotify features by song + artist."""
-    playlist_df = recent_df.merge(
-        spotify_features,
-        left_on=["song_title", "artist_name"],
-        right_on=["track_name", "artist_name"],
-        how="inner",
-    )
+def generate_playlist_df(recent_df: pd.DataFrame, index: TrackIndex) -> pd.DataFrame:
+    """
+    Attach feature-matrix rows to recent plays, matching on Spotify ID first
+    and normalized title + artist second. One output row per matched feature row.
+    """
+    play_pos, rows = index.match(recent_df["song_id"], recent_df["song_title"], recent_df["artist_name"])
+    playlist_df = recent_df.iloc[play_pos][["song_id", "song_title", "artist_name", "played_at"]].reset_index(drop=True)
+    playlist_df["row"] = rows
+    # A play matching several feature rows (same track under several genres) still counts once
+    playlist_df["row_share"] = 1.0 / np.bincount(play_pos)[play_pos] if len(play_pos) else []
 
     playlist_df["played_at"] = pd.to_datetime(playlist_df["played_at"], utc=True)
     return playlist_df.sort_values("played_at", ascending=False)
 
 
 # Playlist vector
-def generate_playlist_vector(playlist_df: pd.DataFrame, spotify_features: pd.DataFrame):
-    """Compute recency-weighted playlist vector and candidate pool of non-playlist songs."""
+def generate_playlist_vector(playlist_df: pd.DataFrame, matrix: np.ndarray, index: TrackIndex):
+    """Compute recency-weighted playlist vector and a mask excluding already played songs."""
     now = pd.Timestamp.now(tz="UTC")
 
     # Exponential decay weights by recency
-    playlist_df["weight"] = np.exp(
-        -(now - playlist_df["played_at"]).dt.total_seconds() / (3600 * 24)
-    )
-
-    # Match songs with features
-    playlist_features = spotify_features.merge(
-        playlist_df[["song_title", "artist_name", "weight"]],
-        left_on=["track_name", "artist_name"],
-        right_on=["song_title", "artist_name"],
-        how="inner",
-    )
-
-    if playlist_features.empty or playlist_features["weight"].sum() == 0:
+    weights = np.exp(
+        -(now - playlist_df["played_at"]).dt.total_seconds() / TASTE_DECAY_TAU_S
+    ).to_numpy() * playlist_df["row_share"].to_numpy()
+
+    if playlist_df.empty or weights.sum() == 0:
         raise ValueError("Playlist is empty or weights could not be computed.")
 
-    # Extract weighted feature matrix
-    weights = playlist_features["weight"].values
-    feature_matrix = playlist_features.drop(
-        columns=["track_id", "track_name", "artist_name", "song_title", "weight"]
-    ).values
-
-    # Weighted playlist vector
-    weighted_vector = np.dot(weights.T, feature_matrix) / weights.sum()
-
-    # Candidate songs = all features not in playlist
-    nonplaylist_df = (
-        spotify_features.merge(
-            playlist_df[["song_title", "artist_name"]],
-            left_on=["track_name", "artist_name"],
-            right_on=["song_title", "artist_name"],
-            how="left",
-            indicator=True,
-        )
-        .query('_merge == "left_only"')
-        .drop(columns=["_merge", "song_title"])
-    )
-
-    return weighted_vector, nonplaylist_df
+    # Weighted playlist vector, gathered straight from the matrix rows
+    rows = playlist_df["row"].to_numpy()
+    weighted_vector = weights @ matrix[rows] / weights.sum()
 
-# Recommendations
-def generate_recommendations(playlist_vector: np.ndarray, nonplaylist_df: pd.DataFrame, top_n: int = 15):
-    """Compute cosine similarity and return top-N recommended songs."""
-    nonplaylist_features = nonplaylist_df.drop(
-        columns=["track_id", "track_name", "artist_name"]
-    ).values
-    nonplaylist_meta = nonplaylist_df[["track_name", "artist_name"]].values
+    return weighted_vector, index.mask(rows)
 
-    # Compute cosine distance
-    distances = cdist(nonplaylist_features, playlist_vector, metric="cosine").flatten()
-    rec_indices = distances.argsort()[:top_n]
+# Recommendations
+def generate_recommendations(playlist_vector: np.ndarray, exclude: np.ndarray, engine: SimilarityEngine,
+                             index: TrackIndex, meta: pd.DataFrame, top_n: int = 15):
+    """
+    Compute cosine similarity and return top-N recommended songs.
+    playlist_vector may be a single vector or a (q, d) batch; a batch returns one list per vector.
+    """
+    # Over-fetch so duplicate rows of the same song can be dropped
+    rec_indices, _ = engine.top_k(playlist_vector, top_n * 4, exclude=exclude)
+    track_meta = meta[["track_name", "artist_name"]].values
+    recommendations = [track_meta[index.unique_rows(row, top_n)] for row in rec_indices]
 
-    return nonplaylist_meta[rec_indices]
+    if np.ndim(playlist_vector) == 2 and len(playlist_vector) > 1:
+        return recommendations
+    return recommendations[0]
 
-def save_recommendations(recommendations, conn):
+def save_recommendations(recommendations, conn, user_key: int = DEFAULT_USER_KEY):
     now = datetime.utcnow()
     week = now.isocalendar()[1]
     year = now.year
-    saved, skipped = 0, 0
+    rows = [(user_key, track, artist, now, week, year, rank)
+            for rank, (track, artist) in enumerate(recommendations, start=1)]
 
+    # One multi-row INSERT instead of a round trip per recommendation
     with conn.cursor() as cur:
-        for rank, (track, artist) in enumerate(recommendations, start=1):
-            cur.execute("""
-                INSERT INTO recommendation_list (
-                    track_name, artist_name, recommended_at,
-                    week_of_year, year, rank
-                )
-                VALUES (%s, %s, %s, %s, %s, %s)
-                ON CONFLICT (track_name, artist_name, week_of_year, year)
-                DO NOTHING
-                RETURNING rec_id;
-            """, (track, artist, now, week, year, rank))
-
-            if cur.fetchone():
-                saved += 1
-            else:
-                skipped += 1
+        inserted = insert_values(cur, """
+            INSERT INTO recommendation_list (
+                user_key, track_name, artist_name, recommended_at,
+                week_of_year, year, rank
+            )
+            VALUES %s
+            ON CONFLICT (user_key, track_name, artist_name, week_of_year, year)
+            DO NOTHING
+            RETURNING rec_id;
+        """, rows, fetch=True)
+    saved = len(inserted)
+    skipped = len(rows) - saved
 
     conn.commit()
     print(f"✅ Saved {saved} recommendations, skipped {skipped} (duplicates).")
 
 if __name__ == "__main__":
-    spotify_features = load_spotify_features("data/SpotifyFeatures.csv")
-    recent_df = get_recently_played()
-    playlist_df = generate_playlist_df(recent_df, spotify_features)
-    playlist_vector, nonplaylist_df = generate_playlist_vector(playlist_df, spotify_features)
+    from recommendations.engine import Recommender
+    from recommendations.feature_store import build_feature_store, publish_feature_store
 
-    recommendations = generate_recommendations(playlist_vector.reshape(1, -1), nonplaylist_df)
+    path = build_feature_store(SPOTIFY_FEATURES_CSV)
+    recommender = Recommender.load(path)
+    # A running recommendation service hot-swaps to the published store
+    publish_feature_store(path)
+    recommendations = recommender.recommend()
 
     print("Recommended tracks:")
     for track, artist in recommendations:
         print(f"{track} — {artist}")
 
-    conn = psycopg2.connect(
-        dbname=POSTGRES_DB,
-        user=POSTGRES_USER,
-        password=POSTGRES_PASSWORD,
-        host="localhost",
-        port="15432"
-    )
-    save_recommendations(recommendations, conn)
-    conn.close()
\ No newline at end of file
+    with connection() as conn:
+        save_recommendations(recommendations, conn)
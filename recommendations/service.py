@@ -0,0 +1,58 @@
+"""
+Recommendation service. Keeps the feature matrix, track index and taste
+profile in memory and hot-swaps them when a new store or profile is published.
+
+    python -m recommendations.service
+    curl "localhost:8000/recommendations?n=15"
+    curl "localhost:8000/recommendations?n=15&account=<account_id>"
+"""
+import logging
+import time
+from flask import Flask, jsonify, request
+from config import RECOMMENDER_HOST, RECOMMENDER_PORT, RECOMMENDER_TOP_N
+from recommendations.engine import RecommenderHolder
+
+logger = logging.getLogger(__name__)
+
+
+def create_app(holder: RecommenderHolder | None = None) -> Flask:
+    app = Flask(__name__)
+    holder = holder or RecommenderHolder().start()
+
+    @app.get("/recommendations")
+    def recommendations():
+        top_n = request.args.get("n", default=RECOMMENDER_TOP_N, type=int)
+        if top_n <= 0:
+            return jsonify({"error": "n must be a positive integer"}), 400
+        account = request.args.get("account")
+        started = time.perf_counter()
+        try:
+            recommender = holder.for_profile(account) if account else holder.current
+        except ValueError as e:
+            # No profile and no plays yet for this listener
+            return jsonify({"error": str(e)}), 404
+        recs = recommender.recommend(top_n)
+        return jsonify({
+            "feature_store": recommender.store.path.name,
+            "profile_version": str(recommender.profile_version) if recommender.profile_version else None,
+            "took_ms": round((time.perf_counter() - started) * 1000, 3),
+            "recommendations": [
+                {"rank": rank, "track_name": track, "artist_name": artist}
+                for rank, (track, artist) in enumerate(recs, start=1)
+            ],
+        })
+
+    @app.post("/reload")
+    def reload():
+        return jsonify({"swapped": holder.reload(), "feature_store": holder.base.store.path.name})
+
+    @app.get("/healthz")
+    def healthz():
+        return jsonify({"status": "ok", "feature_store": holder.base.store.path.name})
+
+    return app
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    create_app().run(host=RECOMMENDER_HOST, port=RECOMMENDER_PORT, threaded=True)
@@ -0,0 +1,103 @@
+import numpy as np
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize rows as float32; all-zero rows stay zero."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _top_k_rows(scores: np.ndarray, k: int):
+    """Indices and values of the k largest entries per row, sorted descending."""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+
+class SimilarityEngine:
+    """
+    Exact cosine top-k over a fixed candidate matrix. Candidates are
+    normalized once (or passed in normalized, e.g. the feature store's
+    memory-mapped copy, which is then used without copying); queries are
+    scored chunk by chunk with a matrix product and reduced with partial
+    selection, so memory stays at O(queries * chunk_size) and no full sort
+    is needed.
+    """
+
+    def __init__(self, matrix: np.ndarray, chunk_size: int = 65536, normalized: bool = False):
+        self.vectors = matrix if normalized else normalize_rows(matrix)
+        self.chunk_size = chunk_size
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    def top_k(self, queries: np.ndarray, k: int, exclude: np.ndarray | None = None):
+        """
+        Score one query (d,) or a batch (q, d) against all candidates.
+        exclude is a boolean mask over candidates, either shared (n,) or per
+        query (q, n). Returns (indices, similarities), each shaped (q, k).
+        """
+        queries = normalize_rows(np.atleast_2d(queries))
+        n = len(self)
+        best_idx, best_scores = [], []
+
+        for start in range(0, n, self.chunk_size):
+            stop = min(start + self.chunk_size, n)
+            scores = queries @ self.vectors[start:stop].T
+            if exclude is not None:
+                mask = exclude[..., start:stop]
+                scores = np.where(mask, -np.inf, scores)
+            idx, vals = _top_k_rows(scores, k)
+            best_idx.append(idx + start)
+            best_scores.append(vals)
+
+        candidates = np.concatenate(best_idx, axis=1)
+        candidate_scores = np.concatenate(best_scores, axis=1)
+        pos, scores = _top_k_rows(candidate_scores, k)
+        return np.take_along_axis(candidates, pos, axis=1), scores
+
+
+class IVFIndex:
+    """
+    Approximate inverted-file index for very large catalogs: candidates are
+    clustered with k-means on their normalized vectors and a query only
+    scores the members of its n_probe closest clusters.
+    """
+
+    def __init__(self, engine: SimilarityEngine, n_lists: int = 1024, n_probe: int = 16, seed: int = 0):
+        from sklearn.cluster import MiniBatchKMeans
+
+        self.engine = engine
+        self.n_probe = n_probe
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=seed, n_init=3, batch_size=8192)
+        labels = kmeans.fit_predict(engine.vectors)
+        self.centroids = normalize_rows(kmeans.cluster_centers_)
+        order = np.argsort(labels, kind="stable")
+        bounds = np.searchsorted(labels[order], np.arange(n_lists + 1))
+        self.lists = [order[bounds[i]:bounds[i + 1]] for i in range(n_lists)]
+
+    def top_k(self, queries: np.ndarray, k: int, exclude: np.ndarray | None = None):
+        queries = normalize_rows(np.atleast_2d(queries))
+        probes, _ = _top_k_rows(queries @ self.centroids.T, self.n_probe)
+        out_idx = np.full((queries.shape[0], k), -1, dtype=np.int64)
+        out_scores = np.full((queries.shape[0], k), -np.inf, dtype=np.float32)
+
+        for qi, query in enumerate(queries):
+            members = np.concatenate([self.lists[p] for p in probes[qi]])
+            if exclude is not None:
+                mask = exclude if exclude.ndim == 1 else exclude[qi]
+                members = members[~mask[members]]
+            if members.size == 0:
+                continue
+            scores = self.engine.vectors[members] @ query
+            idx, vals = _top_k_rows(scores[None, :], k)
+            out_idx[qi, :idx.shape[1]] = members[idx[0]]
+            out_scores[qi, :vals.shape[1]] = vals[0]
+        return out_idx, out_scores
@@ -0,0 +1,248 @@
+"""
+Incrementally maintained taste profile.
+
+With exponential decay w = exp(-(t - t_i) / tau) the profile can be kept as
+a running decayed sum S = sum(w_i * x_i) and weight W = sum(w_i), both valid
+"as of" a timestamp. Moving them to a later time multiplies both by the same
+factor, and new plays are simply added, so each update only touches the
+newly loaded plays. The playlist vector is S / W, which is what the full
+recomputation over history would give.
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pandas as pd
+from config import TASTE_DECAY_TAU_S, PLAY_HISTORY_DAYS
+from etl.utils.db import insert_values, transaction
+from etl.utils.accounts import DEFAULT_ACCOUNT, account_for_prefix
+
+logger = logging.getLogger(__name__)
+
+# One profile per listener, keyed by dim_user.account_id
+DEFAULT_PROFILE = DEFAULT_ACCOUNT
+
+
+def load_profile(cur, profile_id: str = DEFAULT_PROFILE) -> dict | None:
+    cur.execute("""
+        SELECT feature_hash, decayed_sum, weight_sum, as_of, tau_seconds
+        FROM taste_profile WHERE profile_id = %s;
+    """, (profile_id,))
+    row = cur.fetchone()
+    if row is None:
+        return None
+    feature_hash, decayed_sum, weight_sum, as_of, tau_seconds = row
+    return {
+        "feature_hash": feature_hash,
+        "decayed_sum": np.asarray(decayed_sum, dtype=np.float64),
+        "weight_sum": weight_sum,
+        "as_of": as_of,
+        "tau_seconds": tau_seconds,
+    }
+
+
+def profile_vector(profile: dict) -> np.ndarray:
+    if profile["weight_sum"] <= 0:
+        raise ValueError("Taste profile has no weight; rebuild it from history.")
+    return profile["decayed_sum"] / profile["weight_sum"]
+
+
+def played_track_ids(cur, profile_id: str = DEFAULT_PROFILE) -> list[str]:
+    cur.execute("SELECT track_id FROM taste_profile_track WHERE profile_id = %s;", (profile_id,))
+    return [r[0] for r in cur.fetchall()]
+
+
+def exclusion_mask(cur, store, index, profile_id: str = DEFAULT_PROFILE) -> np.ndarray:
+    rows = [index.by_id[t] for t in played_track_ids(cur, profile_id) if t in index.by_id]
+    rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    return index.mask(rows)
+
+
+def profile_version(cur, profile_id: str = DEFAULT_PROFILE):
+    """Changes whenever the stored profile is written; cheap to poll."""
+    cur.execute("SELECT updated_at FROM taste_profile WHERE profile_id = %s;", (profile_id,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def current_profile(cur, store, index, profile_id: str = DEFAULT_PROFILE):
+    """
+    Playlist vector and exclusion mask for a store. Uses the stored profile
+    when it matches the store, otherwise folds full history in memory.
+    """
+    profile = load_profile(cur, profile_id)
+    if not is_stale(profile, store, TASTE_DECAY_TAU_S):
+        return profile_vector(profile), exclusion_mask(cur, store, index, profile_id)
+
+    logger.info(f"Taste profile {profile_id} missing or stale, computing from full history")
+    profile, rows = fold_plays(None, load_play_history(cur, profile_id), store, index, TASTE_DECAY_TAU_S)
+    return profile_vector(profile), index.mask(rows)
+
+
+def fold_plays(profile: dict | None, plays: pd.DataFrame, store, index, tau_seconds: float):
+    """
+    Return the profile advanced by the given plays (song_id, song_title,
+    artist_name, played_at) and the feature rows they matched.
+    """
+    dims = store.matrix.shape[1]
+    if profile is None:
+        profile = {"decayed_sum": np.zeros(dims), "weight_sum": 0.0, "as_of": None, "tau_seconds": tau_seconds}
+
+    play_pos, rows = index.match(plays["song_id"], plays["song_title"], plays["artist_name"])
+    played_at = pd.to_datetime(plays["played_at"], utc=True)
+
+    as_of = profile["as_of"]
+    candidates = [pd.Timestamp(t) for t in (as_of, played_at.max() if len(played_at) else None)
+                  if t is not None and not pd.isna(t)]
+    if not candidates:
+        return profile, rows
+    new_as_of = max(candidates)
+
+    decayed_sum = profile["decayed_sum"]
+    weight_sum = profile["weight_sum"]
+    if as_of is not None:
+        factor = np.exp(-(new_as_of - pd.Timestamp(as_of)).total_seconds() / tau_seconds)
+        decayed_sum = decayed_sum * factor
+        weight_sum = weight_sum * factor
+
+    if rows.size:
+        age = (new_as_of - played_at.iloc[play_pos]).dt.total_seconds().to_numpy()
+        # A play matching several rows of the same track still counts once
+        shares = 1.0 / np.bincount(play_pos)[play_pos]
+        weights = np.exp(-age / tau_seconds) * shares
+        decayed_sum = decayed_sum + weights @ np.asarray(store.matrix[rows], dtype=np.float64)
+        weight_sum = weight_sum + weights.sum()
+
+    return {
+        **profile,
+        "decayed_sum": decayed_sum,
+        "weight_sum": float(weight_sum),
+        "as_of": new_as_of.to_pydatetime(),
+        "tau_seconds": tau_seconds,
+    }, rows
+
+
+def save_profile(cur, profile_id: str, profile: dict, feature_hash: str, track_ids):
+    cur.execute("""
+        INSERT INTO taste_profile (profile_id, feature_hash, decayed_sum, weight_sum, as_of, tau_seconds)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON CONFLICT (profile_id) DO UPDATE
+        SET feature_hash = EXCLUDED.feature_hash,
+            decayed_sum = EXCLUDED.decayed_sum,
+            weight_sum = EXCLUDED.weight_sum,
+            as_of = EXCLUDED.as_of,
+            tau_seconds = EXCLUDED.tau_seconds,
+            updated_at = NOW();
+    """, (profile_id, feature_hash, profile["decayed_sum"].tolist(), profile["weight_sum"],
+          profile["as_of"], profile["tau_seconds"]))
+    insert_values(cur, """
+        INSERT INTO taste_profile_track (profile_id, track_id) VALUES %s
+        ON CONFLICT DO NOTHING;
+    """, [(profile_id, t) for t in sorted(set(track_ids))])
+
+
+def is_stale(profile: dict | None, store, tau_seconds: float) -> bool:
+    """True when there is no profile or it was built for another feature store or decay."""
+    return profile is None or profile["feature_hash"] != store.path.name or profile["tau_seconds"] != tau_seconds
+
+
+def update_profile(cur, plays: pd.DataFrame, store, index, profile_id: str = DEFAULT_PROFILE,
+                   tau_seconds: float = TASTE_DECAY_TAU_S) -> dict:
+    """Fold newly loaded plays into the stored profile."""
+    feature_hash = store.path.name
+    profile = load_profile(cur, profile_id)
+    if profile is not None and is_stale(profile, store, tau_seconds):
+        raise ValueError(
+            f"Taste profile {profile_id} was built for another feature store or decay; rebuild it from history."
+        )
+
+    profile, rows = fold_plays(profile, plays, store, index, tau_seconds)
+    if profile["as_of"] is None:
+        return profile
+    save_profile(cur, profile_id, profile, feature_hash, store.meta["track_id"].to_numpy()[rows])
+    logger.info(f"Folded {len(plays)} plays ({rows.size} feature rows) into taste profile {profile_id}")
+    return profile
+
+
+def rebuild_profile(cur, history: pd.DataFrame, store, index, profile_id: str = DEFAULT_PROFILE,
+                    tau_seconds: float = TASTE_DECAY_TAU_S) -> dict:
+    """Recompute the profile from full play history (first run or feature store change)."""
+    cur.execute("DELETE FROM taste_profile_track WHERE profile_id = %s;", (profile_id,))
+    cur.execute("DELETE FROM taste_profile WHERE profile_id = %s;", (profile_id,))
+    return update_profile(cur, history, store, index, profile_id, tau_seconds)
+
+
+def load_play_history(cur, profile_id: str = DEFAULT_PROFILE) -> pd.DataFrame:
+    """
+    The listener's plays of the last PLAY_HISTORY_DAYS; only needed to
+    (re)build a profile from scratch. Read from the load ledger, which has
+    one row per applied play, the same plays update_profile_for_prefix folds
+    in; fact_play_summary only keeps one row per song and hour.
+    """
+    cutoff = None
+    if PLAY_HISTORY_DAYS > 0:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=PLAY_HISTORY_DAYS)
+    cur.execute("""
+        SELECT e.song_id, s.song_title, a.artist_name, e.played_at
+        FROM load_ledger_event e
+        JOIN dim_user u ON e.user_key = u.user_key
+        LEFT JOIN dim_song s ON s.song_id = e.song_id
+        LEFT JOIN LATERAL (
+            SELECT da.artist_name
+            FROM fact_play_summary fp
+            JOIN dim_artist da ON fp.artist_key = da.artist_key
+            WHERE fp.song_key = s.song_key AND fp.user_key = e.user_key
+            LIMIT 1
+        ) a ON TRUE
+        WHERE u.account_id = %s
+          AND (%s::TIMESTAMPTZ IS NULL OR e.played_at >= %s);
+    """, (profile_id, cutoff, cutoff))
+    return pd.DataFrame(cur.fetchall(), columns=["song_id", "song_title", "artist_name", "played_at"])
+
+
+def plays_for_prefix(cur, processed: pd.DataFrame, prefix: str) -> pd.DataFrame:
+    """
+    The plays a load of this prefix actually applied, according to the load
+    ledger; events applied earlier by another prefix are not folded twice.
+    """
+    cur.execute("SELECT song_id, played_at FROM load_ledger_event WHERE prefix = %s;", (prefix,))
+    applied = pd.DataFrame(cur.fetchall(), columns=["song_id", "played_at"])
+    if applied.empty:
+        return processed.iloc[0:0]
+    applied["played_at"] = pd.to_datetime(applied["played_at"], utc=True)
+    processed = processed.assign(played_at=pd.to_datetime(processed["played_at"], utc=True))
+    return processed.merge(applied, on=["song_id", "played_at"], how="inner")
+
+
+def update_profile_for_prefix(cur, processed: pd.DataFrame, prefix: str, store, index,
+                              profile_id: str = DEFAULT_PROFILE) -> dict | None:
+    """
+    Apply one loaded prefix to the profile, at most once. A missing or stale
+    profile is rebuilt from history instead, which already includes the prefix.
+    """
+    cur.execute("""
+        INSERT INTO taste_profile_prefix (profile_id, prefix) VALUES (%s, %s)
+        ON CONFLICT DO NOTHING RETURNING 1;
+    """, (profile_id, prefix))
+    if cur.fetchone() is None:
+        logger.info(f"Prefix {prefix} already folded into taste profile {profile_id}")
+        return None
+
+    if is_stale(load_profile(cur, profile_id), store, TASTE_DECAY_TAU_S):
+        logger.info(f"Rebuilding taste profile {profile_id} from full history")
+        return rebuild_profile(cur, load_play_history(cur, profile_id), store, index, profile_id)
+
+    plays = plays_for_prefix(cur, processed, prefix)
+    return update_profile(cur, plays, store, index, profile_id)
+
+
+def refresh_taste_profile(processed: pd.DataFrame, prefix: str, profile_id: str | None = None) -> dict | None:
+    """Fold a freshly loaded prefix into its listener's profile in one transaction."""
+    from recommendations.feature_store import load_feature_store
+    from recommendations.track_index import load_track_index
+
+    profile_id = profile_id or account_for_prefix(prefix)
+
+    store = load_feature_store()
+    index = load_track_index(store)
+    with transaction() as conn, conn.cursor() as cur:
+        return update_profile_for_prefix(cur, processed, prefix, store, index, profile_id)
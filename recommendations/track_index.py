@@ -0,0 +1,103 @@
+import os
+import pickle
+import re
+import tempfile
+import unicodedata
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# "(feat. X)", "[with X]" ...
+BRACKETED_FEATURING = re.compile(r"[\(\[]\s*(?:feat|ft|featuring|with)\b\.?\s+[^\)\]]*[\)\]]")
+# "- feat. X", "ft. X" ... up to the end of the title
+TRAILING_FEATURING = re.compile(r"\s-?\s*\b(?:feat|ft|featuring)\b\.?\s+.*$")
+# Separators between credited artists; only the primary artist is kept
+ARTIST_SEPARATORS = re.compile(r"\s*(?:,|&|\bx\b|\bfeat\b\.?|\bft\b\.?|\bfeaturing\b)\s*")
+APOSTROPHES = re.compile(r"['\u2019`]")
+NON_WORD = re.compile(r"[^\w\s]")
+SPACES = re.compile(r"\s+")
+
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return text.casefold()
+
+
+def normalize_title(title) -> str:
+    text = BRACKETED_FEATURING.sub(" ", _fold(title))
+    text = TRAILING_FEATURING.sub(" ", text)
+    text = NON_WORD.sub(" ", APOSTROPHES.sub("", text))
+    return SPACES.sub(" ", text).strip()
+
+
+def normalize_artist(artist) -> str:
+    primary = ARTIST_SEPARATORS.split(_fold(artist), maxsplit=1)[0]
+    primary = NON_WORD.sub(" ", APOSTROPHES.sub("", primary))
+    return SPACES.sub(" ", primary).strip()
+
+
+class TrackIndex:
+    """
+    Maps Spotify track IDs and normalized (title, artist) pairs to row
+    positions in the feature matrix. A track can own several rows (the
+    features CSV repeats tracks under different genres).
+    """
+
+    def __init__(self, meta: pd.DataFrame):
+        self.size = len(meta)
+        self.by_id = {k: v.astype(np.int64) for k, v in meta.groupby("track_id", sort=False).indices.items()}
+        keys = pd.DataFrame({
+            "title": meta["track_name"].map(normalize_title),
+            "artist": meta["artist_name"].map(normalize_artist),
+        })
+        grouped = keys.groupby(["title", "artist"], sort=False)
+        self.by_key = {k: v.astype(np.int64) for k, v in grouped.indices.items()}
+        # Rows sharing a normalized (title, artist) get the same key id
+        self.key_ids = grouped.ngroup().to_numpy(dtype=np.int64)
+
+    def rows_for(self, song_id=None, title=None, artist=None) -> np.ndarray:
+        if song_id is not None and song_id in self.by_id:
+            return self.by_id[song_id]
+        if title is None or artist is None:
+            return np.empty(0, dtype=np.int64)
+        return self.by_key.get((normalize_title(title), normalize_artist(artist)), np.empty(0, dtype=np.int64))
+
+    def match(self, song_ids, titles, artists):
+        """
+        Resolve many plays at once. Returns (play_positions, rows): parallel
+        arrays pairing each input position with every feature row it matched.
+        """
+        play_positions, rows = [], []
+        for pos, (song_id, title, artist) in enumerate(zip(song_ids, titles, artists)):
+            matched = self.rows_for(song_id, title, artist)
+            if matched.size:
+                play_positions.append(np.full(matched.size, pos, dtype=np.int64))
+                rows.append(matched)
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(play_positions), np.concatenate(rows)
+
+    def mask(self, rows: np.ndarray) -> np.ndarray:
+        """Boolean mask over the matrix of every row that is the same song as one of rows."""
+        return np.isin(self.key_ids, np.unique(self.key_ids[rows]))
+
+    def unique_rows(self, rows: np.ndarray, limit: int) -> np.ndarray:
+        """First `limit` rows of a ranked list, keeping one row per song."""
+        _, first = np.unique(self.key_ids[rows], return_index=True)
+        return rows[np.sort(first)][:limit]
+
+
+def load_track_index(store) -> TrackIndex:
+    """Load the index saved next to a feature store, building and saving it on first use."""
+    path = Path(store.path) / "track_index.pkl"
+    if path.exists():
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    index = TrackIndex(store.meta)
+    fd, tmp = tempfile.mkstemp(dir=store.path, prefix=".track_index-")
+    with os.fdopen(fd, "wb") as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+    return index
@@ -0,0 +1,43 @@
+import sys
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pytest
+
+# Modules are imported from the repository root, as with `python -m`
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from etl.utils.object_store import MemoryObjectStore, set_object_store
+
+
+@pytest.fixture
+def memory_store():
+    """Swap the process-wide object store for an in-memory one."""
+    store = MemoryObjectStore()
+    set_object_store(store)
+    yield store
+    set_object_store(None)
+
+
+@pytest.fixture
+def features_csv(tmp_path):
+    """A small SpotifyFeatures.csv with the real file's columns."""
+    rng = np.random.default_rng(0)
+    n = 40
+    df = pd.DataFrame({
+        "genre": rng.choice(["Pop", "Rock", "Jazz"], n),
+        "artist_name": [f"Artist {i % 7}" for i in range(n)],
+        "track_name": [f"Track {i}" for i in range(n)],
+        "track_id": [f"t{i}" for i in range(n)],
+        "popularity": rng.integers(0, 100, n),
+        "acousticness": rng.random(n),
+        "danceability": rng.random(n),
+        "energy": rng.random(n),
+        "key": rng.choice(["C", "D#", "G"], n),
+        "mode": rng.choice(["Major", "Minor"], n),
+        "tempo": rng.random(n) * 200,
+        "time_signature": "4/4",
+    })
+    path = tmp_path / "SpotifyFeatures.csv"
+    df.to_csv(path, index=False)
+    return path
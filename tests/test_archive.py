@@ -0,0 +1,110 @@
+from datetime import datetime, timezone
+from pathlib import Path
+import psycopg2
+import pytest
+from etl.utils.archive import restore_month
+
+SCHEMA = Path(__file__).resolve().parent.parent / "database" / "schema.sql"
+
+
+class RecordingCursor:
+    """Answers restore_month's lookups for a detached, still existing partition."""
+
+    def __init__(self):
+        self.statements = []
+        self._row = None
+
+    def execute(self, sql, params=None):
+        sql = " ".join(sql.split())
+        self.statements.append((sql, params))
+        if sql.startswith("SELECT object_key"):
+            self._row = ("archive/fact_play_summary/202301.parquet",)
+        elif sql.startswith("SELECT to_regclass"):
+            self._row = (True,)
+        elif sql.startswith("SELECT COUNT"):
+            self._row = (5,)
+
+    def fetchone(self):
+        return self._row
+
+
+def test_restore_moves_default_partition_rows_before_attach():
+    cur = RecordingCursor()
+    assert restore_month(cur, 202301) == 5
+
+    sql = [s for s, _ in cur.statements]
+    moved = next(i for i, s in enumerate(sql) if "move_default_fact_rows" in s)
+    attach = next(i for i, s in enumerate(sql) if "ATTACH PARTITION" in s)
+    assert moved < attach
+    assert cur.statements[moved][1] == ("fact_play_summary_202301", 2023010100, 2023020100)
+
+
+# ---------- Against Postgres (skipped without a reachable database) ----------
+@pytest.fixture
+def pg_cur():
+    from etl.utils.db import connect_kwargs
+
+    try:
+        conn = psycopg2.connect(connect_timeout=2, **connect_kwargs())
+    except psycopg2.OperationalError:
+        pytest.skip("Postgres is not reachable")
+    try:
+        with conn.cursor() as cur:
+            # A throwaway schema; everything is rolled back afterwards
+            cur.execute("CREATE SCHEMA archive_test; SET LOCAL search_path TO archive_test;")
+            cur.execute(SCHEMA.read_text(encoding="utf-8"))
+            cur.execute("""
+                INSERT INTO dim_artist (artist_key, artist_id, artist_name) VALUES (1, 'a1', 'Artist');
+                INSERT INTO dim_song (song_key, song_id, song_title) VALUES (1, 's1', 'Song'), (2, 's2', 'Other');
+                INSERT INTO dim_date (date_key) VALUES (2023011510), (2023021510);
+            """)
+            yield cur
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def add_play(cur, song_key, date_key, play_count=1):
+    played_at = datetime(date_key // 1000000, date_key // 10000 % 100, date_key // 100 % 100, tzinfo=timezone.utc)
+    cur.execute("""
+        INSERT INTO fact_play_summary (user_key, song_key, artist_key, date_key, play_count, total_duration_ms, played_at)
+        VALUES (0, %s, 1, %s, %s, %s, %s)
+        ON CONFLICT (user_key, song_key, artist_key, date_key) DO UPDATE
+        SET play_count = fact_play_summary.play_count + EXCLUDED.play_count;
+    """, (song_key, date_key, play_count, play_count * 1000, played_at))
+
+
+def facts(cur):
+    cur.execute("""
+        SELECT tableoid::regclass::TEXT, song_key, date_key, play_count, total_duration_ms
+        FROM fact_play_summary ORDER BY date_key, song_key;
+    """)
+    return cur.fetchall()
+
+
+def test_new_partition_takes_default_rows(pg_cur):
+    add_play(pg_cur, 1, 2023021510, 2)
+    add_play(pg_cur, 2, 2023021510)
+    pg_cur.execute("SELECT ensure_fact_play_partition(202302);")
+
+    assert facts(pg_cur) == [
+        ("fact_play_summary_202302", 1, 2023021510, 2, 2000),
+        ("fact_play_summary_202302", 2, 2023021510, 1, 1000),
+    ]
+
+
+def test_restore_merges_late_plays_into_the_archived_month(pg_cur):
+    pg_cur.execute("SELECT ensure_fact_play_partition(202301);")
+    add_play(pg_cur, 1, 2023011510, 3)
+    pg_cur.execute("ALTER TABLE fact_play_summary DETACH PARTITION fact_play_summary_202301;")
+    pg_cur.execute("INSERT INTO fact_play_archive (month_key, object_key, row_count) VALUES (202301, 'k', 1);")
+
+    # Loaded while the month was archived: lands in the default partition
+    add_play(pg_cur, 1, 2023011510)
+    add_play(pg_cur, 2, 2023011510)
+    assert restore_month(pg_cur, 202301) == 2
+
+    assert facts(pg_cur) == [
+        ("fact_play_summary_202301", 1, 2023011510, 4, 4000),
+        ("fact_play_summary_202301", 2, 2023011510, 1, 1000),
+    ]
@@ -0,0 +1,25 @@
+from datetime import datetime
+import pytest
+from etl.recently_played.backfill import list_raw_prefixes, parse_bound, run_backfill
+
+
+def test_date_only_end_covers_the_whole_day():
+    assert parse_bound("2025-01-31") == datetime(2025, 1, 31, 0)
+    assert parse_bound("2025-01-31", end=True) == datetime(2025, 1, 31, 23)
+    assert parse_bound("2025-01-31-12", end=True) == datetime(2025, 1, 31, 12)
+    with pytest.raises(ValueError, match="Invalid date"):
+        parse_bound("31/01/2025")
+
+
+def test_range_includes_last_window_of_end_date(memory_store):
+    for prefix in ["2025-01-30-23", "2025-01-31-00", "2025-01-31-23", "acct/2025-01-31-23", "2025-02-01-00"]:
+        memory_store.put_bytes(f"raw/{prefix}/recently_played.json", b"[]")
+
+    prefixes = list_raw_prefixes(parse_bound("2025-01-31"), parse_bound("2025-01-31", end=True))
+    assert sorted(prefixes) == ["2025-01-31-00", "2025-01-31-23", "acct/2025-01-31-23"]
+
+
+def test_memory_store_is_rejected(memory_store):
+    # Transform workers would each see their own empty store
+    with pytest.raises(ValueError, match="memory object store"):
+        run_backfill(parse_bound("2025-01-31"), parse_bound("2025-01-31", end=True))
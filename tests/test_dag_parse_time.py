@@ -0,0 +1,22 @@
+import pytest
+from benchmarks.dag_parse_time import DAGS_DIR, airflow_baseline_ms, has_airflow, measure
+
+BUDGET_MS = 150
+RUNS = 3
+
+
+@pytest.fixture(scope="module")
+def mode_and_baseline():
+    if has_airflow():
+        return "full", airflow_baseline_ms(RUNS)
+    # Without Airflow only the DAG files' own top-level imports are timed
+    return "imports", 0.0
+
+
+@pytest.mark.parametrize("path", sorted(DAGS_DIR.glob("*.py")), ids=lambda p: p.name)
+def test_dag_parses_within_budget(path, mode_and_baseline):
+    mode, baseline_ms = mode_and_baseline
+    result = measure(path, mode, RUNS)
+
+    assert not result["heavy"], f"{path.name} imports {result['heavy']} at parse time"
+    assert result["median_ms"] - baseline_ms <= BUDGET_MS
@@ -0,0 +1,77 @@
+import pytest
+from etl.recently_played.enrich import BATCH_SIZE, enrich_prefix, enrich_tracks
+from etl.recently_played.extract import upload_raw
+from etl.utils.track_cache import TrackCache
+
+
+class StubClient:
+    """Answers the tracks and audio-features endpoints; audio-features fails while fail_features is set."""
+
+    def __init__(self, fail_features: bool = False):
+        self.fail_features = fail_features
+        self.calls = []
+
+    def get(self, url, params=None):
+        ids = params["ids"].split(",")
+        self.calls.append((url, len(ids)))
+        if url == "tracks":
+            return {"tracks": [
+                {"id": i, "name": f"Song {i}", "popularity": 50, "album": {"id": "al1", "name": "Album"},
+                 "artists": [{"id": "ar1", "name": "Artist"}]}
+                for i in ids
+            ]}
+        if self.fail_features:
+            raise RuntimeError("403 Forbidden")
+        return {"audio_features": [{"id": i, "danceability": 0.5, "tempo": 120.0} for i in ids]}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = TrackCache(str(tmp_path / "tracks.sqlite"))
+    yield cache
+    cache.close()
+
+
+def test_fetches_in_batches_then_serves_from_cache(cache):
+    ids = [f"s{i}" for i in range(BATCH_SIZE + 10)]
+    client = StubClient()
+    df = enrich_tracks(ids + ids[:5], client, cache)
+
+    assert len(df) == len(ids)
+    assert client.calls == [("tracks", BATCH_SIZE), ("tracks", 10), ("audio-features", BATCH_SIZE), ("audio-features", 10)]
+    assert not df["features_missing"].any()
+
+    client.calls.clear()
+    again = enrich_tracks(ids, client, cache)
+    assert client.calls == []
+    assert sorted(again["song_id"]) == sorted(ids)
+    assert cache.hits == len(ids)
+
+
+def test_failed_audio_features_are_retried(cache):
+    ids = ["a", "b", "c"]
+    df = enrich_tracks(ids, StubClient(fail_features=True), cache)
+    assert df["features_missing"].all()
+    assert "tempo" not in df
+
+    # Metadata is cached; only the audio features are looked up again
+    client = StubClient()
+    df = enrich_tracks(ids, client, cache)
+    assert client.calls == [("audio-features", 3)]
+    assert not df["features_missing"].any()
+    assert (df["tempo"] == 120.0).all()
+
+    client.calls.clear()
+    enrich_tracks(ids, client, cache)
+    assert client.calls == []
+
+
+def test_enrich_prefix_writes_enriched_parquet(memory_store, tmp_path, monkeypatch):
+    monkeypatch.setattr("etl.recently_played.enrich.ENRICH_CACHE_PATH", str(tmp_path / "tracks.sqlite"))
+    records = [{"song_id": s, "played_at": "2025-01-01T00:00:00.000Z"} for s in ["a", "b", "a"]]
+    upload_raw(records, "2025-01-01-00", raw_format="ndjson.gz")
+
+    enrich_prefix("2025-01-01-00", StubClient())
+
+    written = memory_store.read_parquet("enriched/2025-01-01-00/tracks.parquet")
+    assert sorted(written["song_id"]) == ["a", "b"]
@@ -0,0 +1,201 @@
+import json
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import pytest
+from etl.recently_played import extract
+from etl.utils.spotify_client import SpotifyClient
+
+BASE_MS = 1_735_689_600_000  # 2025-01-01T00:00:00Z
+
+
+def iso(ms: int) -> str:
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+class StubSpotify:
+    """
+    recently-played over HTTP: pages of `page_size` plays after `after`,
+    linked with `next` URLs (or only `cursors.after` with use_next=False).
+    The first `throttle` GETs are answered 429 with Retry-After.
+    """
+
+    def __init__(self, played_ms: list[int], page_size: int = 2, use_next: bool = True,
+                 throttle: int = 0, retry_after: str = "3"):
+        self.played_ms = sorted(played_ms)
+        self.page_size = page_size
+        self.use_next = use_next
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: dict, headers: dict | None = None):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                self._send(200, {"access_token": "token", "expires_in": 3600})
+
+            def do_GET(self):
+                stub.requests.append(self.path)
+                if stub.throttle > 0:
+                    stub.throttle -= 1
+                    self._send(429, {"error": "rate limited"}, {"Retry-After": stub.retry_after})
+                    return
+                query = parse_qs(urlparse(self.path).query)
+                self._send(200, stub.page(int(query.get("after", ["0"])[0])))
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def page(self, after_ms: int) -> dict:
+        newer = [ms for ms in self.played_ms if ms > after_ms][:self.page_size]
+        items = [
+            {
+                "played_at": iso(ms),
+                "track": {
+                    "id": f"song{ms - BASE_MS}",
+                    "name": f"Song {ms - BASE_MS}",
+                    "duration_ms": 180_000,
+                    "artists": [{"id": "artist1", "name": "Artist"}],
+                },
+            }
+            for ms in newer
+        ]
+        more = newer and newer[-1] < self.played_ms[-1]
+        return {
+            "items": items,
+            "cursors": {"after": str(newer[-1])} if newer else None,
+            "next": f"{self.base}/me/player/recently-played?after={newer[-1]}&limit=50" if more and self.use_next else None,
+        }
+
+    def client(self) -> SpotifyClient:
+        return SpotifyClient(refresh_token="refresh", api_base=self.base, token_url=f"{self.base}/token")
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+PLAYS = [BASE_MS + i * 60_000 for i in range(5)]
+
+
+@pytest.mark.parametrize("use_next", [True, False])
+def test_fetch_follows_pages(use_next):
+    with StubSpotify(PLAYS, use_next=use_next) as stub:
+        records = extract.fetch_recently_played(BASE_MS - 1, client=stub.client())
+
+    assert [r["played_at"] for r in records] == [iso(ms) for ms in PLAYS]
+    # Three pages of at most two plays, then the cursor's empty page ends the run
+    assert len(stub.requests) == 4
+    assert all(path.count("after=") == 1 for path in stub.requests)
+
+
+def test_fetch_stops_at_max_pages():
+    with StubSpotify(PLAYS) as stub:
+        records = extract.fetch_recently_played(BASE_MS - 1, client=stub.client(), max_pages=2)
+        assert extract.fetch_recently_played(BASE_MS - 1, client=stub.client(), max_pages=0) == []
+
+    assert len(records) == 4
+
+
+def test_fetch_retries_429_after_retry_after(monkeypatch):
+    delays = []
+    monkeypatch.setattr("etl.utils.spotify_client.time.sleep", delays.append)
+    with StubSpotify(PLAYS, throttle=2, retry_after="3") as stub:
+        records = extract.fetch_recently_played(BASE_MS - 1, client=stub.client())
+
+    assert delays == [3.0, 3.0]
+    assert len(records) == len(PLAYS)
+
+
+def test_watermark_skips_ingested_plays(memory_store):
+    assert extract.read_watermark() is None
+    with StubSpotify(PLAYS[:3]) as stub:
+        first = extract.fetch_recently_played(BASE_MS - 1, client=stub.client())
+    assert extract.write_watermark(first) == PLAYS[2]
+
+    with StubSpotify(PLAYS) as stub:
+        second = extract.fetch_recently_played(extract.read_watermark(), client=stub.client())
+
+    assert [r["played_at"] for r in second] == [iso(ms) for ms in PLAYS[3:]]
+    assert extract.write_watermark([]) is None
+    assert extract.read_watermark() == PLAYS[2]
+
+
+def test_empty_window_lands_nothing(memory_store):
+    extract.save_watermark(PLAYS[-1])
+    with StubSpotify(PLAYS) as stub:
+        records = extract.extract_to_raw(extract.read_watermark(), "2025-01-01-00", client=stub.client(),
+                                         raw_format="ndjson.gz")
+
+    assert records == 0
+    assert memory_store.list_prefixes("raw/") == []
+    assert extract.read_watermark() == PLAYS[-1]
+
+
+def test_extract_lands_records_and_marker(memory_store):
+    with StubSpotify(PLAYS) as stub:
+        records = extract.extract_to_raw(BASE_MS - 1, "2025-01-01-00", client=stub.client(), raw_format="ndjson.gz")
+
+    assert records == len(PLAYS)
+    assert memory_store.exists("raw/2025-01-01-00/recently_played.ndjson.gz")
+    assert memory_store.exists("raw/2025-01-01-00/_SUCCESS")
+    assert extract.read_watermark() == PLAYS[-1]
+
+
+def test_client_retries_connection_errors_with_a_timeout(monkeypatch):
+    import requests
+
+    delays = []
+    monkeypatch.setattr("etl.utils.spotify_client.time.sleep", delays.append)
+    with StubSpotify(PLAYS) as stub:
+        client = stub.client()
+        client.access_token()
+        send = client.session.request
+        calls = []
+
+        def flaky(method, url, **kwargs):
+            calls.append(kwargs["timeout"])
+            if len(calls) <= 2:
+                raise requests.ConnectionError("connection reset")
+            return send(method, url, **kwargs)
+
+        monkeypatch.setattr(client.session, "request", flaky)
+        records = extract.fetch_recently_played(BASE_MS - 1, client=client)
+
+    assert len(records) == len(PLAYS)
+    assert delays == [0.5, 1.0]
+    assert calls[0] == client.timeout
+    assert client.status_counts[None] == 2
+
+
+def test_client_keeps_a_bounded_latency_history():
+    with StubSpotify(PLAYS, page_size=1) as stub:
+        client = SpotifyClient(refresh_token="refresh", api_base=stub.base, token_url=f"{stub.base}/token",
+                               latency_history=3)
+        extract.fetch_recently_played(BASE_MS - 1, client=client)
+
+    assert len(client.latencies) == 3
+    assert client.latency_summary()["requests"] == client.request_count == len(stub.requests) + 1
@@ -0,0 +1,43 @@
+from contextlib import contextmanager
+import etl.recently_played.extract_accounts as extract_accounts
+from etl.utils.metrics import add_bytes_read, stage
+
+
+def fake_extract_account(account_id, refresh_token, window, fallback_ms, rate_limiter, **client_kwargs):
+    add_bytes_read(10)
+    return {
+        "account_id": account_id,
+        "prefix": f"{account_id}/{window}",
+        "records": 0 if account_id == "idle" else 3,
+        "requests": 1,
+        "throttled": 0,
+    }
+
+
+def test_worker_metrics_roll_up_to_the_caller(monkeypatch):
+    monkeypatch.setattr(extract_accounts, "extract_account", fake_extract_account)
+    accounts = [(f"acct{i}", "token") for i in range(8)]
+
+    with stage("test.extract") as metrics:
+        results, failures = extract_accounts.extract_accounts(accounts, "2025-01-31-00", 0, max_workers=4)
+
+    assert not failures and len(results) == 8
+    assert metrics.bytes_read == 80
+
+
+def test_accounts_without_plays_are_not_returned(monkeypatch):
+    @contextmanager
+    def connection():
+        yield FakeConnection()
+
+    class FakeConnection:
+        @contextmanager
+        def cursor(self):
+            yield None
+
+    monkeypatch.setattr(extract_accounts, "extract_account", fake_extract_account)
+    monkeypatch.setattr("etl.utils.db.connection", connection)
+    monkeypatch.setattr("etl.utils.accounts.list_accounts", lambda cur: [("idle", "t"), ("busy", "t")])
+
+    prefixes = extract_accounts.extract_active_accounts(hours=12, max_workers=2)
+    assert [p.split("/")[0] for p in prefixes] == ["busy"]
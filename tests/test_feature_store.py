@@ -0,0 +1,32 @@
+import json
+import numpy as np
+from recommendations.feature_store import NORMALIZED_FILE, csv_sha256, load_feature_store
+from recommendations.similarity import SimilarityEngine, normalize_rows
+
+
+def test_store_keeps_a_normalized_mmap(features_csv, tmp_path):
+    store = load_feature_store(str(features_csv), str(tmp_path / "cache"))
+
+    assert isinstance(store.normalized, np.memmap)
+    np.testing.assert_allclose(store.normalized, normalize_rows(store.matrix), rtol=1e-6)
+    engine = SimilarityEngine(store.normalized, normalized=True)
+    assert np.shares_memory(engine.vectors, store.normalized)
+
+    idx, _ = engine.top_k(store.matrix[3], k=1)
+    assert idx[0, 0] == 3
+
+
+def test_store_without_normalized_copy_gets_one(features_csv, tmp_path):
+    store = load_feature_store(str(features_csv), str(tmp_path / "cache"))
+    (store.path / NORMALIZED_FILE).unlink()
+
+    reopened = load_feature_store(str(features_csv), str(tmp_path / "cache"))
+    np.testing.assert_array_equal(reopened.normalized, store.normalized)
+
+
+def test_csv_hash_index_is_replaced_atomically(features_csv, tmp_path):
+    cache_dir = tmp_path / "cache"
+    digest = csv_sha256(str(features_csv), str(cache_dir))
+
+    assert list(json.loads((cache_dir / "csv_hashes.json").read_text()).values()) == [digest]
+    assert [p.name for p in cache_dir.iterdir()] == ["csv_hashes.json"]
@@ -0,0 +1,39 @@
+import re
+from pathlib import Path
+
+DATABASE = Path(__file__).resolve().parent.parent / "database"
+CREATE_INDEX = re.compile(r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)\s+ON\s+(\w+)", re.I)
+DROP_INDEX = re.compile(r"DROP\s+INDEX\s+(?:IF\s+EXISTS\s+)?(\w+)", re.I)
+RENAME_TABLE = re.compile(r"ALTER\s+TABLE\s+(\w+)\s+RENAME\s+TO\s+(\w+)", re.I)
+DROP_TABLE = re.compile(r"DROP\s+TABLE\s+(?:IF\s+EXISTS\s+)?(\w+)", re.I)
+
+
+def statements(path: Path):
+    sql = re.sub(r"--[^\n]*", "", path.read_text(encoding="utf-8"))
+    # Function bodies are quoted; their statements run later, not here
+    return re.sub(r"\$\$.*?\$\$", "''", sql, flags=re.S).split(";")
+
+
+def apply(indexes: dict, path: Path):
+    """Replay a script's index and table DDL onto {index name: table}."""
+    for statement in statements(path):
+        if m := CREATE_INDEX.search(statement):
+            indexes.setdefault(m.group(1), m.group(2))
+        elif m := DROP_INDEX.search(statement):
+            indexes.pop(m.group(1), None)
+        elif m := RENAME_TABLE.search(statement):
+            for name, table in indexes.items():
+                if table == m.group(1):
+                    indexes[name] = m.group(2)
+        elif m := DROP_TABLE.search(statement):
+            for name in [n for n, t in indexes.items() if t == m.group(1)]:
+                del indexes[name]
+    return indexes
+
+
+def test_migrations_end_with_the_schema_indexes():
+    """Replaying every migration in order gives the indexes schema.sql creates."""
+    migrated = {}
+    for path in sorted((DATABASE / "migrations").glob("*.sql")):
+        migrated = apply(migrated, path)
+    assert migrated == apply({}, DATABASE / "schema.sql")
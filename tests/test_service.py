@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from recommendations.engine import Recommender, RecommenderHolder
+from recommendations.feature_store import build_feature_store, publish_feature_store
+from recommendations.service import create_app
+
+
+@pytest.fixture
+def holder(features_csv, tmp_path, monkeypatch):
+    """A holder over a published test store; profiles come from stub vectors instead of Postgres."""
+    cache_dir = str(tmp_path / "cache")
+    publish_feature_store(build_feature_store(str(features_csv), cache_dir), cache_dir)
+
+    def with_profile(self, profile_id="default"):
+        if profile_id == "nobody":
+            raise ValueError("Taste profile has no weight; rebuild it from history.")
+        return Recommender(self.store, self.index, self.engine, np.asarray(self.store.matrix[0]),
+                           self.index.mask(np.array([0])), profile_version=profile_id)
+
+    monkeypatch.setattr(Recommender, "with_profile", with_profile)
+    return RecommenderHolder(cache_dir=cache_dir)
+
+
+def test_profiles_load_lazily_and_are_cached(holder):
+    assert holder._profiles == {}
+    listener = holder.for_profile("listener")
+    assert holder.for_profile("listener") is listener
+    assert listener.engine is holder.base.engine
+
+
+def test_listener_without_profile_is_404(holder):
+    client = create_app(holder).test_client()
+
+    assert client.get("/healthz").status_code == 200
+    response = client.get("/recommendations?account=nobody")
+    assert response.status_code == 404
+    assert "no weight" in response.get_json()["error"]
+
+
+@pytest.mark.parametrize("n", [0, -3])
+def test_non_positive_n_is_400(holder, n):
+    response = create_app(holder).test_client().get(f"/recommendations?n={n}")
+    assert response.status_code == 400
+
+
+def test_recommendations_for_default_listener(holder):
+    response = create_app(holder).test_client().get("/recommendations?n=3")
+    body = response.get_json()
+    assert response.status_code == 200
+    assert [r["rank"] for r in body["recommendations"]] == [1, 2, 3]
@@ -0,0 +1,67 @@
+import shutil
+from pathlib import Path
+import pandas as pd
+import pytest
+from etl.recently_played.load import prepare_bulk_frame
+
+FIXTURE = Path(__file__).resolve().parent.parent / "benchmarks" / "fixtures" / "recently_played.json"
+
+
+@pytest.fixture(scope="module")
+def spark():
+    pytest.importorskip("pyspark")
+    if shutil.which("java") is None:
+        pytest.skip("Spark needs a JVM")
+    from etl.recently_played.spark_engine import get_spark
+
+    session = get_spark("spotify-etl-tests")
+    yield session
+    session.stop()
+
+
+def test_spark_transform_matches_pandas(spark):
+    from etl.recently_played.spark_engine import check_parity
+
+    assert check_parity(str(FIXTURE), spark=spark)
+
+
+def test_spark_stage_rows_match_bulk_frame(spark):
+    from etl.recently_played.spark_engine import pandas_output, raw_schema, stage_frame, transform_frame
+
+    records = pd.DataFrame([
+        {"song_id": "s1", "song_title": None, "artist_name": None, "artist_id": "a1",
+         "played_at": "2025-01-31T10:00:00Z", "song_duration_ms": 1000},
+        {"song_id": "s2", "song_title": "Song", "artist_name": "Artist", "artist_id": "a2",
+         "played_at": "2025-01-31T11:00:00Z", "song_duration_ms": 2000},
+    ])
+    expected = prepare_bulk_frame(pandas_output(records))
+    df = spark.createDataFrame(records.assign(prefix="fixture", _row=range(len(records))),
+                               schema=raw_schema().add("prefix", "string").add("_row", "long"))
+    actual = stage_frame(transform_frame(df), "run").toPandas().sort_values("seq")
+
+    for col in ["artist_name", "song_title", "date_key", "day_of_week"]:
+        assert actual[col].tolist() == expected[col].tolist()
+
+
+def test_bulk_frame_names_missing_text():
+    df = pd.DataFrame({
+        "played_at": pd.to_datetime(["2025-01-31T10:00:00Z"], utc=True), "artist_id": ["a1"],
+        "artist_name": [None], "song_id": ["s1"], "song_title": [float("nan")], "song_duration_ms": [1000],
+        "year": [2025], "month": [1], "day": [31], "hour_of_day": [17], "day_of_week": ["Friday"],
+    })
+    out = prepare_bulk_frame(df)
+    assert out[["artist_name", "song_title"]].values.tolist() == [["None", "None"]]
+
+
+def test_spark_content_hash_matches_ledger(spark):
+    import json
+    from etl.recently_played.spark_engine import content_hashes, pandas_output, raw_schema, transform_frame
+    from etl.utils.ledger import content_hash
+    from pyspark.sql import functions as F
+
+    with open(FIXTURE, encoding="utf-8") as f:
+        expected = content_hash(pandas_output(pd.DataFrame(json.load(f))))
+    df = spark.read.schema(raw_schema()).json(str(FIXTURE), multiLine=True)
+    df = df.withColumn("prefix", F.lit("fixture")).withColumn("_row", F.monotonically_increasing_id())
+
+    assert content_hashes(transform_frame(df)) == {"fixture": expected}
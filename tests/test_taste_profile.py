@@ -0,0 +1,64 @@
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from recommendations.feature_store import FeatureStore
+from recommendations.similarity import normalize_rows
+from recommendations.taste_profile import fold_plays, load_play_history
+from recommendations.track_index import TrackIndex
+
+TAU_S = 86400.0
+
+
+class LedgerCursor:
+    """Answers load_play_history from in-memory load_ledger_event rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def execute(self, query, params=None):
+        self.queries.append(query)
+
+    def fetchall(self):
+        return self.rows
+
+
+def make_store(n: int = 6, dims: int = 4) -> FeatureStore:
+    matrix = np.random.default_rng(0).random((n, dims)).astype(np.float32)
+    meta = pd.DataFrame({
+        "track_id": [f"t{i}" for i in range(n)],
+        "track_name": [f"Track {i}" for i in range(n)],
+        "artist_name": ["Artist"] * n,
+    })
+    return FeatureStore(matrix, meta, [f"f{i}" for i in range(dims)], Path("store"), normalize_rows(matrix))
+
+
+def plays(rows) -> pd.DataFrame:
+    return pd.DataFrame(
+        [(song_id, f"Track {song_id[1:]}", "Artist", pd.Timestamp(ts, tz="UTC")) for song_id, ts in rows],
+        columns=["song_id", "song_title", "artist_name", "played_at"],
+    )
+
+
+def test_rebuild_from_ledger_equals_incremental_folds():
+    store = make_store()
+    index = TrackIndex(store.meta)
+    # Two plays of t1 in the same hour: one fact row, but two ledger events
+    prefixes = [
+        [("t1", "2025-01-01 10:05"), ("t1", "2025-01-01 10:40"), ("t2", "2025-01-01 11:00")],
+        [("t3", "2025-01-02 08:00"), ("t1", "2025-01-02 09:30"), ("unknown", "2025-01-02 09:45")],
+    ]
+
+    incremental = None
+    for rows in prefixes:
+        incremental, _ = fold_plays(incremental, plays(rows), store, index, TAU_S)
+
+    cur = LedgerCursor(list(plays([r for rows in prefixes for r in rows]).itertuples(index=False, name=None)))
+    history = load_play_history(cur, "default")
+    rebuilt, _ = fold_plays(None, history, store, index, TAU_S)
+
+    assert "load_ledger_event" in cur.queries[0]
+    assert len(history) == 6
+    assert rebuilt["as_of"] == incremental["as_of"]
+    np.testing.assert_allclose(rebuilt["weight_sum"], incremental["weight_sum"])
+    np.testing.assert_allclose(rebuilt["decayed_sum"], incremental["decayed_sum"])
@@ -0,0 +1,46 @@
+import json
+from pathlib import Path
+import pandas as pd
+import pytest
+from etl.recently_played.extract import upload_raw
+from etl.recently_played.transform import download_raw, iter_transformed, transform, transform_and_upload
+
+FIXTURE = Path(__file__).resolve().parent.parent / "benchmarks" / "fixtures" / "recently_played.json"
+
+
+@pytest.fixture
+def records():
+    return json.loads(FIXTURE.read_text(encoding="utf-8"))
+
+
+@pytest.mark.parametrize("raw_format", ["json", "ndjson.gz"])
+def test_chunked_transform_matches_whole_frame(memory_store, records, raw_format):
+    # Repeating the records puts duplicates of every play in later chunks
+    upload_raw(records * 3, "2025-01-01-00", raw_format=raw_format)
+    expected = transform(download_raw("2025-01-01-00")).reset_index(drop=True)
+
+    chunked = pd.concat(iter_transformed("2025-01-01-00", chunksize=5), ignore_index=True)
+    pd.testing.assert_frame_equal(chunked, expected)
+
+    key, rows = transform_and_upload("2025-01-01-00", "pandas")
+    assert rows == len(expected)
+    written = memory_store.read_parquet(key)
+    # Malformed played_at values leave date_key null
+    columns = ["song_id", "date_key"]
+    assert written[columns].astype({"date_key": "Int64"}).equals(expected[columns].astype({"date_key": "Int64"}))
+    assert memory_store.exists("processed/2025-01-01-00/_SUCCESS")
+
+
+def test_pandas_and_arrow_engines_write_the_same_parquet(memory_store, records):
+    upload_raw(records, "2025-01-01-00", raw_format="ndjson.gz")
+    pandas_key, _ = transform_and_upload("2025-01-01-00", "pandas", intermediate=True)
+    pandas_out = memory_store.read_parquet(pandas_key)
+    arrow_key, _ = transform_and_upload("2025-01-01-00", "arrow", intermediate=True)
+
+    pd.testing.assert_frame_equal(pandas_out, memory_store.read_parquet(arrow_key))
+
+
+def test_empty_prefix_fails(memory_store):
+    upload_raw([], "2025-01-01-00", raw_format="ndjson.gz")
+    with pytest.raises(ValueError, match="Dataset empty"):
+        transform_and_upload("2025-01-01-00", "pandas")